@@ -0,0 +1,335 @@
+"""
+Benchmarks for the hot paths of rna_secstruct_design on synthetic constructs of
+50-500 nt. Folding goes through a stub backend so ViennaRNA is not needed and
+only our own code is timed. Each case records the best wall time of several runs
+and the peak memory of one extra run under tracemalloc.
+
+    python benchmarks/run_benchmarks.py -o results.json
+    python benchmarks/run_benchmarks.py --baseline baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline baseline.json
+"""
+
+import copy
+import datetime
+import gc
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, List, Tuple
+
+import click
+from rna_secstruct import SecStruct
+from seq_tools.structure import SequenceStructure
+
+from rna_secstruct_design.folding import StubFoldBackend, set_fold_backend
+from rna_secstruct_design.helix_randomizer import HelixRandomizer
+from rna_secstruct_design.mutations import (
+    find_multiple_mutations,
+    iter_multiple_mutations,
+    get_basepair_mutations,
+    add_unpaired_sweep,
+    remove_unpaired_nucleotide_sweep,
+    remove_nucleotide_sweep,
+    scan_all_helix_lengths,
+)
+from rna_secstruct_design.replace import replace_seq_structures, MultiPatternReplacer
+from rna_secstruct_design.selection import get_selection
+from rna_secstruct_design.util import max_gc_stretch, max_repeating_nucleotides
+
+LENGTHS = (50, 200, 500)
+# multiple mutations grow as length**num, only the first ones are generated
+MAX_MUTANTS = 100000
+
+# synthetic constructs ##############################################################
+
+
+def make_construct(length: int, seed: int = 0) -> Tuple[str, str]:
+    """
+    Builds a chain of hairpins of about length nt. Only the first hairpin has a
+    GAAA tetraloop closed by a G-C pair so it can be found by the replace cases.
+    """
+    rng = random.Random(seed)
+    pairs = ["GC", "CG", "AU", "UA"]
+    seq, ss = "GG", ".."
+    first = True
+    while len(seq) < length - 2:
+        h_len = rng.randint(4, 7)
+        if len(seq) + 2 * h_len + 6 > length - 2:
+            break
+        bps = [rng.choice(pairs) for _ in range(h_len - 1)]
+        if first:
+            bps.append("GC")
+            loop = "GAAA"
+            first = False
+        else:
+            bps.append("CG")
+            loop = "UUCG"
+        seq += "".join(bp[0] for bp in bps) + loop
+        seq += "".join(bp[1] for bp in reversed(bps)) + "AA"
+        ss += "(" * h_len + "...." + ")" * h_len + ".."
+    seq += "A" * (length - len(seq))
+    ss += "." * (length - len(ss))
+    return seq, ss
+
+
+# cases #############################################################################
+
+
+@dataclass
+class Benchmark:
+    """
+    A benchmark case. setup takes a construct length and returns the function to
+    time so that building inputs is not part of the measurement.
+    """
+
+    name: str
+    setup: Callable[[int], Callable[[], object]]
+    lengths: Tuple[int, ...] = LENGTHS
+
+
+def setup_find_multiple_mutations(length):
+    seq, _ = make_construct(length)
+    return lambda: find_multiple_mutations(seq, 1, [])
+
+
+def setup_iter_multiple_mutations(num):
+    def setup(length):
+        seq, _ = make_construct(length)
+
+        def run():
+            mutants = iter_multiple_mutations(seq, num, [])
+            return sum(1 for _ in itertools.islice(mutants, MAX_MUTANTS))
+
+        return run
+
+    return setup
+
+
+def setup_get_basepair_mutations(length):
+    secstruct = SecStruct(*make_construct(length))
+    return lambda: get_basepair_mutations(secstruct, 1)
+
+
+def setup_sweep(func, num):
+    def setup(length):
+        seq_struct = SequenceStructure(*make_construct(length))
+        return lambda: func(seq_struct, num)
+
+    return setup
+
+
+def setup_scan_all_helix_lengths(length):
+    secstruct = SecStruct(*make_construct(length))
+    helices = [h.m_id for h in secstruct.get_helices()][:2]
+    h_ranges = {m_id: (3, 8) for m_id in helices}
+    return lambda: scan_all_helix_lengths(secstruct, h_ranges)
+
+
+def setup_helix_randomizer_run(length):
+    seq, ss = make_construct(length)
+    secstruct = SecStruct(seq, ss)
+    hr = HelixRandomizer()
+
+    def run():
+        # every candidate folds into the target, so this times sampling alone
+        set_fold_backend(StubFoldBackend(ss))
+        try:
+            return hr.run(secstruct)
+        finally:
+            set_fold_backend(None)
+
+    return run
+
+
+def setup_constraint_metrics(length):
+    rng = random.Random(1)
+    seq, ss = make_construct(length)
+    seqs = ["".join(rng.sample(seq, len(seq))) for _ in range(200)]
+
+    def run():
+        for s in seqs:
+            max_gc_stretch(s, ss)
+            max_repeating_nucleotides(s)
+
+    return run
+
+
+def setup_get_selection(length):
+    secstruct = SecStruct(*make_construct(length))
+    params = {"flanks": "", "range_1": "1-10", "motif_1": {"m_type": "HAIRPIN"}}
+    return lambda: get_selection(secstruct, copy.deepcopy(params))
+
+
+def setup_replace_seq_structures(length):
+    seq_struct = SequenceStructure(*make_construct(length))
+    sub = SequenceStructure("GGAAAC", "(....)")
+    new = SequenceStructure("CUUCGG", "(....)")
+    return lambda: replace_seq_structures(seq_struct, sub, new)
+
+
+def setup_multi_pattern_replacer(length):
+    seq, ss = make_construct(length)
+    params = {
+        "gaaa": {
+            "sequence": "GGAAAC",
+            "structure": "(....)",
+            "r_sequence": "CUUCGG",
+            "r_structure": "(....)",
+        }
+    }
+    replacer = MultiPatternReplacer(params)
+    return lambda: replacer.replace(seq, ss)
+
+
+BENCHMARKS = [
+    Benchmark("find_multiple_mutations_k1", setup_find_multiple_mutations),
+    Benchmark("iter_multiple_mutations_k2", setup_iter_multiple_mutations(2)),
+    Benchmark("iter_multiple_mutations_k3", setup_iter_multiple_mutations(3)),
+    Benchmark("get_basepair_mutations", setup_get_basepair_mutations),
+    Benchmark("add_unpaired_sweep", setup_sweep(add_unpaired_sweep, 1)),
+    Benchmark(
+        "remove_unpaired_nucleotide_sweep",
+        setup_sweep(remove_unpaired_nucleotide_sweep, 2),
+    ),
+    Benchmark("remove_nucleotide_sweep", setup_sweep(remove_nucleotide_sweep, 1)),
+    Benchmark("scan_all_helix_lengths", setup_scan_all_helix_lengths),
+    Benchmark("helix_randomizer_run", setup_helix_randomizer_run),
+    Benchmark("max_gc_stretch_max_repeating", setup_constraint_metrics),
+    Benchmark("get_selection", setup_get_selection),
+    Benchmark("replace_seq_structures", setup_replace_seq_structures),
+    Benchmark("multi_pattern_replacer", setup_multi_pattern_replacer),
+]
+
+# measuring and comparing ###########################################################
+
+
+def measure(func, repeat: int) -> dict:
+    """
+    Times func repeat times and measures its peak memory in one more run
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "time": min(times),
+        "mean_time": sum(times) / len(times),
+        "repeat": repeat,
+        "peak_memory": peak,
+    }
+
+
+def run_benchmarks(benchmarks: List[Benchmark], repeat, max_length, log) -> dict:
+    results = {}
+    for bench in benchmarks:
+        for length in bench.lengths:
+            if length > max_length:
+                continue
+            key = f"{bench.name}[{length}]"
+            try:
+                results[key] = measure(bench.setup(length), repeat)
+            except Exception as e:
+                results[key] = {"error": f"{type(e).__name__}: {e}"}
+                log(f"{key:<45} ERROR {results[key]['error']}")
+                continue
+            r = results[key]
+            log(
+                f"{key:<45} {r['time'] * 1000:10.2f} ms "
+                f"{r['peak_memory'] / 1024 ** 2:10.2f} MiB"
+            )
+    return results
+
+
+def compare(results: dict, baseline: dict, time_tol: float, memory_tol: float):
+    """
+    Compares results to a baseline
+    :return: list of (key, metric, baseline value, new value) regressions
+    """
+    regressions = []
+    for key, r in results.items():
+        base = baseline.get(key)
+        if base is None or "error" in base or "error" in r:
+            continue
+        if r["time"] > base["time"] * (1 + time_tol):
+            regressions.append((key, "time", base["time"], r["time"]))
+        if r["peak_memory"] > base["peak_memory"] * (1 + memory_tol):
+            regressions.append(
+                (key, "peak_memory", base["peak_memory"], r["peak_memory"])
+            )
+    return regressions
+
+
+def get_metadata() -> dict:
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "fold_backend": "stub",
+    }
+
+
+@click.command()
+@click.option("-o", "--output", type=click.Path(), default=None)
+@click.option(
+    "-k",
+    "--filter",
+    "name_filter",
+    default=None,
+    help="run cases with this in their name",
+)
+@click.option("-r", "--repeat", type=int, default=3)
+@click.option("--max-length", type=int, default=max(LENGTHS))
+@click.option("--baseline", type=click.Path(exists=True), default=None)
+@click.option("--save-baseline", type=click.Path(), default=None)
+@click.option("--time-tolerance", type=float, default=0.2)
+@click.option("--memory-tolerance", type=float, default=0.2)
+def main(
+    output,
+    name_filter,
+    repeat,
+    max_length,
+    baseline,
+    save_baseline,
+    time_tolerance,
+    memory_tolerance,
+):
+    benchmarks = BENCHMARKS
+    if name_filter is not None:
+        benchmarks = [b for b in benchmarks if name_filter in b.name]
+    results = run_benchmarks(benchmarks, repeat, max_length, click.echo)
+    data = {"metadata": get_metadata(), "results": results}
+    for path in [output, save_baseline]:
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(data, f, indent=2)
+    if baseline is None:
+        return
+    with open(baseline) as f:
+        baseline_results = json.load(f)["results"]
+    regressions = compare(results, baseline_results, time_tolerance, memory_tolerance)
+    if len(regressions) == 0:
+        click.echo(f"no regressions against {baseline}")
+        return
+    for key, metric, old, new in regressions:
+        click.echo(
+            f"REGRESSION {key} {metric}: {old:.4g} -> {new:.4g} ({new / old:.2f}x)"
+        )
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import asyncio
+import bz2
+import csv
+import gzip
+import queue
+from collections import deque
+from multiprocessing import Pool
+from typing import Iterable, Iterator, List
+
+from rna_secstruct_design.folding import fold_sequence
+from rna_secstruct_design.profiler import profiler, ProfiledTask
+
+VARIANT_COLUMNS = ["name", "sequence", "structure", "fold_structure", "ens_defect"]
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    Lazily splits an iterable into lists of at most size items
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def iter_dataframe_chunks(df, size: int) -> Iterator:
+    """
+    Yields consecutive slices of df with at most size rows
+    """
+    for i in range(0, len(df), size):
+        yield df.iloc[i : i + size]
+
+
+def imap_bounded(pool, func, iterable: Iterable, max_pending: int) -> Iterator:
+    """
+    Like `Pool.imap` but only pulls a new item from iterable when fewer than
+    max_pending are running, so lazy inputs are never fully materialized.
+    Results are returned in order.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while len(pending) > 0:
+        yield pending.popleft().get()
+
+
+def imap_unordered_bounded(pool, func, iterable: Iterable, max_pending: int):
+    """
+    Like `imap_bounded` but yields the results in the order they finish
+    """
+    finished = queue.Queue()
+    num_pending = 0
+
+    def get_next():
+        result, error = finished.get()
+        if error is not None:
+            raise error
+        return result
+
+    for item in iterable:
+        pool.apply_async(
+            func,
+            (item,),
+            callback=lambda r: finished.put((r, None)),
+            error_callback=lambda e: finished.put((None, e)),
+        )
+        num_pending += 1
+        if num_pending >= max_pending:
+            num_pending -= 1
+            yield get_next()
+    while num_pending > 0:
+        num_pending -= 1
+        yield get_next()
+
+
+def apply_async(pool, func, *args) -> asyncio.Future:
+    """
+    Runs func on pool and returns a future of the running asyncio loop that
+    resolves to its result
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def set_result(result):
+        if not future.done():
+            future.set_result(result)
+
+    def set_error(e):
+        if not future.done():
+            future.set_exception(e)
+
+    pool.apply_async(
+        func,
+        args,
+        callback=lambda r: loop.call_soon_threadsafe(set_result, r),
+        error_callback=lambda e: loop.call_soon_threadsafe(set_error, e),
+    )
+    return future
+
+
+def map_chunks(func, chunks: Iterable, num_processes: int = 1, pool=None) -> Iterator:
+    """
+    Applies func to each chunk, on a process pool if num_processes > 1, and yields
+    the results in order as they finish. When the profiler is enabled the stage
+    timings of every chunk are merged into the profiler of this process.
+    :param pool: optional pool of num_processes workers to run on instead of
+    starting a new one, so several maps can share it
+    """
+    if profiler.enabled:
+        task = ProfiledTask(func, profiler.cprofile_file)
+        for result, stats in _map_chunks(task, chunks, num_processes, pool):
+            profiler.merge(stats)
+            yield result
+        return
+    yield from _map_chunks(func, chunks, num_processes, pool)
+
+
+def _map_chunks(func, chunks: Iterable, num_processes: int, pool=None) -> Iterator:
+    if num_processes <= 1:
+        for chunk in chunks:
+            yield func(chunk)
+        return
+    if pool is not None:
+        yield from imap_bounded(pool, func, chunks, num_processes * 4)
+        return
+    with Pool(num_processes) as p:
+        yield from imap_bounded(p, func, chunks, num_processes * 4)
+
+
+def fold_variants(variants) -> List[dict]:
+    """
+    Folds a chunk of variants that each have a target structure
+    :param variants: list of (name, sequence, structure) tuples
+    :return: list of result rows
+    """
+    rows = []
+    for name, sequence, structure in variants:
+        r = fold_sequence(sequence)
+        rows.append(
+            {
+                "name": name,
+                "sequence": sequence,
+                "structure": structure,
+                "fold_structure": r.dot_bracket,
+                "ens_defect": r.ens_defect,
+            }
+        )
+    return rows
+
+
+def open_output(path, newline=None):
+    """
+    Opens path for writing text, paths ending in .gz or .bz2 are compressed
+    """
+    ext = str(path).lower()
+    if ext.endswith(".gz"):
+        return gzip.open(path, "wt", newline=newline)
+    if ext.endswith(".bz2"):
+        return bz2.open(path, "wt", newline=newline)
+    return open(path, "w", newline=newline)
+
+
+class CSVWriter(object):
+    """
+    Writes result rows to a csv file as they arrive instead of collecting them
+    into a single DataFrame first. Paths ending in .gz or .bz2 are compressed.
+    """
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self.num_rows = 0
+        self.__f = open_output(path, newline="")
+        self.__writer = csv.DictWriter(self.__f, fieldnames=columns)
+        self.__writer.writeheader()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write_rows(self, rows: List[dict]) -> None:
+        with profiler.stage("write_output"):
+            self.__writer.writerows(rows)
+            self.__f.flush()
+        self.num_rows += len(rows)
+
+    def write_dataframe(self, df) -> None:
+        if len(df) == 0:
+            return
+        with profiler.stage("write_output"):
+            df.to_csv(self.__f, header=False, index=False, columns=self.columns)
+            self.__f.flush()
+        self.num_rows += len(df)
+
+    def close(self) -> None:
+        self.__f.close()
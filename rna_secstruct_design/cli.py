@@ -1,136 +1,96 @@
+import contextlib
+import functools
+import time
+
 import click
-import yaml
-import pandas as pd
-import numpy as np
-from multiprocessing import Pool
-
-from vienna import fold
-from seq_tools.structure import SequenceStructure
-from rna_secstruct.secstruct import SecStruct
-from rna_secstruct_design.selection import selection_from_file, get_selection
+
 from rna_secstruct_design.logger import setup_applevel_logger, get_logger
-from rna_secstruct_design.mutations import find_multiple_mutations
-from rna_secstruct_design.helix_randomizer import HelixRandomizer
-from rna_secstruct_design.replace import replace_seq_structures
+from rna_secstruct_design.profiler import profiler
+
+# only light modules are imported here so `--help` and short runs start fast,
+# each command imports what it needs
 
 log = get_logger("CLI")
 
 
-def validate_dataframe(df) -> None:
+def progress_options(func):
     """
-    validates a dataframe to have a column named `sequence` and `name`
-    :param df: dataframe with sequences
-    :return: None
+    options shared by the batch commands that report progress
     """
-    if "sequence" not in df.columns:
-        raise ValueError("sequence column not found")
-    if "structure" not in df.columns:
-        raise ValueError("structure column not found")
-    if "name" not in df.columns:
-        df["name"] = [f"seq_{i}" for i in range(len(df))]
+    options = [
+        click.option(
+            "--progress/--no-progress",
+            default=True,
+            help="show items done, folds/s, ETA, cache hits and rejections on stderr",
+        ),
+        click.option(
+            "--metrics-file",
+            type=click.Path(exists=False),
+            default=None,
+            help="also write the progress as JSON lines to this file",
+        ),
+        click.option("--metrics-interval", type=float, default=10.0),
+        click.option("--chunk-size", type=int, default=100),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
 
 
-def get_input_dataframe(
-    seq,
-    struct,
-    csv_file,
-) -> pd.DataFrame:
+# csv, fasta, parquet, arrow or rlib inputs, csv and fasta can be gzip or bz2
+# compressed and "-" is stdin
+input_path = click.Path(exists=True, allow_dash=True)
+INPUT_HELP = (
+    "csv, fasta (optionally .gz/.bz2), parquet, arrow or rlib file, - for stdin"
+)
+OUTPUT_FORMATS = ["csv", "parquet", "arrow", "fasta", "rlib", "delta"]
+
+# output format of the result file, guessed from its extension by default
+format_option = click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(OUTPUT_FORMATS),
+    default=None,
+    help="output format, parquet and arrow need pyarrow and delta is only for "
+    "mut-scan [default: from -o]",
+)
+
+
+def profile_options(func):
     """
-    returns a dataframe from a sequence or a file
-    :param data: can be a seqeunce or a file
-    :return: pd.DataFrame
+    adds --profile and --cprofile to a command. With --profile the per-stage
+    timings of this process and every pool worker are written to a json file
     """
-    if csv_file is not None and seq is not None:
-        raise ValueError("cannot specify both a sequence and a csv file")
-    elif csv_file is not None:
-        log.info(f"reading file {csv_file}")
-        df = pd.read_csv(csv_file)
-        log.info(f"csv file contains {len(df)} sequences")
-    else:
-        log.info(f"reading sequence {seq}")
-        if struct is None:
-            struct = fold(seq).dot_bracket
-        data_df = [["seq", seq, struct]]
-        df = pd.DataFrame(data_df, columns=["name", "sequence", "structure"])
-    validate_dataframe(df)
-    return df
-
-
-def randomize_helices(df, params, num_seqs):
-    data = []
-    hr = HelixRandomizer()
-    for _, row in df.iterrows():
-        secstruct = SecStruct(row["sequence"], row["structure"])
-        exclude = get_selection(secstruct, params)
-        log.info(row["name"])
-        # print(row["name"])
-        for i in range(num_seqs):
-            ens_defect, seq = hr.run(secstruct, exclude)
-            data.append(
-                {
-                    "name": row["name"] + "_" + str(i + 1),
-                    "num": i,
-                    "sequence": seq,
-                    "structure": secstruct.structure,
-                    "ens_defect": ens_defect,
-                }
-            )
-    return pd.DataFrame(data)
-
-
-def split_list(lst, num_chunks):
-    chunk_size = (
-        len(lst) + num_chunks - 1
-    ) // num_chunks  # Round up to get the chunk size
-    return [lst[i : i + chunk_size] for i in range(0, len(lst), chunk_size)]
-
-
-def fold_sequences(results):
-    data = []
-    count = 0
-    for mut in results:
-        rf = fold(mut.sequence)
-        if count % 10 == 0:
-            print(count)
-        data.append(
-            {
-                "name": mut.name,
-                "sequence": mut.sequence,
-                "structure": rf.dot_bracket,
-                "ens_defect": rf.ens_defect,
-            }
-        )
-    return pd.DataFrame(data)
-
-
-def replace_seq_struct_dataframe(df, params):
-    data = []
-    for i, row in df.iterrows():
-        seq_struct = SequenceStructure(row["sequence"], row["structure"])
-        for name, param in params.items():
-            search_ss = SequenceStructure(param["sequence"], param["structure"])
-            replace_ss = SequenceStructure(param["r_sequence"], param["r_structure"])
-            seq_struct = replace_seq_structures(seq_struct, search_ss, replace_ss)
-        r = fold(seq_struct.sequence)
-        if r.dot_bracket != seq_struct.structure:
-            print(f"{row['name']} failed to fold with replacement")
-            # print(row["sequence"])
-            # print(seq_struct.sequence)
-            # print(r.dot_bracket)
-            # print(seq_struct.structure)
-            continue
-        data.append(
-            [
-                row["name"],
-                seq_struct.sequence,
-                seq_struct.structure,
-                r.ens_defect,
-            ]
-        )
-    df_results = pd.DataFrame(
-        data, columns=["name", "sequence", "structure", "ens_defect"]
+
+    @click.option(
+        "--profile",
+        "profile_file",
+        type=click.Path(exists=False),
+        default=None,
+        help="write a per-stage time breakdown to this json file",
     )
-    return df_results
+    @click.option(
+        "--cprofile",
+        "cprofile_file",
+        type=click.Path(exists=False),
+        default=None,
+        help="with --profile, also write cProfile stats of one worker process",
+    )
+    @functools.wraps(func)
+    def wrapper(*args, profile_file, cprofile_file, **kwargs):
+        if profile_file is None:
+            return func(*args, **kwargs)
+        profiler.enable(cprofile_file)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            wall_time = time.perf_counter() - start
+            profiler.write_report(profile_file, func.__name__, wall_time)
+            profiler.disable()
+            log.info(f"wrote profile to {profile_file}")
+
+    return wrapper
 
 
 # multi commmand format
@@ -140,90 +100,676 @@ def cli():
 
 
 @cli.command()
-@click.option("-s", "--seq", type=str, required=True)
+@profile_options
+@click.option("-s", "--seq", type=str, required=False)
 @click.option("-ss", "--struct", type=str, default=None)
+@click.option("-csv", "--csv-file", type=input_path, default=None, help=INPUT_HELP)
 @click.option("-n", "--num-muts", type=int, default=1)
 @click.option("-pf", "--param-file", type=click.Path(exists=True), default=None)
 @click.option("-o", "--output", type=click.Path(exists=False), default="output.csv")
 @click.option("-p", "--num-processes", type=int, default=1)
-def mut_scan(seq, struct, num_muts, param_file, num_processes, output):
+@format_option
+@click.option(
+    "--dedup",
+    is_flag=True,
+    help="fold identical mutants only once, always on with --csv-file",
+)
+@progress_options
+def mut_scan(
+    seq,
+    struct,
+    csv_file,
+    num_muts,
+    param_file,
+    num_processes,
+    output,
+    fmt,
+    dedup,
+    progress,
+    metrics_file,
+    metrics_interval,
+    chunk_size,
+):
+    from rna_secstruct_design.batch import chunked, map_chunks
+    from rna_secstruct_design.commands import (
+        count_mutations,
+        get_input_rows,
+        get_mutations,
+        fold_sequences_chunk,
+        iter_mutations,
+    )
+    from rna_secstruct_design.dedup import dedup_mutations, get_group_subset
+    from rna_secstruct_design.delta import DeltaWriter
+    from rna_secstruct_design.formats import get_format, open_writer
+    from rna_secstruct_design.progress import ProgressReporter
+    from rna_secstruct_design.selection import selection_from_file
+
     setup_applevel_logger()
     if num_processes > 1:
         log.info(f"running with multiprocess! {num_processes} processes")
-    if struct is None:
-        struct = fold(seq).dot_bracket
-    secstruct = SecStruct(seq, struct)
+    rows = get_input_rows(seq, struct, csv_file)
+    fmt = get_format(output, fmt)
+    if fmt == "delta":
+        # the wild types go at the top of the file
+        rows = list(rows)
     if param_file is not None:
         params = selection_from_file(param_file)
-        exclude = get_selection(secstruct, params)
     else:
-        exclude = []
-    results = find_multiple_mutations(secstruct.sequence, num_muts, exclude)
-    if num_processes > 1:
-        with Pool(num_processes) as p:
-            results = p.starmap(
-                fold_sequences,
-                [(chunk,) for chunk in split_list(results, num_processes)],
-            )
-            df = pd.concat(results)
+        params = {}
+    # with a single sequence the mutant names stay as they were
+    prefix_names = csv_file is not None
+    groups = None
+    if dedup or csv_file is not None:
+        results = get_mutations(rows, params, num_muts, prefix_names=prefix_names)
+        # constructs of a file can share a name, only --dedup asks for unique ones
+        results, groups, stats = dedup_mutations(results, key_by_index=not dedup)
+        log.info(f"dedup: {stats}")
+        total = len(results)
     else:
-        df = fold_sequences(results)
-    df.to_csv(output, index=False)
+        # the mutants of a single sequence are streamed to the pool
+        results = iter_mutations(rows, params, num_muts, prefix_names=prefix_names)
+        total = count_mutations(rows, params, num_muts)
+        log.info(f"{total} mutants")
+    chunks = (
+        (chunk, get_group_subset(groups, [mut.name for mut in chunk]))
+        for chunk in chunked(results, chunk_size)
+    )
+    columns = ["name", "sequence", "structure", "ens_defect"]
+    reporter = ProgressReporter(
+        total, "mut_scan", progress, metrics_file, metrics_interval
+    )
+    if fmt == "delta":
+        writer = DeltaWriter(output, rows, prefix_names)
+    else:
+        writer = open_writer(output, columns, fmt)
+    with writer, reporter:
+        for result_rows, metrics in map_chunks(
+            fold_sequences_chunk, chunks, num_processes
+        ):
+            writer.write_rows(result_rows)
+            reporter.update(metrics)
+    log.info(f"wrote {writer.num_rows} structures to {output}")
 
 
 @cli.command()
+@profile_options
 @click.option("-s", "--seq", type=str, required=False)
 @click.option("-ss", "--struct", type=str, default=False)
-@click.option("-csv", "--csv-file", type=click.Path(exists=True), default=None)
+@click.option("-csv", "--csv-file", type=input_path, default=None, help=INPUT_HELP)
 @click.option("-pf", "--param-file", type=click.Path(exists=True), default=None)
 @click.option("-o", "--output", type=click.Path(exists=False), default="output.csv")
 @click.option("-n", "--num-seqs", type=int, default=10)
 @click.option("-p", "--num-processes", type=int, default=1)
+@format_option
 @click.option("-d", "--debug", is_flag=True)
+@click.option(
+    "--dedup", is_flag=True, help="design identical sequence/structures only once"
+)
+@click.option(
+    "--stats-columns",
+    is_flag=True,
+    help="add the rejection sampling stats of each design as columns",
+)
+@click.option(
+    "--design-stats",
+    type=click.Path(exists=False),
+    default=None,
+    help="write the rejection sampling stats of each design to this csv file",
+)
+@click.option(
+    "--min-distance",
+    type=int,
+    default=0,
+    help="min hamming distance between the designs of each sequence",
+)
+@click.option(
+    "--max-off-target",
+    type=int,
+    default=None,
+    help="reject candidates that can pair more than this many bases off target "
+    "before folding them",
+)
+@click.option(
+    "--helix-library",
+    type=click.Path(exists=True, file_okay=False),
+    default=None,
+    help="sample helices from a library made by build-helix-library",
+)
+@click.option(
+    "--energy-band",
+    type=float,
+    nargs=2,
+    default=None,
+    help="min and max energy per basepair in kcal/mol of the library helices",
+)
+@progress_options
 def helix_rand(
-    seq, struct, csv_file, param_file, num_seqs, num_processes, output, debug
+    seq,
+    struct,
+    csv_file,
+    param_file,
+    num_seqs,
+    num_processes,
+    output,
+    fmt,
+    debug,
+    dedup,
+    stats_columns,
+    design_stats,
+    min_distance,
+    max_off_target,
+    helix_library,
+    energy_band,
+    progress,
+    metrics_file,
+    metrics_interval,
+    chunk_size,
 ):
+    from rna_secstruct_design.batch import map_chunks
+    from rna_secstruct_design.commands import (
+        get_input_dataframe,
+        iter_dataframe_chunks_with_groups,
+        iter_input_chunks,
+        randomize_helices_chunk,
+    )
+    from rna_secstruct_design.dedup import dedup_dataframe
+    from rna_secstruct_design.formats import open_writer
+    from rna_secstruct_design.helix_randomizer import DESIGN_STATS_COLUMNS
+    from rna_secstruct_design.progress import ProgressReporter
+    from rna_secstruct_design.selection import selection_from_file
+
     setup_applevel_logger(is_debug=debug)
-    df = get_input_dataframe(seq, struct, csv_file)
     if param_file is not None:
         params = selection_from_file(param_file)
     else:
         params = {}
-    if num_processes > 1:
-        with Pool(num_processes) as p:
-            results = p.starmap(
-                randomize_helices,
-                [
-                    (df_s, params, num_seqs)
-                    for df_s in np.array_split(df, num_processes)
-                ],
-            )
-        df = pd.concat(results)
+    if csv_file is not None and seq is None and not dedup:
+        # stream the input, its length is not known up front
+        log.info(f"reading file {csv_file}")
+        total = None
+        chunks = iter_input_chunks(csv_file, chunk_size)
     else:
-        df = randomize_helices(df, params, num_seqs)
-    # df = pd.DataFrame(data)
-    df.to_csv(output, index=False)
+        df = get_input_dataframe(seq, struct, csv_file)
+        groups = None
+        if dedup:
+            df, groups, stats = dedup_dataframe(df)
+            log.info(f"dedup: {stats}")
+        total = len(df)
+        chunks = iter_dataframe_chunks_with_groups(df, groups, chunk_size)
+    func = functools.partial(
+        randomize_helices_chunk,
+        params=params,
+        num_seqs=num_seqs,
+        min_distance=min_distance,
+        max_off_target=max_off_target,
+        helix_library=helix_library,
+        energy_band=energy_band,
+    )
+    columns = ["name", "num", "sequence", "structure", "ens_defect"]
+    if stats_columns:
+        columns += DESIGN_STATS_COLUMNS
+    reporter = ProgressReporter(
+        total, "helix_rand", progress, metrics_file, metrics_interval
+    )
+    with contextlib.ExitStack() as stack:
+        writer = stack.enter_context(open_writer(output, columns, fmt))
+        stats_writer = None
+        if design_stats is not None:
+            stats_writer = stack.enter_context(
+                open_writer(design_stats, ["name"] + DESIGN_STATS_COLUMNS)
+            )
+        stack.enter_context(reporter)
+        for df_results, metrics in map_chunks(func, chunks, num_processes):
+            writer.write_dataframe(df_results)
+            if stats_writer is not None:
+                stats_writer.write_dataframe(df_results)
+            reporter.update(metrics)
+    log.info(f"wrote {writer.num_rows} designs to {output}")
+    if design_stats is not None:
+        log.info(f"wrote design stats to {design_stats}")
 
 
 @cli.command()
-@click.argument("csv", type=click.Path(exists=True))
+@profile_options
+@click.argument("csv", type=input_path)
 @click.argument("param_file", type=click.Path(exists=True))
 @click.option("-o", "--output", type=click.Path(exists=False), default="output.csv")
+@click.option("-r", "--rejects", type=click.Path(exists=False), default="rejects.csv")
 @click.option("-p", "--num-processes", type=int, default=1)
-def replace(csv, param_file, output, num_processes):
-    df = pd.read_csv(csv)
-    validate_dataframe(df)
+@format_option
+@click.option(
+    "--dedup", is_flag=True, help="process identical sequence/structures only once"
+)
+@progress_options
+def replace(
+    csv,
+    param_file,
+    output,
+    rejects,
+    num_processes,
+    fmt,
+    dedup,
+    progress,
+    metrics_file,
+    metrics_interval,
+    chunk_size,
+):
+    import yaml
+    from rna_secstruct_design.batch import map_chunks
+    from rna_secstruct_design.commands import (
+        get_input_dataframe,
+        iter_dataframe_chunks_with_groups,
+        iter_input_chunks,
+        replace_chunk,
+    )
+    from rna_secstruct_design.dedup import dedup_dataframe
+    from rna_secstruct_design.formats import open_writer
+    from rna_secstruct_design.progress import ProgressReporter
+
+    setup_applevel_logger()
     params = yaml.safe_load(open(param_file))
-    if num_processes > 1:
-        with Pool(num_processes) as p:
-            results = p.starmap(
-                replace_seq_struct_dataframe,
-                [(df_s, params) for df_s in np.array_split(df, num_processes)],
-            )
-            df_results = pd.concat(results)
+    if dedup:
+        df = get_input_dataframe(None, None, csv)
+        df, groups, stats = dedup_dataframe(df)
+        log.info(f"dedup: {stats}")
+        total = len(df)
+        chunks = iter_dataframe_chunks_with_groups(df, groups, chunk_size)
+    else:
+        total = None
+        chunks = iter_input_chunks(csv, chunk_size)
+    func = functools.partial(replace_chunk, params=params)
+    reporter = ProgressReporter(
+        total, "replace", progress, metrics_file, metrics_interval
+    )
+    with open_writer(
+        output, ["name", "sequence", "structure", "ens_defect"], fmt
+    ) as writer, open_writer(
+        rejects, ["name", "reason", "structure"]
+    ) as rejects_writer, reporter:
+        for (df_results, df_rejects), metrics in map_chunks(
+            func, chunks, num_processes
+        ):
+            writer.write_dataframe(df_results)
+            rejects_writer.write_dataframe(df_rejects)
+            reporter.update(metrics)
+    num_inputs = writer.num_rows + rejects_writer.num_rows
+    log.info(f"{rejects_writer.num_rows} of {num_inputs} sequences rejected")
+    for reason, count in reporter.metrics.rejects.items():
+        log.info(f"{reason}: {count}")
+
+
+@cli.command()
+@profile_options
+@click.option("-s", "--seq", type=str, required=True)
+@click.option("-ss", "--struct", type=str, default=None)
+@click.option(
+    "-hr",
+    "--helix-range",
+    type=str,
+    multiple=True,
+    required=True,
+    help="helix position and lengths to scan as POS:MIN-MAX, can be repeated",
+)
+@click.option("-o", "--output", type=click.Path(exists=False), default="output.csv")
+@click.option("-p", "--num-processes", type=int, default=1)
+@format_option
+@click.option("--chunk-size", type=int, default=100)
+def helix_length_scan(seq, struct, helix_range, output, num_processes, fmt, chunk_size):
+    from rna_secstruct.secstruct import SecStruct
+    from rna_secstruct_design.commands import (
+        parse_helix_ranges,
+        iter_helix_length_variants,
+        write_folded_variants,
+    )
+    from rna_secstruct_design.folding import fold_sequence
+    from rna_secstruct_design.mutations import count_all_helix_lengths
+
+    setup_applevel_logger()
+    if struct is None:
+        struct = fold_sequence(seq).dot_bracket
+    secstruct = SecStruct(seq, struct)
+    h_ranges = parse_helix_ranges(helix_range)
+    for pos in h_ranges:
+        if not secstruct[pos].is_helix():
+            raise ValueError(f"motif {pos} is not a helix")
+    log.info(f"scanning {count_all_helix_lengths(h_ranges)} helix length combinations")
+    variants = iter_helix_length_variants(secstruct, h_ranges)
+    write_folded_variants(variants, output, num_processes, chunk_size, fmt)
+
+
+@cli.command()
+@profile_options
+@click.option("-s", "--seq", type=str, required=True)
+@click.option("-ss", "--struct", type=str, default=None)
+@click.option("-n", "--num-bps", type=int, default=1)
+@click.option("-pf", "--param-file", type=click.Path(exists=True), default=None)
+@click.option(
+    "--random",
+    "num_random",
+    type=int,
+    default=None,
+    help="sample this many random mutants instead of scanning all of them",
+)
+@click.option("--max-muts", type=int, default=1000000)
+@click.option("--gu/--no-gu", default=True, help="allow GU basepairs")
+@click.option("--flank-bp", is_flag=True, help="allow basepairs next to loops")
+@click.option("-o", "--output", type=click.Path(exists=False), default="output.csv")
+@click.option("-p", "--num-processes", type=int, default=1)
+@format_option
+@click.option("--chunk-size", type=int, default=100)
+def bp_scan(
+    seq,
+    struct,
+    num_bps,
+    param_file,
+    num_random,
+    max_muts,
+    gu,
+    flank_bp,
+    output,
+    num_processes,
+    fmt,
+    chunk_size,
+):
+    from rna_secstruct_design.commands import (
+        get_secstruct_and_exclude,
+        iter_basepair_variants,
+        write_folded_variants,
+    )
+    from rna_secstruct_design.mutations import (
+        get_basepair_mutuations_random,
+        iter_basepair_mutations,
+    )
+
+    setup_applevel_logger()
+    secstruct, exclude = get_secstruct_and_exclude(seq, struct, param_file)
+    if num_random is not None:
+        sequences = get_basepair_mutuations_random(
+            secstruct, num_bps, exclude, gu, flank_bp, num_random
+        )
     else:
-        df_results = replace_seq_struct_dataframe(df, params)
-    df_results.to_csv(output, index=False)
+        sequences = iter_basepair_mutations(
+            secstruct, num_bps, exclude, gu, flank_bp, max_muts
+        )
+    variants = iter_basepair_variants(secstruct, sequences)
+    write_folded_variants(variants, output, num_processes, chunk_size, fmt)
+
+
+@cli.command()
+@profile_options
+@click.option("-s", "--seq", type=str, required=True)
+@click.option("-ss", "--struct", type=str, default=None)
+@click.option(
+    "-m",
+    "--mode",
+    type=click.Choice(["insert", "remove", "remove-unpaired"]),
+    default="remove-unpaired",
+)
+@click.option("-n", "--num", type=int, default=1, help="nucleotides to add or remove")
+@click.option("-pf", "--param-file", type=click.Path(exists=True), default=None)
+@click.option("--all-nucleotides", is_flag=True, help="insert every nucleotide")
+@click.option("-o", "--output", type=click.Path(exists=False), default="output.csv")
+@click.option("-p", "--num-processes", type=int, default=1)
+@format_option
+@click.option("--chunk-size", type=int, default=100)
+def indel_scan(
+    seq,
+    struct,
+    mode,
+    num,
+    param_file,
+    all_nucleotides,
+    output,
+    num_processes,
+    fmt,
+    chunk_size,
+):
+    from rna_secstruct_design.commands import (
+        get_secstruct_and_exclude,
+        iter_indel_variants,
+        write_folded_variants,
+    )
+
+    setup_applevel_logger()
+    secstruct, exclude = get_secstruct_and_exclude(seq, struct, param_file)
+    count, variants = iter_indel_variants(
+        secstruct, mode, num, exclude, all_nucleotides
+    )
+    log.info(f"folding {count} distinct {mode} variants")
+    write_folded_variants(variants, output, num_processes, chunk_size, fmt)
+
+
+@cli.command()
+@profile_options
+@click.argument("input_file", type=input_path)
+@click.option("-o", "--output", type=click.Path(exists=False), default="output.csv")
+@click.option("-n", "--num", type=int, default=None, help="max sequences to keep")
+@click.option(
+    "-d",
+    "--min-distance",
+    type=int,
+    default=1,
+    help="min hamming distance between kept sequences",
+)
+@format_option
+def diversify(input_file, output, num, min_distance, fmt):
+    """
+    keeps a diverse subset of a library, picking the sequence farthest from all
+    kept ones until num are kept or none is min-distance away
+    """
+    from rna_secstruct_design.commands import (
+        read_input_dataframe,
+        diversify_dataframe,
+    )
+    from rna_secstruct_design.formats import open_writer
+
+    setup_applevel_logger()
+    df = read_input_dataframe(input_file)
+    log.info(f"read {len(df)} sequences from {input_file}")
+    df = diversify_dataframe(df, num, min_distance)
+    with open_writer(output, list(df.columns), fmt) as writer:
+        writer.write_dataframe(df)
+    log.info(f"wrote {writer.num_rows} sequences to {output}")
+
+
+@cli.command()
+@profile_options
+@click.argument("input_file", type=input_path)
+@click.option("-o", "--output", type=click.Path(exists=False), default="output.csv")
+@click.option(
+    "-k",
+    "--max-distance",
+    type=int,
+    default=1,
+    help="max edit distance between sequences in the same cluster",
+)
+@click.option(
+    "-q", type=int, default=None, help="q-gram size, from the shortest sequence"
+)
+@click.option(
+    "--representatives",
+    is_flag=True,
+    help="only keep the first sequence of every cluster",
+)
+@format_option
+def cluster(input_file, output, max_distance, q, representatives, fmt):
+    """
+    clusters a library of any sequence lengths by edit distance and adds the
+    cluster of every sequence as a cluster column
+    """
+    from rna_secstruct_design.commands import (
+        read_input_dataframe,
+        cluster_dataframe,
+    )
+    from rna_secstruct_design.formats import open_writer
+
+    setup_applevel_logger()
+    df = read_input_dataframe(input_file)
+    log.info(f"read {len(df)} sequences from {input_file}")
+    df = cluster_dataframe(df, max_distance, q, representatives)
+    with open_writer(output, list(df.columns), fmt) as writer:
+        writer.write_dataframe(df)
+    log.info(f"wrote {writer.num_rows} sequences to {output}")
+
+
+@cli.command()
+@profile_options
+@click.argument("spec_file", type=click.Path(exists=True))
+@click.option(
+    "-i", "--input", "input_file", type=input_path, default=None, help=INPUT_HELP
+)
+@click.option("-o", "--output", type=click.Path(exists=False), default=None)
+@click.option("-p", "--num-processes", type=int, default=None)
+@format_option
+def pipeline(spec_file, input_file, output, num_processes, fmt):
+    """
+    runs the helix_rand, replace and mut_scan stages of a yaml spec in one
+    process, streaming records from stage to stage. -i, -o and -p override the
+    input, output and num_processes of the spec.
+    """
+    from rna_secstruct_design.commands import iter_input_records
+    from rna_secstruct_design.pipeline import Pipeline, load_pipeline_spec
+
+    setup_applevel_logger()
+    spec = load_pipeline_spec(spec_file)
+    input_file = input_file or spec.get("input")
+    output = output or spec.get("output", "output.csv")
+    if input_file is None:
+        raise click.UsageError("no input given with -i or in the spec")
+    if num_processes is not None:
+        spec["num_processes"] = num_processes
+    p = Pipeline(spec)
+    log.info(f"running {' -> '.join(s.type for s in p.stages)} on {input_file}")
+    num_rows = p.run(iter_input_records(input_file), output, fmt)
+    log.info(f"wrote {num_rows} rows to {output}")
+
+
+@cli.command()
+@profile_options
+@click.argument("jobs_file", type=click.Path(exists=True))
+@click.option("-p", "--num-processes", type=int, default=None)
+def run_jobs(jobs_file, num_processes):
+    """
+    runs every helix_rand, replace and mut_scan job of a yaml file on one shared
+    worker pool, each job writes its own output. -p overrides the num_processes
+    of the file.
+    """
+    from rna_secstruct_design.jobs import JobRunner, load_jobs
+
+    setup_applevel_logger()
+    spec = load_jobs(jobs_file)
+    if num_processes is None:
+        num_processes = spec.get("num_processes", 1)
+    runner = JobRunner(spec["jobs"], num_processes, spec.get("chunk_size", 100))
+    log.info(f"running {len(runner.jobs)} jobs on {num_processes} processes")
+    jobs = runner.run()
+    failed = [job.name for job in jobs if job.error is not None]
+    if failed:
+        raise click.ClickException(f"{len(failed)} jobs failed: {', '.join(failed)}")
+
+
+@cli.command()
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(exists=False),
+    default=None,
+    help="unix socket to listen on instead of a localhost port",
+)
+@click.option("--host", default="127.0.0.1", help="address to listen on")
+@click.option("--port", type=int, default=8765)
+@click.option("-p", "--num-processes", type=int, default=1)
+@click.option(
+    "--chunk-size",
+    type=int,
+    default=100,
+    help="input rows per work unit, mutants for mut_scan",
+)
+@click.option(
+    "--batch-size", type=int, default=8, help="max work units sent to a worker at once"
+)
+@click.option(
+    "--max-requests", type=int, default=16, help="requests run at the same time"
+)
+@click.option("--max-rows", type=int, default=10000, help="max input rows of a request")
+def serve(
+    socket_path,
+    host,
+    port,
+    num_processes,
+    chunk_size,
+    batch_size,
+    max_requests,
+    max_rows,
+):
+    """
+    serves helix_rand, replace and mut_scan requests as json lines on a warm
+    worker pool, see rna_secstruct_design/server.py for the protocol
+    """
+    import asyncio
+
+    from rna_secstruct_design.server import DesignServer
+
+    setup_applevel_logger()
+    server = DesignServer(
+        num_processes,
+        chunk_size,
+        batch_size,
+        max_requests=max_requests,
+        max_rows=max_rows,
+    )
+    try:
+        asyncio.run(server.serve_forever(socket_path=socket_path, host=host, port=port))
+    except KeyboardInterrupt:
+        log.info("stopped")
+
+
+@cli.command()
+@click.argument("output", type=click.Path(exists=False))
+@click.option(
+    "--max-length",
+    type=int,
+    default=8,
+    help="longest helix in basepairs, the library grows 6x per basepair",
+)
+def build_helix_library(output, max_length):
+    """
+    enumerates every helix sequence that satisfies the helix constraints up to
+    max-length basepairs with its nearest neighbor energy, for helix-rand
+    --helix-library
+    """
+    from rna_secstruct_design import helix_library
+
+    setup_applevel_logger()
+    helix_library.build_helix_library(output, max_length)
+    log.info(f"wrote helix library to {output}")
+
+
+@cli.command()
+@profile_options
+@click.argument("input_file", type=input_path)
+@click.argument("output", type=click.Path(exists=False))
+@format_option
+@click.option("--chunk-size", type=int, default=10000)
+def convert(input_file, output, fmt, chunk_size):
+    """
+    converts a library between csv, fasta, parquet, arrow and the 2-bit packed
+    rlib format
+    """
+    import itertools
+
+    from rna_secstruct_design.batch import chunked
+    from rna_secstruct_design.formats import open_writer
+    from rna_secstruct_design.readers import iter_records
+
+    setup_applevel_logger()
+    records = iter_records(input_file)
+    first = list(itertools.islice(records, 1))
+    columns = list(first[0]) if first else ["name", "sequence", "structure"]
+    with open_writer(output, columns, fmt) as writer:
+        for chunk in chunked(itertools.chain(first, records), chunk_size):
+            writer.write_rows(chunk)
+    log.info(f"wrote {writer.num_rows} records to {output}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,197 @@
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import editdistance
+import numpy as np
+
+from rna_secstruct_design.encoding import encode_sequences
+
+# single linkage clustering of sequences of any length by edit distance. Only
+# pairs that pass two filters are compared with `editdistance`:
+#
+# - length: sequences more than max_distance apart in length cannot be within
+#   max_distance edits. Sequences are processed from shortest to longest and only
+#   compared to earlier ones in that length window.
+# - q-grams: two sequences within k edits share at least len - q + 1 - k * q of
+#   their q-grams (counting repeats). Every q-gram occurrence is an item and
+#   items are ordered from rarest to most common in the library. Two sequences
+#   that share that many items must share one of their k * q + 1 rarest items,
+#   so only those are put in the inverted index and looked up.
+#
+# pairs whose sequences are already in the same cluster are never compared.
+
+# 6**MAX_Q times the number of sequences or the max length has to fit in int64
+MAX_Q = 12
+
+
+@dataclass
+class ClusterStats:
+    """
+    How much work the filters saved
+    """
+
+    sequences: int = 0
+    clusters: int = 0
+    candidates: int = 0
+    compared: int = 0
+    linked: int = 0
+
+    def __str__(self):
+        return (
+            f"{self.clusters} clusters of {self.sequences} sequences, "
+            f"{self.candidates} candidate pairs, {self.compared} edit distances "
+            f"computed, {self.linked} pairs linked"
+        )
+
+
+class UnionFind(object):
+    def __init__(self, num: int):
+        self.parent = list(range(num))
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> None:
+        i, j = self.find(i), self.find(j)
+        if i != j:
+            self.parent[max(i, j)] = min(i, j)
+
+
+def get_qgram_size(lengths: np.ndarray, max_distance: int) -> int:
+    """
+    largest q up to `MAX_Q` for which the q-gram filter can still prune pairs of
+    the shortest sequences
+    """
+    min_length = int(lengths.min()) if len(lengths) > 0 else 0
+    return max(2, min(MAX_Q, min_length // (max_distance + 1)))
+
+
+def get_qgram_items(
+    encoded: np.ndarray, lengths: np.ndarray, q: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    every q-gram occurrence of every sequence as a unique integer: the q-gram and
+    the number of times it occurred before in its sequence
+    :param encoded: sequences encoded by `encode_sequences`
+    :param lengths: length of every sequence
+    :param q: q-gram size
+    :return: index of the sequence of every item and the items, sorted by sequence
+    """
+    num_grams = encoded.shape[1] - q + 1
+    if num_grams <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    codes = encoded.astype(np.int64)
+    grams = np.zeros((len(encoded), num_grams), dtype=np.int64)
+    for j in range(q):
+        grams = grams * 6 + codes[:, j : j + num_grams]
+    valid = np.arange(num_grams)[None, :] < (lengths - q + 1)[:, None]
+    seq_ids = np.nonzero(valid)[0]
+    grams = grams[valid]
+    # count earlier occurrences within runs of the same sequence and q-gram
+    keys = seq_ids * 6**q + grams
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    new_run = np.r_[True, keys[1:] != keys[:-1]]
+    starts = np.flatnonzero(new_run)
+    positions = np.arange(len(order))
+    occurrence = np.empty(len(order), dtype=np.int64)
+    occurrence[order] = positions - starts[np.cumsum(new_run) - 1]
+    return seq_ids, grams * (int(lengths.max()) + 1) + occurrence
+
+
+def cluster_sequences(
+    sequences, max_distance: int = 1, q: Optional[int] = None
+) -> Tuple[np.ndarray, ClusterStats]:
+    """
+    Single linkage clusters of sequences, two sequences are in the same cluster if
+    a chain of sequences at most max_distance edits apart connects them
+    :param sequences: sequences of any length
+    :param max_distance: max edit distance (substitutions, insertions and
+    deletions) between linked sequences
+    :param q: q-gram size, from the shortest sequence if None
+    :return: cluster id of every sequence, numbered in order of first appearance,
+    and `ClusterStats`
+    """
+    sequences = sequences.tolist() if hasattr(sequences, "tolist") else list(sequences)
+    num = len(sequences)
+    stats = ClusterStats(sequences=num)
+    if num == 0:
+        return np.zeros(0, dtype=np.int64), stats
+    lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=num)
+    if q is None:
+        q = get_qgram_size(lengths, max_distance)
+    encoded = encode_sequences(sequences)
+    seq_ids, items = get_qgram_items(encoded, lengths, q)
+    num_items = np.bincount(seq_ids, minlength=num).tolist()
+    prefixes = _get_prefixes(seq_ids, items, num, max_distance * q + 1)
+    lengths = lengths.tolist()
+
+    order = sorted(range(num), key=lengths.__getitem__)
+    uf = UnionFind(num)
+    # item -> [start, ids], ids are in processing order so the ids that fell out
+    # of the length window are skipped by moving start forward
+    index = {}
+    # sequences too short for the q-gram filter are compared with every sequence
+    # in their length window, before and after them
+    processed, processed_start = [], 0
+    short, short_start = [], 0
+    for i in order:
+        min_length = lengths[i] - max_distance
+        while (
+            processed_start < len(processed)
+            and lengths[processed[processed_start]] < min_length
+        ):
+            processed_start += 1
+        while short_start < len(short) and lengths[short[short_start]] < min_length:
+            short_start += 1
+        if num_items[i] <= max_distance * q:
+            candidates = set(processed[processed_start:])
+            short.append(i)
+        else:
+            candidates = set(short[short_start:])
+            for item in prefixes[i]:
+                entry = index.setdefault(item, [0, []])
+                ids = entry[1]
+                while entry[0] < len(ids) and lengths[ids[entry[0]]] < min_length:
+                    entry[0] += 1
+                candidates.update(ids[entry[0] :])
+                ids.append(i)
+        processed.append(i)
+        stats.candidates += len(candidates)
+        for j in candidates:
+            if uf.find(j) == uf.find(i):
+                continue
+            stats.compared += 1
+            if editdistance.eval(sequences[i], sequences[j]) <= max_distance:
+                uf.union(i, j)
+                stats.linked += 1
+    roots = np.array([uf.find(i) for i in range(num)])
+    _, first, cluster_ids = np.unique(roots, return_index=True, return_inverse=True)
+    # renumber so clusters are numbered in order of their first sequence
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first)] = np.arange(len(first))
+    stats.clusters = len(first)
+    return rank[cluster_ids], stats
+
+
+def _get_prefixes(
+    seq_ids: np.ndarray, items: np.ndarray, num: int, size: int
+) -> List[List[int]]:
+    """
+    ranks every item by how often it occurs in the library, rarest first, and
+    returns the size lowest ranks of each sequence
+    """
+    uniques, inverse, counts = np.unique(items, return_inverse=True, return_counts=True)
+    unique_ranks = np.empty(len(uniques), dtype=np.int64)
+    unique_ranks[np.lexsort((uniques, counts))] = np.arange(len(uniques))
+    ranks = unique_ranks[inverse]
+    ranks = np.sort(seq_ids * len(uniques) + ranks)
+    seq_ids, ranks = np.divmod(ranks, len(uniques))
+    starts = np.searchsorted(seq_ids, np.arange(num))
+    keep = np.arange(len(ranks)) - starts[seq_ids] < size
+    ends = np.searchsorted(seq_ids[keep], np.arange(1, num + 1))
+    return [x.tolist() for x in np.split(ranks[keep], ends[:-1])]
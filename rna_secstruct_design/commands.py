@@ -0,0 +1,566 @@
+import functools
+import json
+from dataclasses import asdict
+from typing import Iterable, Iterator
+
+from rna_secstruct.secstruct import SecStruct
+
+from rna_secstruct_design.selection import selection_from_file, get_selection
+from rna_secstruct_design.logger import get_logger
+from rna_secstruct_design.mutations import (
+    Mutation,
+    count_multiple_mutations,
+    iter_multiple_mutations,
+    get_mutation_name,
+    iter_all_helix_lengths,
+    iter_add_unpaired_sweep,
+    count_add_unpaired_sweep,
+    iter_remove_unpaired_nucleotide_sweep,
+    count_remove_unpaired_nucleotide_sweep,
+    iter_remove_nucleotide_sweep,
+    count_remove_nucleotide_sweep,
+)
+from rna_secstruct_design.helix_randomizer import HelixRandomizer
+from rna_secstruct_design.replace import MultiPatternReplacer
+from rna_secstruct_design.folding import fold_mfe, fold_sequence, fold_cache
+from rna_secstruct_design.profiler import profiler
+from rna_secstruct_design.progress import BatchMetrics, record_folds
+from rna_secstruct_design.batch import (
+    VARIANT_COLUMNS,
+    chunked,
+    iter_dataframe_chunks,
+    map_chunks,
+    fold_variants,
+)
+from rna_secstruct_design.dedup import get_aliases, get_group_subset
+from rna_secstruct_design.formats import open_writer, read_dataframe
+from rna_secstruct_design.readers import get_input_format, iter_records
+
+# the work behind each cli command. The clustering, diversity and helix_library
+# modules are only imported by the functions that need them. rna_secstruct and
+# seq_tools are imported here and load numpy and pandas themselves
+
+log = get_logger("CLI")
+
+# designs tried per requested design when they have to be a min distance apart
+MAX_DIVERSITY_ATTEMPTS = 10
+# parsed structures and their selections kept per process, so a worker that sees
+# the same construct again skips parsing and the motif search
+MAX_CACHED_SELECTIONS = 1024
+
+
+def validate_dataframe(df) -> None:
+    """
+    validates a dataframe to have a column named `sequence` and `name`
+    :param df: dataframe with sequences
+    :return: None
+    """
+    if "sequence" not in df.columns:
+        raise ValueError("sequence column not found")
+    if "structure" not in df.columns:
+        raise ValueError("structure column not found")
+    if "name" not in df.columns:
+        df["name"] = [f"seq_{i}" for i in range(len(df))]
+
+
+@functools.lru_cache(maxsize=MAX_CACHED_SELECTIONS)
+def _get_cached_selection(sequence, structure, params_key):
+    with profiler.stage("secstruct_parse"):
+        secstruct = SecStruct(sequence, structure)
+    return secstruct, tuple(get_selection(secstruct, json.loads(params_key)))
+
+
+def get_row_selection(sequence, structure, params):
+    """
+    parses a structure and selects the positions of params in it, both are cached
+    per process
+    :param params: selection parameters, not modified
+    :return: SecStruct and list of selected positions
+    """
+    params_key = json.dumps(params, sort_keys=True)
+    secstruct, pos = _get_cached_selection(sequence, structure, params_key)
+    return secstruct, list(pos)
+
+
+def get_input_dataframe(
+    seq,
+    struct,
+    csv_file,
+):
+    """
+    returns a dataframe from a sequence or a file
+    :param data: can be a seqeunce or a file
+    :return: pd.DataFrame
+    """
+    import pandas as pd
+
+    if csv_file is not None and seq is not None:
+        raise ValueError("cannot specify both a sequence and a csv file")
+    elif csv_file is None and seq is None:
+        raise ValueError("must specify a sequence or a csv file")
+    elif csv_file is not None:
+        log.info(f"reading file {csv_file}")
+        fmt = get_input_format(csv_file)
+        if fmt in ["fasta", None]:
+            df = pd.DataFrame(list(iter_input_records(csv_file)))
+        else:
+            df = read_dataframe(csv_file)
+        log.info(f"csv file contains {len(df)} sequences")
+    else:
+        log.info(f"reading sequence {seq}")
+        if struct is None:
+            struct = fold_sequence(seq).dot_bracket
+        data_df = [["seq", seq, struct]]
+        df = pd.DataFrame(data_df, columns=["name", "sequence", "structure"])
+    validate_dataframe(df)
+    return df
+
+
+def randomize_helices(
+    df,
+    params,
+    num_seqs,
+    groups=None,
+    metrics=None,
+    min_distance=0,
+    max_off_target=None,
+    helix_library=None,
+    energy_band=None,
+):
+    """
+    designs num_seqs new helix sequences for every row
+    :param df: dataframe with `name`, `sequence` and `structure` columns
+    :param params: selection parameters of positions to keep
+    :param num_seqs: number of designs per row
+    :param groups: optional dictionary from `dedup_dataframe`, results are written
+    for every name a row stands for
+    :param metrics: optional `BatchMetrics` to count rejected candidates in
+    :param min_distance: min hamming distance between the designs of a row, at
+    most `MAX_DIVERSITY_ATTEMPTS` x num_seqs designs are tried to find them
+    :param max_off_target: off target pairing prefilter of `HelixRandomizer`
+    :param helix_library: optional directory of a `HelixLibrary` to sample
+    helices from
+    :param energy_band: (min, max) energy per basepair of the sampled helices
+    :return: dataframe of designs with the `DesignStats` of each as columns
+    """
+    import pandas as pd
+
+    from rna_secstruct_design.diversity import MinDistanceFilter
+    from rna_secstruct_design.helix_library import get_helix_library
+
+    data = []
+    library = None
+    if helix_library is not None:
+        library = get_helix_library(helix_library)
+    hr = HelixRandomizer(max_off_target, library, energy_band)
+    for _, row in df.iterrows():
+        secstruct, exclude = get_row_selection(
+            row["sequence"], row["structure"], params
+        )
+        log.info(row["name"])
+        diversity_filter = MinDistanceFilter(min_distance)
+        i = 0
+        for _ in range(num_seqs * MAX_DIVERSITY_ATTEMPTS):
+            if i == num_seqs:
+                break
+            ens_defect, seq, stats = hr.run(secstruct, exclude, return_stats=True)
+            if metrics is not None:
+                for reason, count in stats.get_rejects().items():
+                    if count > 0:
+                        metrics.add_reject(reason, count)
+            if min_distance > 0 and not diversity_filter.accept(seq):
+                if metrics is not None:
+                    metrics.add_reject("too_similar")
+                continue
+            for name in get_aliases(groups, row["name"]):
+                data.append(
+                    {
+                        "name": name + "_" + str(i + 1),
+                        "num": i,
+                        "sequence": seq,
+                        "structure": secstruct.structure,
+                        "ens_defect": ens_defect,
+                        **asdict(stats),
+                    }
+                )
+            i += 1
+        if i < num_seqs:
+            log.warning(
+                f"{row['name']}: only found {i} designs at least {min_distance} apart"
+            )
+    with profiler.stage("build_dataframe"):
+        return pd.DataFrame(data)
+
+
+def iter_input_records(path) -> Iterator[dict]:
+    """
+    lazily reads the records of an input file or stdin, see `iter_records`.
+    Records without a structure, such as fasta records without a structure line,
+    are folded
+    """
+    for record in iter_records(path):
+        if not record.get("structure"):
+            record["structure"] = fold_sequence(record["sequence"]).dot_bracket
+        yield record
+
+
+def read_input_dataframe(path):
+    """
+    reads every record of an input file or stdin into a dataframe, structures
+    are not required
+    """
+    import pandas as pd
+
+    if get_input_format(path) in ["fasta", None]:
+        return pd.DataFrame(list(iter_records(path)))
+    return read_dataframe(path)
+
+
+def diversify_dataframe(df, num=None, min_distance=0):
+    """
+    selects a diverse subset of the rows of df by greedy max-min selection on the
+    hamming distances of their sequences
+    :param df: dataframe with a `sequence` column
+    :param num: max rows to select, all that are min_distance apart if None
+    :param min_distance: min hamming distance between selected sequences
+    :return: dataframe of the selected rows, most diverse first
+    """
+    from rna_secstruct_design.diversity import (
+        max_min_select,
+        nearest_neighbor_distances,
+        pack_sequences,
+    )
+
+    with profiler.stage("diversify"):
+        selected = max_min_select(df["sequence"], num, min_distance)
+    df = df.iloc[selected]
+    if len(df) > 1:
+        nearest = nearest_neighbor_distances(pack_sequences(df["sequence"]))
+        log.info(f"selected {len(df)} sequences at least {nearest.min()} apart")
+    return df
+
+
+def cluster_dataframe(df, max_distance=1, q=None, representatives=False):
+    """
+    adds a `cluster` column to df, rows whose sequences are linked by a chain of
+    sequences at most max_distance edits apart share a cluster
+    :param df: dataframe with a `sequence` column
+    :param max_distance: max edit distance between linked sequences
+    :param q: q-gram size of the index, picked from the shortest sequence if None
+    :param representatives: only keep the first row of every cluster
+    :return: dataframe with the `cluster` column
+    """
+    from rna_secstruct_design.clustering import cluster_sequences
+
+    with profiler.stage("cluster"):
+        cluster_ids, stats = cluster_sequences(df["sequence"], max_distance, q)
+    log.info(str(stats))
+    df = df.assign(cluster=cluster_ids)
+    if representatives:
+        df = df.drop_duplicates("cluster")
+    return df
+
+
+def iter_input_chunks(path, chunk_size) -> Iterator:
+    """
+    streams an input file as (dataframe, None) chunks in the form of
+    `iter_dataframe_chunks_with_groups` without reading it all first
+    """
+    import pandas as pd
+
+    for chunk in chunked(iter_input_records(path), chunk_size):
+        yield pd.DataFrame(chunk), None
+
+
+def get_input_rows(seq, struct, csv_file) -> Iterable[dict]:
+    """
+    like `get_input_dataframe` but returns dictionaries, records of a file are
+    read lazily and a single sequence does not need pandas
+    """
+    if csv_file is not None:
+        if seq is not None:
+            raise ValueError("cannot specify both a sequence and a csv file")
+        log.info(f"reading file {csv_file}")
+        return iter_input_records(csv_file)
+    if seq is None:
+        raise ValueError("must specify a sequence or a csv file")
+    log.info(f"reading sequence {seq}")
+    if struct is None:
+        struct = fold_sequence(seq).dot_bracket
+    return [{"name": "seq", "sequence": seq, "structure": struct}]
+
+
+def get_mutations(rows, params, num_muts, prefix_names=True):
+    """
+    enumerates the mutants of every row into a single list so they can share one
+    work queue
+    :param rows: dictionaries with `name`, `sequence` and `structure`
+    :param params: selection parameters of positions to exclude from mutation
+    :param num_muts: number of mutations per mutant
+    :param prefix_names: prefix each mutant name with the name of its row
+    :return: list of `Mutation`
+    """
+    results = []
+    for row in rows:
+        muts = list(iter_row_mutations(row, params, num_muts, prefix_names))
+        log.info(f"{row['name']}: {len(muts)} mutants")
+        results.extend(muts)
+    return results
+
+
+def iter_mutations(rows, params, num_muts, prefix_names=True) -> Iterator:
+    """
+    lazy version of `get_mutations`
+    :return: iterator of `Mutation`
+    """
+    for row in rows:
+        yield from iter_row_mutations(row, params, num_muts, prefix_names)
+
+
+def count_mutations(rows, params, num_muts) -> int:
+    """
+    number of mutants `get_mutations` enumerates without building them
+    """
+    return sum(
+        count_multiple_mutations(row["sequence"], num_muts, _get_exclude(row, params))
+        for row in rows
+    )
+
+
+def _get_exclude(row, params) -> list:
+    if not params:
+        return []
+    _, exclude = get_row_selection(row["sequence"], row["structure"], params)
+    return exclude
+
+
+def iter_row_mutations(row, params, num_muts, prefix_names=True) -> Iterator:
+    """
+    lazily enumerates the mutants of a row, see `get_mutations`
+    :return: iterator of `Mutation`
+    """
+    exclude = _get_exclude(row, params)
+    muts = iter_multiple_mutations(row["sequence"], num_muts, exclude)
+    if not prefix_names:
+        return muts
+    return (Mutation(row["name"] + "_" + m.name, m.sequence) for m in muts)
+
+
+def fold_sequences(results, groups=None) -> list:
+    """
+    folds mutants and returns one row per name they stand for
+    :param results: list of `Mutation`
+    :param groups: optional dictionary from `dedup_mutations`
+    :return: list of dictionaries with `name`, `sequence`, `structure` and
+    `ens_defect`
+    """
+    data = []
+    for mut in results:
+        rf = fold_cache.fold(mut.sequence)
+        for name in get_aliases(groups, mut.name):
+            data.append(
+                {
+                    "name": name,
+                    "sequence": mut.sequence,
+                    "structure": rf.dot_bracket,
+                    "ens_defect": rf.ens_defect,
+                }
+            )
+    return data
+
+
+def replace_seq_struct_dataframe(df, params, groups=None, metrics=None):
+    """
+    replaces motifs in each sequence/structure and keeps the ones that still fold
+    into the new structure. Only the minimum free energy structure is computed to
+    validate a row, the ensemble defect is only computed for rows that pass.
+    :param df: dataframe with `name`, `sequence` and `structure` columns
+    :param params: dictionary of replacement patterns
+    :param groups: optional dictionary from `dedup_dataframe`, results are written
+    for every name a row stands for
+    :param metrics: optional `BatchMetrics` to count folds and rejections in
+    :return: dataframe of results and dataframe of rejected rows
+    """
+    import pandas as pd
+
+    if metrics is None:
+        metrics = BatchMetrics()
+    data = []
+    rejects = []
+    replacer = MultiPatternReplacer(params)
+    for i, row in df.iterrows():
+        names = get_aliases(groups, row["name"])
+        try:
+            seq_struct = replacer.replace(row["sequence"], row["structure"])
+        except ValueError:
+            rejects.extend([[name, "replace_failed", ""] for name in names])
+            metrics.add_reject("replace_failed", len(names))
+            continue
+        mfe_structure = fold_mfe(seq_struct.sequence)
+        metrics.folds += 1
+        if mfe_structure != seq_struct.structure:
+            rejects.extend([[name, "misfold", mfe_structure] for name in names])
+            metrics.add_reject("misfold", len(names))
+            continue
+        r = fold_cache.fold(seq_struct.sequence)
+        for name in names:
+            data.append(
+                [
+                    name,
+                    seq_struct.sequence,
+                    seq_struct.structure,
+                    r.ens_defect,
+                ]
+            )
+    with profiler.stage("build_dataframe"):
+        df_results = pd.DataFrame(
+            data, columns=["name", "sequence", "structure", "ens_defect"]
+        )
+        df_rejects = pd.DataFrame(rejects, columns=["name", "reason", "structure"])
+    return df_results, df_rejects
+
+
+def fold_sequences_chunk(chunk):
+    """
+    pool work unit of mut_scan
+    :param chunk: (list of `Mutation`, groups needed for them)
+    :return: result rows and `BatchMetrics`
+    """
+    muts, groups = chunk
+    metrics = BatchMetrics(items=len(muts))
+    with record_folds(metrics, fold_cache):
+        rows = fold_sequences(muts, groups)
+    return rows, metrics
+
+
+def randomize_helices_chunk(
+    chunk,
+    params,
+    num_seqs,
+    min_distance=0,
+    max_off_target=None,
+    helix_library=None,
+    energy_band=None,
+):
+    """
+    pool work unit of helix_rand
+    :param chunk: (dataframe of rows to design, groups needed for them)
+    :return: dataframe of results and `BatchMetrics`
+    """
+    df, groups = chunk
+    metrics = BatchMetrics(items=len(df))
+    with record_folds(metrics, fold_cache):
+        df_results = randomize_helices(
+            df,
+            params,
+            num_seqs,
+            groups,
+            metrics,
+            min_distance,
+            max_off_target,
+            helix_library,
+            energy_band,
+        )
+    return df_results, metrics
+
+
+def replace_chunk(chunk, params):
+    """
+    pool work unit of replace
+    :param chunk: (dataframe of rows to replace, groups needed for them)
+    :return: (dataframe of results, dataframe of rejects) and `BatchMetrics`
+    """
+    df, groups = chunk
+    metrics = BatchMetrics(items=len(df))
+    with record_folds(metrics, fold_cache):
+        results = replace_seq_struct_dataframe(df, params, groups, metrics)
+    return results, metrics
+
+
+def iter_dataframe_chunks_with_groups(df, groups, chunk_size):
+    for df_chunk in iter_dataframe_chunks(df, chunk_size):
+        yield df_chunk, get_group_subset(groups, df_chunk["name"].tolist())
+
+
+def get_secstruct_and_exclude(seq, struct, param_file):
+    """
+    builds the secondary structure to scan and the positions the selection in
+    param_file excludes from mutation
+    """
+    if struct is None:
+        struct = fold_sequence(seq).dot_bracket
+    secstruct = SecStruct(seq, struct)
+    if param_file is not None:
+        params = selection_from_file(param_file)
+        exclude = get_selection(secstruct, params)
+    else:
+        exclude = []
+    return secstruct, exclude
+
+
+def write_folded_variants(variants, output, num_processes, chunk_size, fmt=None):
+    """
+    folds (name, sequence, structure) variants in chunks on a process pool and
+    writes each chunk as soon as it is done
+    """
+    with open_writer(output, VARIANT_COLUMNS, fmt) as writer:
+        for rows in map_chunks(
+            fold_variants, chunked(variants, chunk_size), num_processes
+        ):
+            writer.write_rows(rows)
+    log.info(f"wrote {writer.num_rows} structures to {output}")
+
+
+def parse_helix_ranges(helix_ranges) -> dict:
+    """
+    parses helix ranges given as `POS:MIN-MAX`, for example `0:2-10`
+    :param helix_ranges: list of strings
+    :return: dictionary of helix position to (min length, max length)
+    """
+    h_ranges = {}
+    for h_range in helix_ranges:
+        try:
+            pos, lengths = h_range.split(":")
+            min_length, max_length = lengths.split("-")
+            h_ranges[int(pos)] = (int(min_length), int(max_length))
+        except ValueError:
+            raise ValueError(f"invalid helix range {h_range}, must be POS:MIN-MAX")
+    return h_ranges
+
+
+def iter_helix_length_variants(secstruct, h_ranges):
+    """
+    yields (name, sequence, structure) for every combination of helix lengths
+    """
+    for lengths, new_struct in iter_all_helix_lengths(secstruct, h_ranges):
+        name = "_".join([f"h{pos}-{l}" for pos, l in zip(h_ranges, lengths)])
+        yield name, new_struct.sequence, new_struct.structure
+
+
+def iter_basepair_variants(secstruct, sequences):
+    """
+    yields (name, sequence, structure) for basepair mutants of secstruct
+    """
+    for sequence in sequences:
+        name = get_mutation_name(secstruct.sequence, sequence)
+        yield name, sequence, secstruct.structure
+
+
+def iter_indel_variants(secstruct, mode, num, exclude, all_nucleotides):
+    """
+    yields (name, sequence, structure) for every distinct indel of secstruct and
+    returns the number of variants
+    """
+    if mode == "insert":
+        args = (secstruct, num, exclude, all_nucleotides)
+        count = count_add_unpaired_sweep(*args)
+        variants = iter_add_unpaired_sweep(*args)
+    elif mode == "remove-unpaired":
+        count = count_remove_unpaired_nucleotide_sweep(secstruct, num, exclude)
+        variants = iter_remove_unpaired_nucleotide_sweep(secstruct, num, exclude)
+    elif mode == "remove":
+        count = count_remove_nucleotide_sweep(secstruct, num, exclude)
+        variants = iter_remove_nucleotide_sweep(secstruct, num, exclude)
+    else:
+        raise ValueError(f"unknown indel mode {mode}")
+    return count, ((v.name, v.sequence, v.structure) for v in variants)
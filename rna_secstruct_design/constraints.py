@@ -1,4 +1,9 @@
-from rna_secstruct_design.util import max_repeating_nucleotides, max_gc_stretch
+from rna_secstruct_design.util import (
+    max_repeating_nucleotides,
+    max_gc_stretch,
+    find_off_target_stretches,
+    get_helix_pairs,
+)
 
 
 class SequenceConstraint:
@@ -71,3 +76,64 @@ class MaxGCStretchIncreaseConstraint(SequenceStructureConstraint):
         elif gc_stretch > self.org_value:
             return False
         return True
+
+
+class MaxOffTargetPairingConstraint(SequenceStructureConstraint):
+    """
+    Rejects sequences that can form a stretch of more than max_value consecutive
+    basepairs, GU included, that is not in the structure and is longer than every
+    helix of the structure it would take positions from
+    """
+
+    def __init__(self, max_value):
+        super().__init__()
+        self.max_value = max_value
+
+    def get_stretches(self, sequence, structure):
+        """
+        off target stretches as (i, j, length), i pairs with j in the outermost
+        basepair
+        """
+        windows = set(
+            find_off_target_stretches(sequence, structure, self.max_value + 1)
+        )
+        helix_lengths = {}
+        for helix in get_helix_pairs(structure):
+            for i, j in helix:
+                helix_lengths[i] = helix_lengths[j] = len(helix)
+        stretches = []
+        for i, j in sorted(windows):
+            # windows of a longer stretch overlap by all but one basepair
+            if (i - 1, j + 1) in windows:
+                continue
+            length = self.max_value + 1
+            while (i + length - self.max_value, j - length + self.max_value) in windows:
+                length += 1
+            positions = list(range(i, i + length)) + list(range(j - length + 1, j + 1))
+            if length > max(helix_lengths.get(p, 0) for p in positions):
+                stretches.append((i, j, length))
+        return stretches
+
+    def satisifes(self, sequence, structure):
+        return len(self.get_stretches(sequence, structure)) == 0
+
+
+class MaxOffTargetPairingIncreaseConstraint(MaxOffTargetPairingConstraint):
+    """
+    Like `MaxOffTargetPairingConstraint` but allows the stretches sequence already
+    has, for example between positions that are not designed
+    """
+
+    def __init__(self, max_value, sequence, structure):
+        super().__init__(max_value)
+        self.org_stretches = set(self.get_stretches(sequence, structure))
+
+    def get_new_stretches(self, sequence, structure):
+        """
+        off target stretches that the original sequence did not have
+        """
+        stretches = self.get_stretches(sequence, structure)
+        return [s for s in stretches if s not in self.org_stretches]
+
+    def satisifes(self, sequence, structure):
+        return len(self.get_new_stretches(sequence, structure)) == 0
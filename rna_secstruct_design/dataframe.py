@@ -1,45 +1,132 @@
 import pandas as pd
 import numpy as np
 
-from rna_secstruct_design.util import max_repeating_nucleotides, max_gc_stretch
+from rna_secstruct_design.encoding import (
+    NUCLEOTIDE_CODES,
+    encode_sequences,
+    max_run_lengths,
+    run_lengths,
+    get_row_blocks,
+)
+from rna_secstruct_design.dedup import apply_deduplicated
+from rna_secstruct_design.util import get_helix_pairs
 
+# max rows processed at once, keeps temporaries small for large libraries
+BLOCK_SIZE = 65536
 
-def get_max_gc_stretch(df):
-    """Get the max gc stretch for each sequence and structure in a dataframe"""
-    # apply max_gc_stretch to each row in the dataframe uses sequence and structure columns
-    return df.apply(
-        lambda row: max_gc_stretch(row["sequence"], row["structure"]), axis=1
-    )
+STRETCH_COLUMNS = ["max_A_stretch", "max_C_stretch", "max_G_stretch", "max_U_stretch"]
 
 
-def get_max_repeating_nucleotides(df):
+def get_gc_mask(encoded, pos_5p, pos_3p):
+    """
+    Returns whether each basepair given by the positions is a GC or CG pair for each
+    row of an encoded sequence matrix
+    """
+    g, c = NUCLEOTIDE_CODES["G"], NUCLEOTIDE_CODES["C"]
+    nuc_5p = encoded[:, pos_5p]
+    nuc_3p = encoded[:, pos_3p]
+    return ((nuc_5p == g) & (nuc_3p == c)) | ((nuc_5p == c) & (nuc_3p == g))
+
+
+def get_max_gc_stretch(df, encoded=None, dedup=False):
+    """
+    Get the max gc stretch for each sequence and structure in a dataframe. Rows are
+    grouped by structure so each structure is only parsed once and the stretches
+    are computed over all sequences that share it at once.
+    :param df: dataframe with `sequence` and `structure` columns
+    :param encoded: optional matrix from `encode_sequences(df["sequence"])`
+    :param dedup: compute each unique sequence/structure only once, encoded is
+    ignored
+    :return: pd.Series with the max gc stretch of each row
+    """
+    if dedup:
+        return apply_deduplicated(df, get_max_gc_stretch)
+    if encoded is None:
+        encoded = encode_sequences(df["sequence"])
+    result = np.zeros(len(df), dtype=np.int64)
+    codes, structures = pd.factorize(df["structure"])
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(structures) + 1))
+    for k, structure in enumerate(structures):
+        rows = order[bounds[k] : bounds[k + 1]]
+        helices = get_helix_pairs(structure)
+        if len(helices) == 0:
+            continue
+        pairs = np.array([bp for h in helices for bp in h])
+        # a False column between helices so stretches do not continue across them
+        breaks = np.cumsum([len(h) for h in helices])[:-1]
+        for block in get_row_blocks(len(rows), BLOCK_SIZE):
+            gc_mask = get_gc_mask(encoded[rows[block]], pairs[:, 0], pairs[:, 1])
+            gc_mask = np.insert(gc_mask, breaks, False, axis=1)
+            result[rows[block]] = max_run_lengths(gc_mask)
+    return pd.Series(result, index=df.index)
+
+
+def get_max_repeating_nucleotides(df, encoded=None, dedup=False):
     """
     Get the max repeating nucleotides for each sequence and structure in a dataframe
+    :param df: dataframe with a `sequence` column
+    :param encoded: optional matrix from `encode_sequences(df["sequence"])`
+    :param dedup: compute each unique sequence only once, encoded is ignored
+    :return: pd.DataFrame with the longest run of each nucleotide
     """
-    data = []
-    for _, row in df.iterrows():
-        r = max_repeating_nucleotides(row["sequence"])
-        data.append([r["A"], r["C"], r["G"], r["U"]])
-    return pd.DataFrame(
-        data,
-        columns=["max_A_stretch", "max_C_stretch", "max_G_stretch", "max_U_stretch"],
-    )
+    if dedup:
+        return apply_deduplicated(
+            df, get_max_repeating_nucleotides, subset=("sequence",)
+        )
+    if encoded is None:
+        encoded = encode_sequences(df["sequence"])
+    data = np.zeros((len(encoded), 4), dtype=np.int64)
+    for block in get_row_blocks(len(encoded), BLOCK_SIZE):
+        runs = run_lengths(encoded[block])
+        for i, nuc in enumerate("ACGU"):
+            is_nuc = encoded[block] == NUCLEOTIDE_CODES[nuc]
+            if runs.shape[1] > 0:
+                data[block, i] = np.where(is_nuc, runs, 0).max(axis=1)
+    return pd.DataFrame(data, columns=STRETCH_COLUMNS)
 
 
-def has_gc_streches_less_than(df, max_stretch):
+def has_gc_streches_less_than(df, max_stretch, dedup=False):
     """
     Get a boolean series of whether each sequence in a dataframe has a gc stretch
     less than max_stretch"""
-    return np.max(get_max_gc_stretch(df)) < max_stretch
+    return np.max(get_max_gc_stretch(df, dedup=dedup)) < max_stretch
 
 
-def has_repeating_nucleotides_less_than(df, max_repeats):
+def has_repeating_nucleotides_less_than(df, max_repeats, dedup=False):
     """
     Get a boolean of whether each sequence in a dataframe has a repeating
     nucleotide less than max_repeats
     """
-    df_nuc_repeats = get_max_repeating_nucleotides(df)
-    for c in ["max_A_stretch", "max_C_stretch", "max_G_stretch", "max_U_stretch"]:
+    df_nuc_repeats = get_max_repeating_nucleotides(df, dedup=dedup)
+    for c in STRETCH_COLUMNS:
         if df_nuc_repeats[c].max() >= max_repeats:
             return False
     return True
+
+
+def get_store_metrics(store, block_size=BLOCK_SIZE):
+    """
+    Computes the max gc stretch and max repeating nucleotides of every record in a
+    `RlibStore` a block at a time, reading the packed sequences straight from the
+    store instead of decoding them to strings first.
+    :param store: `RlibStore` with a `structure` column
+    :param block_size: records per block
+    :return: pd.DataFrame with `name`, `max_gc_stretch` and the longest run of
+    each nucleotide
+    """
+    dfs = []
+    for block in get_row_blocks(len(store), block_size):
+        encoded = store.get_encoded(block.start, block.stop)
+        df = pd.DataFrame(
+            {
+                "name": [store.get_name(i) for i in range(block.start, block.stop)],
+                "structure": store.get_column("structure", block.start, block.stop),
+            }
+        )
+        df["max_gc_stretch"] = get_max_gc_stretch(df, encoded=encoded).values
+        df_runs = get_max_repeating_nucleotides(df, encoded=encoded)
+        dfs.append(pd.concat([df.drop(columns="structure"), df_runs], axis=1))
+    if len(dfs) == 0:
+        return pd.DataFrame(columns=["name", "max_gc_stretch"] + STRETCH_COLUMNS)
+    return pd.concat(dfs, ignore_index=True)
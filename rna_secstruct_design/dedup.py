@@ -0,0 +1,159 @@
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# numpy and pandas are imported in the dataframe functions only, deduplicating
+# mutants from a single sequence does not need them
+
+
+@dataclass(frozen=True)
+class DedupStats:
+    """
+    How much work deduplication saved.
+    """
+
+    total: int
+    unique: int
+
+    @property
+    def saved(self) -> int:
+        return self.total - self.unique
+
+    @property
+    def fraction_saved(self) -> float:
+        if self.total == 0:
+            return 0.0
+        return self.saved / self.total
+
+    def __str__(self):
+        return (
+            f"{self.unique} unique of {self.total} inputs, {self.saved} computations "
+            f"saved ({self.fraction_saved * 100:.1f}%)"
+        )
+
+
+def get_dedup_keys(df, subset=("sequence", "structure")) -> "pd.Series":
+    """
+    Returns a single key per row from the columns that define identical inputs
+    """
+    subset = list(subset)
+    keys = df[subset[0]].astype(str)
+    for col in subset[1:]:
+        keys = keys + "\t" + df[col].astype(str)
+    return keys
+
+
+def check_unique_names(names) -> None:
+    """
+    Raises a ValueError if a name is used more than once, groups are keyed by name
+    so rows sharing one could not be told apart when the results are fanned out
+    """
+    seen = set()
+    for name in names:
+        if name in seen:
+            raise ValueError(
+                f"duplicate name {name}, names must be unique to deduplicate"
+            )
+        seen.add(name)
+
+
+def dedup_dataframe(
+    df, subset=("sequence", "structure")
+) -> Tuple["pd.DataFrame", Dict[str, List[str]], DedupStats]:
+    """
+    Collapses rows with identical inputs, keeping the first row of each group.
+    :param df: dataframe with a `name` column and the columns in subset
+    :param subset: columns that define identical inputs
+    :return: dataframe of unique rows, dictionary of the name of each kept row to
+    the names of all rows it stands for and the dedup stats
+    """
+    import numpy as np
+    import pandas as pd
+
+    names = df["name"].tolist()
+    check_unique_names(names)
+    codes, uniques = pd.factorize(get_dedup_keys(df, subset))
+    _, first = np.unique(codes, return_index=True)
+    df_unique = df.iloc[first]
+    groups = {}
+    for name, code in zip(names, codes):
+        groups.setdefault(names[first[code]], []).append(name)
+    return df_unique, groups, DedupStats(len(df), len(uniques))
+
+
+def dedup_mutations(
+    mutations, key_by_index: bool = False
+) -> Tuple[list, Dict[str, List[str]], DedupStats]:
+    """
+    Collapses mutants that have the same sequence (and structure if they have one),
+    keeping the first of each.
+    :param mutations: list of dataclasses with `name` and `sequence` fields such as
+    `Mutation`
+    :param key_by_index: key the groups by the index of each kept mutant instead
+    of its name, so names do not have to be unique. The kept mutants are renamed
+    to their key, `get_aliases` gives their names back.
+    :return: list of unique mutants, dictionary of the name of each kept mutant to
+    the names of all mutants it stands for and the dedup stats
+    """
+    if not key_by_index:
+        check_unique_names(mut.name for mut in mutations)
+    seen = {}
+    unique = []
+    groups = {}
+    for i, mut in enumerate(mutations):
+        key = (mut.sequence, getattr(mut, "structure", None))
+        if key not in seen:
+            if key_by_index:
+                mut = replace(mut, name=str(i))
+            seen[key] = mut.name
+            unique.append(mut)
+        groups.setdefault(seen[key], []).append(mutations[i].name)
+    return unique, groups, DedupStats(len(mutations), len(unique))
+
+
+def get_aliases(groups, name) -> List[str]:
+    """
+    Returns every name a computed item stands for
+    :param groups: dictionary from `dedup_dataframe` or `dedup_mutations`, can be
+    None when nothing was deduplicated
+    :param name: name of the computed item
+    """
+    if groups is None:
+        return [name]
+    return groups.get(name, [name])
+
+
+def get_group_subset(groups, names) -> Optional[Dict[str, List[str]]]:
+    """
+    Returns only the part of groups needed for names, so a chunk of work sent to a
+    pool worker does not carry the groups of the whole input
+    :param groups: dictionary from `dedup_dataframe` or `dedup_mutations`, can be
+    None when nothing was deduplicated
+    :param names: names of the computed items in the chunk
+    """
+    if groups is None:
+        return None
+    return {name: groups[name] for name in names if name in groups}
+
+
+def apply_deduplicated(df, func, subset=("sequence", "structure")):
+    """
+    Calls func on the unique rows of df and expands the results back to one row per
+    original row
+    :param df: dataframe to compute on
+    :param func: function that takes a dataframe and returns a pd.Series or
+    pd.DataFrame with one row per input row
+    :param subset: columns that define identical inputs
+    :return: results of func with one row per row of df
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes, _ = pd.factorize(get_dedup_keys(df, subset))
+    _, first = np.unique(codes, return_index=True)
+    results = func(df.iloc[first])
+    if isinstance(results, pd.Series):
+        return pd.Series(results.to_numpy()[codes], index=df.index)
+    return results.iloc[codes].reset_index(drop=True)
@@ -0,0 +1,249 @@
+import bz2
+import gzip
+from typing import Iterator, List
+
+from rna_secstruct_design.mutations import get_mutation_name
+from rna_secstruct_design.profiler import profiler
+
+# delta encoded mutant libraries (.delta). The wild type sequence and structure
+# of every construct are written once and each mutant only stores what differs
+# from its wild type: its substitutions, in the same format as the mutant names,
+# and its folded structure as a diff against the wild type structure.
+#
+#   #delta 1 prefix_names=1
+#   @0<TAB>name<TAB>sequence<TAB>structure                 one line per wild type
+#   0<TAB>G1A_C8G<TAB>=<TAB>0.214<TAB>                    one line per mutant
+#
+# a mutant line has the wild type index, the substitutions, the structure diff,
+# ens_defect and the name if it is not the default name. The structure diff is
+# `=` if the mutant folds into the wild type structure, `*` followed by the full
+# structure if that is shorter than a diff and otherwise `;` separated runs of
+# `position:new characters` with 1-based positions. Files ending in .gz or .bz2
+# are gzip or bz2 compressed.
+
+VERSION = 1
+SAME = "="
+FULL = "*"
+
+DELTA_COLUMNS = ["name", "sequence", "structure", "ens_defect"]
+
+
+def _open(path, mode: str):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t")
+    if str(path).endswith(".bz2"):
+        return bz2.open(path, mode + "t")
+    return open(path, mode)
+
+
+def get_structure_diff(structure: str, new_structure: str) -> str:
+    """
+    Encodes new_structure as a diff against structure, see the format above
+    """
+    if structure == new_structure:
+        return SAME
+    if len(structure) != len(new_structure):
+        return FULL + new_structure
+    runs = []
+    start = None
+    for i, (c, new_c) in enumerate(zip(structure, new_structure)):
+        if c != new_c:
+            if start is None:
+                start = i
+        elif start is not None:
+            runs.append(f"{start + 1}:{new_structure[start:i]}")
+            start = None
+    if start is not None:
+        runs.append(f"{start + 1}:{new_structure[start:]}")
+    diff = ";".join(runs)
+    if len(diff) >= len(new_structure) + 1:
+        return FULL + new_structure
+    return diff
+
+
+def apply_structure_diff(structure: str, diff: str) -> str:
+    """
+    Rebuilds a structure from the wild type structure and a diff from
+    `get_structure_diff`
+    """
+    if diff == SAME:
+        return structure
+    if diff.startswith(FULL):
+        return diff[1:]
+    chars = list(structure)
+    for run in diff.split(";"):
+        pos, new = run.split(":")
+        start = int(pos) - 1
+        chars[start : start + len(new)] = new
+    return "".join(chars)
+
+
+def apply_substitutions(sequence: str, substitutions: str) -> str:
+    """
+    Applies substitutions such as `G1A_C8G` to sequence
+    """
+    if substitutions == "":
+        return sequence
+    chars = list(sequence)
+    for sub in substitutions.split("_"):
+        pos = int(sub[1:-1]) - 1
+        if chars[pos] != sub[0]:
+            raise ValueError(f"substitution {sub} does not match the wild type")
+        chars[pos] = sub[-1]
+    return "".join(chars)
+
+
+class DeltaWriter(object):
+    """
+    Writes mut_scan results as a .delta file with the same interface as
+    `CSVWriter`. ens_defect is written with 6 significant digits.
+    """
+
+    def __init__(self, path, wild_types: List[dict], prefix_names: bool = True):
+        """
+        :param path: output file
+        :param wild_types: dictionaries with `name`, `sequence` and `structure` of
+        every construct the mutants were made from
+        :param prefix_names: mutant names start with the name of their wild type
+        """
+        if not prefix_names and len(wild_types) > 1:
+            raise ValueError("mutant names must be prefixed with several wild types")
+        self.path = path
+        self.columns = DELTA_COLUMNS
+        self.prefix_names = prefix_names
+        self.num_rows = 0
+        self.__wild_types = wild_types
+        self.__index = {wt["name"]: i for i, wt in enumerate(wild_types)}
+        self.__f = _open(path, "w")
+        self.__f.write(f"#delta {VERSION} prefix_names={int(prefix_names)}\n")
+        for i, wt in enumerate(wild_types):
+            self.__f.write(f"@{i}\t{wt['name']}\t{wt['sequence']}\t{wt['structure']}\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_wild_type_index(self, name: str) -> int:
+        """
+        The wild type of a mutant is the longest wild type name that prefixes its
+        name
+        """
+        if not self.prefix_names:
+            return 0
+        index = None
+        pos = name.find("_")
+        while pos != -1:
+            index = self.__index.get(name[:pos], index)
+            pos = name.find("_", pos + 1)
+        if index is None:
+            raise ValueError(f"no wild type found for {name}")
+        return index
+
+    def write_rows(self, rows: List[dict]) -> None:
+        lines = []
+        with profiler.stage("write_output"):
+            for row in rows:
+                index = self.get_wild_type_index(row["name"])
+                wt = self.__wild_types[index]
+                subs = get_mutation_name(wt["sequence"], row["sequence"])
+                diff = get_structure_diff(wt["structure"], row["structure"])
+                name = row["name"]
+                if name == self.__get_default_name(wt, subs):
+                    name = ""
+                lines.append(
+                    f"{index}\t{subs}\t{diff}\t{row['ens_defect']:.6g}\t{name}\n"
+                )
+            self.__f.write("".join(lines))
+            self.__f.flush()
+        self.num_rows += len(rows)
+
+    def write_dataframe(self, df) -> None:
+        if len(df) == 0:
+            return
+        self.write_rows(df.to_dict("records"))
+
+    def close(self) -> None:
+        self.__f.close()
+
+    def __get_default_name(self, wt: dict, subs: str) -> str:
+        if self.prefix_names:
+            return wt["name"] + "_" + subs
+        return subs
+
+
+class DeltaReader(object):
+    """
+    Reads a .delta file. The wild types are read when the file is opened, mutant
+    rows are only rebuilt as they are iterated.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.wild_types = []
+        self.__f = _open(path, "r")
+        header = self.__f.readline().split()
+        if len(header) < 2 or header[0] != "#delta":
+            raise ValueError(f"{path} is not a delta file")
+        if int(header[1]) != VERSION:
+            raise ValueError(f"unsupported delta version {header[1]}")
+        options = dict(h.split("=") for h in header[2:])
+        self.prefix_names = options.get("prefix_names", "1") == "1"
+        self.__first = None
+        for line in self.__f:
+            if not line.startswith("@"):
+                self.__first = line
+                break
+            _, name, sequence, structure = line.rstrip("\n").split("\t")
+            self.wild_types.append(
+                {"name": name, "sequence": sequence, "structure": structure}
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self) -> Iterator[dict]:
+        return self.iter_rows()
+
+    def close(self) -> None:
+        self.__f.close()
+
+    def iter_rows(self) -> Iterator[dict]:
+        """
+        Rebuilds the full rows of the mutants one at a time
+        :return: dictionaries with `name`, `sequence`, `structure` and `ens_defect`
+        """
+        if self.__first is None:
+            return
+        first, self.__first = self.__first, None
+        yield self.parse_line(first)
+        for line in self.__f:
+            yield self.parse_line(line)
+
+    def parse_line(self, line: str) -> dict:
+        index, subs, diff, ens_defect, name = line.rstrip("\n").split("\t")
+        wt = self.wild_types[int(index)]
+        if name == "":
+            name = wt["name"] + "_" + subs if self.prefix_names else subs
+        return {
+            "name": name,
+            "sequence": apply_substitutions(wt["sequence"], subs),
+            "structure": apply_structure_diff(wt["structure"], diff),
+            "ens_defect": float(ens_defect),
+        }
+
+
+def read_delta(path):
+    """
+    Reads a .delta file into a dataframe of full rows
+    :param path: .delta file
+    :return: pd.DataFrame
+    """
+    import pandas as pd
+
+    with DeltaReader(path) as reader:
+        return pd.DataFrame(list(reader), columns=DELTA_COLUMNS)
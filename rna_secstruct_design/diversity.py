@@ -0,0 +1,175 @@
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from rna_secstruct_design.encoding import encode_sequences, get_row_blocks
+
+# hamming distances between many sequences at once. Each sequence is split into
+# bit planes of its nucleotide codes, one bit per position, packed into uint64
+# words. Two sequences differ at a position if any of their planes differ there,
+# so the distance is the popcount of the OR of the XORed planes, 64 positions per
+# operation. Sequences of different lengths are compared as if padded at the end,
+# every missing position counts as a difference.
+
+# codes from `encode_sequences` go up to 5 which needs 3 bits
+NUM_PLANES = 3
+# max rows of one side of a block of the distance matrix, small enough for the
+# temporaries of a block to stay in cache
+BLOCK_SIZE = 256
+
+_POPCOUNT_8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    """
+    Number of set bits of every uint64 in words
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    # numpy < 2.0
+    bytes_ = words.view(np.uint8).reshape(words.shape + (8,))
+    return _POPCOUNT_8[bytes_].sum(axis=-1, dtype=np.uint8)
+
+
+def pack_sequences(sequences: Iterable[str]) -> np.ndarray:
+    """
+    Packs sequences into bit planes for `hamming_distances`
+    :param sequences: iterable of sequences
+    :return: uint64 array of shape (num sequences, NUM_PLANES, words)
+    """
+    encoded = encode_sequences(sequences)
+    num, length = encoded.shape
+    words = (length + 63) // 64
+    bits = np.zeros((num, NUM_PLANES, words * 64), dtype=np.uint8)
+    for plane in range(NUM_PLANES):
+        bits[:, plane, :length] = (encoded >> plane) & 1
+    packed = np.packbits(bits, axis=-1)
+    return packed.view(np.uint64).reshape(num, NUM_PLANES, words)
+
+
+def _distances(packed_a: np.ndarray, packed_b: np.ndarray) -> np.ndarray:
+    """
+    one word at a time so every operation runs over a flat (rows a, rows b) array
+    and the temporaries are reused
+    """
+    shape = (len(packed_a), len(packed_b))
+    dist = np.zeros(shape, dtype=np.int32)
+    diff = np.empty(shape, dtype=np.uint64)
+    tmp = np.empty(shape, dtype=np.uint64)
+    for word in range(packed_a.shape[2]):
+        np.bitwise_xor(packed_a[:, None, 0, word], packed_b[None, :, 0, word], diff)
+        for plane in range(1, NUM_PLANES):
+            a, b = packed_a[:, None, plane, word], packed_b[None, :, plane, word]
+            diff |= np.bitwise_xor(a, b, tmp)
+        dist += _popcount(diff)
+    return dist
+
+
+def hamming_distances(
+    packed_a: np.ndarray, packed_b: Optional[np.ndarray] = None, block_size=BLOCK_SIZE
+) -> np.ndarray:
+    """
+    All pairs hamming distances, computed in blocks of block_size x block_size
+    :param packed_a: packed sequences from `pack_sequences`
+    :param packed_b: packed sequences to compare to, packed_a if None
+    :return: int32 array of shape (len(packed_a), len(packed_b))
+    """
+    if packed_b is None:
+        packed_b = packed_a
+    packed_a, packed_b = _match_words(packed_a, packed_b)
+    dist = np.zeros((len(packed_a), len(packed_b)), dtype=np.int32)
+    for block_a in get_row_blocks(len(packed_a), block_size):
+        for block_b in get_row_blocks(len(packed_b), block_size):
+            dist[block_a, block_b] = _distances(packed_a[block_a], packed_b[block_b])
+    return dist
+
+
+def nearest_neighbor_distances(packed: np.ndarray, block_size=BLOCK_SIZE):
+    """
+    Distance of every sequence to its closest other sequence without keeping the
+    full distance matrix in memory
+    :param packed: packed sequences from `pack_sequences`
+    :return: int32 array with one distance per sequence, -1 if there is only one
+    """
+    nearest = np.full(len(packed), np.iinfo(np.int32).max, dtype=np.int32)
+    if len(packed) < 2:
+        nearest[:] = -1
+        return nearest
+    for block_a in get_row_blocks(len(packed), block_size):
+        for block_b in get_row_blocks(len(packed), block_size):
+            dist = _distances(packed[block_a], packed[block_b])
+            if block_a == block_b:
+                np.fill_diagonal(dist, np.iinfo(np.int32).max)
+            nearest[block_a] = np.minimum(nearest[block_a], dist.min(axis=1))
+    return nearest
+
+
+def _match_words(packed_a: np.ndarray, packed_b: np.ndarray):
+    """
+    pads the packed sequences with the fewer words so both can be compared
+    """
+    words = max(packed_a.shape[2], packed_b.shape[2])
+    return _pad_words(packed_a, words), _pad_words(packed_b, words)
+
+
+def _pad_words(packed: np.ndarray, words: int) -> np.ndarray:
+    if packed.shape[2] == words:
+        return packed
+    padded = np.zeros((len(packed), NUM_PLANES, words), dtype=np.uint64)
+    padded[:, :, : packed.shape[2]] = packed
+    return padded
+
+
+def max_min_select(
+    sequences, num: Optional[int] = None, min_distance: int = 0, start: int = 0
+) -> List[int]:
+    """
+    Greedy max-min selection of diverse sequences. Starting from sequence start,
+    the sequence farthest from everything selected so far is added until num are
+    selected or no sequence is at least min_distance from all selected ones. Each
+    step compares one sequence against all others, so memory stays linear.
+    :param sequences: sequences to select from
+    :param num: max sequences to select, all that qualify if None
+    :param min_distance: min hamming distance between selected sequences
+    :param start: index of the first selected sequence
+    :return: indices of the selected sequences in the order they were selected
+    """
+    packed = pack_sequences(sequences)
+    if len(packed) == 0:
+        return []
+    if num is None:
+        num = len(packed)
+    selected = [start]
+    min_dist = _distances(packed[start : start + 1], packed)[0]
+    while len(selected) < num:
+        best = int(np.argmax(min_dist))
+        if min_dist[best] == 0 or min_dist[best] < min_distance:
+            break
+        selected.append(best)
+        min_dist = np.minimum(min_dist, _distances(packed[best : best + 1], packed)[0])
+    return selected
+
+
+class MinDistanceFilter(object):
+    """
+    Accepts sequences one at a time if they are at least min_distance from every
+    sequence accepted before
+    """
+
+    def __init__(self, min_distance: int):
+        self.min_distance = min_distance
+        self.__accepted = None
+
+    def __len__(self):
+        return 0 if self.__accepted is None else len(self.__accepted)
+
+    def accept(self, sequence: str) -> bool:
+        packed = pack_sequences([sequence])
+        if self.__accepted is None:
+            self.__accepted = packed
+            return True
+        accepted, packed = _match_words(self.__accepted, packed)
+        if _distances(packed, accepted).min() < self.min_distance:
+            return False
+        self.__accepted = np.concatenate([accepted, packed])
+        return True
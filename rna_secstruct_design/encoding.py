@@ -0,0 +1,80 @@
+from typing import Iterable, List
+
+import numpy as np
+
+# codes used for encoded sequences, 0 is reserved for padding
+PAD = 0
+NUCLEOTIDE_CODES = {"A": 1, "C": 2, "G": 3, "U": 4}
+OTHER = 5
+
+_LOOKUP = np.full(256, OTHER, dtype=np.uint8)
+for _nuc, _code in NUCLEOTIDE_CODES.items():
+    _LOOKUP[ord(_nuc)] = _code
+    _LOOKUP[ord(_nuc.lower())] = _code
+_LOOKUP[ord("T")] = NUCLEOTIDE_CODES["U"]
+_LOOKUP[ord("t")] = NUCLEOTIDE_CODES["U"]
+
+
+def encode_sequences(sequences: Iterable[str]) -> np.ndarray:
+    """
+    Encodes sequences into a padded uint8 matrix with one row per sequence. A, C,
+    G and U are coded as 1-4, anything else (such as `&` or N) as 5 and positions
+    past the end of a sequence as 0.
+    :param sequences: iterable of sequences
+    :return: numpy array of shape (num sequences, max sequence length)
+    """
+    # pandas columns convert much faster with tolist than by iterating
+    sequences = sequences.tolist() if hasattr(sequences, "tolist") else list(sequences)
+    lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+    max_len = int(lengths.max()) if len(sequences) > 0 else 0
+    matrix = np.zeros((len(sequences), max_len), dtype=np.uint8)
+    # rows of the same length are encoded together with a single reshape
+    for length in np.unique(lengths):
+        rows = np.flatnonzero(lengths == length)
+        joined = "".join([sequences[i] for i in rows]).encode("ascii")
+        block = _LOOKUP[np.frombuffer(joined, dtype=np.uint8)]
+        matrix[rows, :length] = block.reshape(len(rows), length)
+    return matrix
+
+
+def max_run_lengths(mask: np.ndarray) -> np.ndarray:
+    """
+    Returns the longest run of True values in each row of a boolean matrix.
+    :param mask: 2d boolean numpy array
+    :return: 1d numpy array with the longest run in each row
+    """
+    if mask.shape[1] == 0:
+        return np.zeros(mask.shape[0], dtype=np.int64)
+    dtype = np.int16 if mask.shape[1] < 2**15 else np.int32
+    counts = np.cumsum(mask, axis=1, dtype=dtype)
+    # count at the last False position before each element, runs restart there
+    resets = np.maximum.accumulate(np.where(mask, 0, counts), axis=1)
+    return (counts - resets).max(axis=1)
+
+
+def run_lengths(encoded: np.ndarray) -> np.ndarray:
+    """
+    Returns, for every position of an encoded sequence matrix, the length of the
+    run of identical codes that ends at that position.
+    :param encoded: 2d numpy array from `encode_sequences`
+    :return: 2d numpy array of run lengths with the same shape
+    """
+    dtype = np.int16 if encoded.shape[1] < 2**15 else np.int32
+    positions = np.arange(encoded.shape[1], dtype=dtype)
+    is_start = np.ones(encoded.shape, dtype=bool)
+    is_start[:, 1:] = encoded[:, 1:] != encoded[:, :-1]
+    starts = np.maximum.accumulate(np.where(is_start, positions, 0), axis=1)
+    return positions - starts + 1
+
+
+def get_row_blocks(num_rows: int, block_size: int) -> List[slice]:
+    """
+    Splits rows into contiguous blocks so large matrices can be processed in
+    pieces without allocating temporaries for every row at once.
+    :param num_rows: number of rows
+    :param block_size: max rows per block
+    :return: list of slices
+    """
+    return [
+        slice(i, min(i + block_size, num_rows)) for i in range(0, num_rows, block_size)
+    ]
@@ -0,0 +1,299 @@
+import os
+from typing import Dict, List, Optional
+
+from rna_secstruct_design.batch import CSVWriter, open_output
+from rna_secstruct_design.profiler import profiler
+
+FORMATS = ["csv", "parquet", "arrow", "fasta", "rlib", "delta"]
+
+EXTENSIONS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".fa": "fasta",
+    ".fasta": "fasta",
+    ".fna": "fasta",
+    ".fas": "fasta",
+    ".rlib": "rlib",
+    ".delta": "delta",
+}
+# compression extensions that are skipped to find the format. Only the text
+# formats can be written compressed, the others are binary containers
+COMPRESSED_EXTENSIONS = [".gz", ".bz2"]
+TEXT_FORMATS = ["csv", "fasta", "delta"]
+
+# columns that repeat a few values many times are stored as dictionaries, they
+# come back as categoricals in pandas. Names are unique so they are not.
+DICTIONARY_COLUMNS = ["structure", "fold_structure", "reason"]
+FLOAT32_COLUMNS = ["ens_defect"]
+
+
+def is_compressed(path) -> bool:
+    """
+    True if path ends in one of `COMPRESSED_EXTENSIONS`
+    """
+    return os.path.splitext(str(path))[1].lower() in COMPRESSED_EXTENSIONS
+
+
+def get_format(path, fmt: Optional[str] = None) -> str:
+    """
+    Returns the file format to use for path, fmt if given otherwise guessed from
+    the extension, ignoring a gzip or bz2 extension, csv if the extension is
+    unknown
+    """
+    if fmt is not None:
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown format {fmt}, must be one of {FORMATS}")
+        return fmt
+    root, ext = os.path.splitext(str(path))
+    if ext.lower() in COMPRESSED_EXTENSIONS:
+        _, ext = os.path.splitext(root)
+    return EXTENSIONS.get(ext.lower(), "csv")
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("pyarrow is required for parquet and arrow files")
+    return pyarrow
+
+
+class ArrowWriter(object):
+    """
+    Streams result rows into a parquet or arrow (IPC) file with the same interface
+    as `CSVWriter`. Rows are buffered and written as row groups of
+    row_group_size. `DICTIONARY_COLUMNS` are dictionary encoded, per row group in
+    parquet and with one dictionary that grows across record batches in arrow,
+    which only writes the new entries of each batch. `FLOAT32_COLUMNS` are stored
+    as float32, the types of other columns come from the first row group.
+    """
+
+    def __init__(self, path, columns, fmt="parquet", row_group_size=65536):
+        self.pa = _import_pyarrow()
+        if fmt not in ["parquet", "arrow"]:
+            raise ValueError(f"ArrowWriter cannot write {fmt}")
+        self.path = path
+        self.columns = columns
+        self.fmt = fmt
+        self.row_group_size = row_group_size
+        self.num_rows = 0
+        self.__buffer = {col: [] for col in columns}
+        self.__num_buffered = 0
+        self.__dictionaries = {col: {} for col in columns if col in DICTIONARY_COLUMNS}
+        self.__schema = None
+        self.__writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write_rows(self, rows: List[dict]) -> None:
+        for row in rows:
+            for col in self.columns:
+                self.__buffer[col].append(row.get(col))
+        self.__add(len(rows))
+
+    def write_dataframe(self, df) -> None:
+        if len(df) == 0:
+            return
+        for col in self.columns:
+            self.__buffer[col].extend(df[col].tolist())
+        self.__add(len(df))
+
+    def close(self) -> None:
+        if self.__num_buffered > 0 or self.__writer is None:
+            self.__flush(self.__num_buffered)
+        self.__writer.close()
+
+    def __add(self, num: int) -> None:
+        self.__num_buffered += num
+        self.num_rows += num
+        while self.__num_buffered >= self.row_group_size:
+            self.__flush(self.row_group_size)
+
+    def __get_schema(self, arrays: Dict[str, object]):
+        pa = self.pa
+        fields = []
+        for col in self.columns:
+            if col in self.__dictionaries:
+                fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+            elif col in FLOAT32_COLUMNS:
+                fields.append(pa.field(col, pa.float32()))
+            elif len(arrays[col]) == 0:
+                fields.append(pa.field(col, pa.string()))
+            else:
+                fields.append(pa.field(col, arrays[col].type))
+        return pa.schema(fields)
+
+    def __encode(self, col: str, values: list):
+        """
+        dictionary encodes values. A parquet row group stores its own dictionary
+        so it only gets the values it uses. An arrow file needs one dictionary per
+        column, it only grows so every batch is written as a delta of the last.
+        """
+        pa = self.pa
+        if self.fmt == "parquet":
+            values = [None if v is None else str(v) for v in values]
+            array = pa.array(values, type=pa.string()).dictionary_encode()
+            return array.cast(pa.dictionary(pa.int32(), pa.string()))
+        dictionary = self.__dictionaries[col]
+        indices = []
+        for v in values:
+            if v is None:
+                indices.append(None)
+                continue
+            v = str(v)
+            index = dictionary.get(v)
+            if index is None:
+                index = len(dictionary)
+                dictionary[v] = index
+            indices.append(index)
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, type=pa.int32()), pa.array(list(dictionary))
+        )
+
+    def __flush(self, num: int) -> None:
+        """
+        writes the first num buffered rows as one row group
+        """
+        pa = self.pa
+        with profiler.stage("write_output"):
+            arrays = {}
+            for col in self.columns:
+                values = self.__buffer[col][:num]
+                if col in self.__dictionaries:
+                    arrays[col] = self.__encode(col, values)
+                elif col in FLOAT32_COLUMNS:
+                    arrays[col] = pa.array(values, type=pa.float32())
+                elif self.__schema is not None:
+                    arrays[col] = pa.array(values, type=self.__schema.field(col).type)
+                else:
+                    arrays[col] = pa.array(values)
+            if self.__schema is None:
+                self.__schema = self.__get_schema(arrays)
+                self.__open()
+            table = pa.table(
+                [arrays[col] for col in self.columns], schema=self.__schema
+            )
+            self.__writer.write_table(table)
+        for col in self.columns:
+            del self.__buffer[col][:num]
+        self.__num_buffered -= num
+
+    def __open(self) -> None:
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            self.__writer = pq.ParquetWriter(self.path, self.__schema)
+        else:
+            import pyarrow.ipc as ipc
+
+            options = ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            self.__writer = ipc.new_file(self.path, self.__schema, options=options)
+
+
+class FastaWriter(object):
+    """
+    Writes rows as fasta records with the structure on the line after the
+    sequence, the format `rna_secstruct_design.readers` reads. Other columns are
+    not written. Paths ending in .gz or .bz2 are compressed.
+    """
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self.num_rows = 0
+        self.__f = open_output(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write_rows(self, rows: List[dict]) -> None:
+        with profiler.stage("write_output"):
+            for row in rows:
+                self.__f.write(f">{row['name']}\n{row['sequence']}\n")
+                if row.get("structure"):
+                    self.__f.write(f"{row['structure']}\n")
+            self.__f.flush()
+        self.num_rows += len(rows)
+
+    def write_dataframe(self, df) -> None:
+        if len(df) == 0:
+            return
+        self.write_rows(df.to_dict("records"))
+
+    def close(self) -> None:
+        self.__f.close()
+
+
+def open_writer(path, columns, fmt: Optional[str] = None):
+    """
+    Opens a streaming result writer for path
+    :param path: output file
+    :param columns: columns to write, in order
+    :param fmt: one of `FORMATS`, guessed from the extension of path if None
+    :return: `CSVWriter`, `ArrowWriter`, `FastaWriter` or `RlibWriter`
+    """
+    fmt = get_format(path, fmt)
+    if is_compressed(path) and fmt not in TEXT_FORMATS:
+        raise ValueError(f"{fmt} output cannot be compressed, remove the extension")
+    if fmt == "csv":
+        return CSVWriter(path, columns)
+    if fmt == "fasta":
+        return FastaWriter(path, columns)
+    if fmt == "rlib":
+        from rna_secstruct_design.store import RlibWriter
+
+        return RlibWriter(path, columns)
+    if fmt == "delta":
+        raise ValueError("delta files need the wild types, only mut-scan writes them")
+    return ArrowWriter(path, columns, fmt)
+
+
+def read_dataframe(path, fmt: Optional[str] = None):
+    """
+    Reads a csv, parquet, arrow, rlib or delta file into a dataframe. Dictionary
+    encoded columns are turned back into plain strings.
+    :param path: input file
+    :param fmt: one of `FORMATS` except fasta, guessed from the extension of path
+    if None
+    :return: pd.DataFrame
+    """
+    import pandas as pd
+
+    fmt = get_format(path, fmt)
+    with profiler.stage("read_input"):
+        if fmt == "csv":
+            return pd.read_csv(path)
+        if fmt == "rlib":
+            from rna_secstruct_design.store import RlibStore
+
+            with RlibStore(path) as store:
+                return store.get_dataframe()
+        if fmt == "delta":
+            from rna_secstruct_design.delta import read_delta
+
+            return read_delta(path)
+        if fmt == "fasta":
+            raise ValueError("use rna_secstruct_design.readers to read fasta files")
+        _import_pyarrow()
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            df = pq.read_table(path).to_pandas()
+        else:
+            import pyarrow.ipc as ipc
+
+            df = ipc.open_file(path).read_all().to_pandas()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(str)
+    return df
@@ -0,0 +1,265 @@
+import functools
+import json
+import os
+import random
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from rna_secstruct_design.encoding import get_row_blocks, max_run_lengths
+from rna_secstruct_design.logger import get_logger
+from rna_secstruct_design.util import BASEPAIRS
+
+# precomputed helix sequences for sampling helices of a chosen stability. Every
+# helix of up to max_length basepairs that satisfies the constraints of
+# `HelixRandomizer` (no base repeated more than 4 times on a strand, no more than
+# 3 GC basepairs in a row) is enumerated once and annotated with its nearest
+# neighbor free energy. A library is a directory with `meta.json` and one
+# `helices_<length>.npy` per length sorted by energy. The files are memory mapped
+# so every worker process shares them through the page cache.
+#
+# a helix is stored as the base 6 number of its basepairs from the 5' end of the
+# first strand, highest digit first, basepairs are numbered as in BASEPAIRS.
+
+log = get_logger("HELIX-LIBRARY")
+
+VERSION = 1
+DEFAULT_MAX_LENGTH = 8
+HELIX_DTYPE = np.dtype([("code", "<u4"), ("energy", "<f4")])
+
+# the constraints of `HelixRandomizer`
+MAX_REPEAT = 4
+MAX_GC_STRETCH = 3
+
+# Turner 2004 stacking free energies in kcal/mol as in the stack table of
+# ViennaRNA's rna_turner2004.par, _VIENNA_STACKS[p][q] stacks basepair p on the
+# reverse of the basepair that follows it
+_VIENNA_ORDER = ["CG", "GC", "GU", "UG", "AU", "UA"]
+_VIENNA_STACKS = [
+    [-2.4, -3.3, -2.1, -1.4, -2.1, -2.1],
+    [-3.3, -3.4, -2.5, -1.5, -2.2, -2.4],
+    [-2.1, -2.5, 1.3, -0.5, -1.4, -1.3],
+    [-1.4, -1.5, -0.5, 0.3, -0.6, -1.0],
+    [-2.1, -2.2, -1.4, -0.6, -1.1, -0.9],
+    [-2.1, -2.4, -1.3, -1.0, -0.9, -1.3],
+]
+# penalty of every helix end closed by an AU or GU basepair
+TERMINAL_PENALTY = 0.5
+
+# STACKS[a, b] is the energy of basepair a followed by basepair b, both numbered
+# as in BASEPAIRS
+STACKS = np.array(
+    [
+        [
+            _VIENNA_STACKS[_VIENNA_ORDER.index(a)][_VIENNA_ORDER.index(b[::-1])]
+            for b in BASEPAIRS
+        ]
+        for a in BASEPAIRS
+    ],
+    dtype=np.float32,
+)
+END_PENALTIES = np.array(
+    [0.0 if bp in ("GC", "CG") else TERMINAL_PENALTY for bp in BASEPAIRS],
+    dtype=np.float32,
+)
+_FIRST = np.array([ord(bp[0]) for bp in BASEPAIRS], dtype=np.uint8)
+_SECOND = np.array([ord(bp[1]) for bp in BASEPAIRS], dtype=np.uint8)
+_IS_GC = np.array([bp in ("GC", "CG") for bp in BASEPAIRS])
+
+
+def get_helix_energy(sequence: str) -> float:
+    """
+    Nearest neighbor free energy of a helix: its stacking energies and the
+    penalties of AU and GU closing basepairs. The duplex initiation term is the
+    same for every helix and left out.
+    :param sequence: helix sequence as `strand1&strand2`
+    :return: free energy in kcal/mol
+    """
+    strand1, strand2 = sequence.split("&")
+    pairs = [BASEPAIRS.index(a + b) for a, b in zip(strand1, strand2[::-1])]
+    energy = END_PENALTIES[pairs[0]] + END_PENALTIES[pairs[-1]]
+    for a, b in zip(pairs, pairs[1:]):
+        energy += STACKS[a, b]
+    return float(energy)
+
+
+def enumerate_helices(length: int, block_size: int = 1 << 20) -> np.ndarray:
+    """
+    All helices of length basepairs that satisfy the constraints, with energies
+    :param length: number of basepairs
+    :param block_size: helices enumerated at once
+    :return: array of HELIX_DTYPE sorted by energy
+    """
+    if length < 1 or 6**length > np.iinfo(np.uint32).max:
+        raise ValueError(f"helix length must be between 1 and 12, got {length}")
+    powers = 6 ** np.arange(length - 1, -1, -1, dtype=np.int64)
+    results = []
+    for block in get_row_blocks(6**length, block_size):
+        codes = np.arange(block.start, block.stop, dtype=np.int64)
+        digits = (codes[:, None] // powers) % 6
+        keep = max_run_lengths(_IS_GC[digits]) <= MAX_GC_STRETCH
+        for bases in (_FIRST[digits], _SECOND[digits]):
+            for nucleotide in "ACGU":
+                runs = max_run_lengths(bases == ord(nucleotide))
+                keep &= runs <= MAX_REPEAT
+        digits = digits[keep]
+        helices = np.empty(len(digits), dtype=HELIX_DTYPE)
+        helices["code"] = codes[keep]
+        energy = END_PENALTIES[digits[:, 0]] + END_PENALTIES[digits[:, -1]]
+        for p in range(length - 1):
+            energy += STACKS[digits[:, p], digits[:, p + 1]]
+        helices["energy"] = energy
+        results.append(helices)
+    helices = np.concatenate(results)
+    return helices[np.argsort(helices["energy"], kind="stable")]
+
+
+def decode_helix(code: int, length: int) -> str:
+    """
+    Helix sequence of a library code
+    :return: sequence as `strand1&strand2`
+    """
+    pairs = []
+    for _ in range(length):
+        code, digit = divmod(code, 6)
+        pairs.append(BASEPAIRS[digit])
+    pairs.reverse()
+    strand1 = "".join(bp[0] for bp in pairs)
+    strand2 = "".join(bp[1] for bp in reversed(pairs))
+    return strand1 + "&" + strand2
+
+
+def build_helix_library(path, max_length: int = DEFAULT_MAX_LENGTH) -> None:
+    """
+    Enumerates the helices of every length up to max_length and writes them to
+    the library directory path
+    """
+    os.makedirs(path, exist_ok=True)
+    counts = {}
+    for length in range(1, max_length + 1):
+        helices = enumerate_helices(length)
+        np.save(os.path.join(path, f"helices_{length}.npy"), helices)
+        counts[length] = len(helices)
+        log.info(f"{len(helices)} helices of length {length}")
+    meta = {"version": VERSION, "max_length": max_length, "counts": counts}
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+class HelixLibrary(object):
+    """
+    Memory mapped helix library written by `build_helix_library`
+    """
+
+    def __init__(self, path):
+        self.path = path
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.isfile(meta_path):
+            raise ValueError(f"{path} is not a helix library")
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta["version"] != VERSION:
+            raise ValueError(f"unsupported helix library version {meta['version']}")
+        self.max_length = meta["max_length"]
+        self.__helices = {}
+        self.__bands = {}
+        self.__matches = {}
+
+    def get_helices(self, length: int) -> np.ndarray:
+        """
+        helices of a length sorted by energy, mapped on first use
+        """
+        if length < 1 or length > self.max_length:
+            raise ValueError(f"no helices of length {length} in {self.path}")
+        if length not in self.__helices:
+            path = os.path.join(self.path, f"helices_{length}.npy")
+            self.__helices[length] = np.load(path, mmap_mode="r")
+        return self.__helices[length]
+
+    def get_band(
+        self, length: int, energy_band: Optional[Tuple[float, float]] = None
+    ) -> Tuple[int, int]:
+        """
+        index range of the helices of a length inside an energy band
+        :param energy_band: (min, max) energy per basepair in kcal/mol, every
+        helix if None
+        """
+        key = (length, energy_band)
+        if key not in self.__bands:
+            helices = self.get_helices(length)
+            if energy_band is None:
+                self.__bands[key] = (0, len(helices))
+            else:
+                energies = helices["energy"]
+                lo = np.searchsorted(energies, energy_band[0] * length, "left")
+                hi = np.searchsorted(energies, energy_band[1] * length, "right")
+                self.__bands[key] = (int(lo), int(hi))
+        return self.__bands[key]
+
+    def get_matches(
+        self,
+        length: int,
+        energy_band: Optional[Tuple[float, float]] = None,
+        fixed: Optional[Dict[int, str]] = None,
+    ) -> np.ndarray:
+        """
+        indices of the helices of an energy band with the given basepairs, found
+        once per combination and cached
+        :param fixed: basepairs to keep by their position from the 5' end of the
+        first strand, such as {0: "GC"}
+        """
+        key = (length, energy_band, tuple(sorted(fixed.items())))
+        if key not in self.__matches:
+            lo, hi = self.get_band(length, energy_band)
+            codes = np.asarray(self.get_helices(length)["code"][lo:hi], np.int64)
+            keep = np.ones(len(codes), dtype=bool)
+            for pos, bp in fixed.items():
+                if bp not in BASEPAIRS:
+                    keep[:] = False
+                    break
+                digits = (codes // 6 ** (length - 1 - pos)) % 6
+                keep &= digits == BASEPAIRS.index(bp)
+            self.__matches[key] = lo + np.flatnonzero(keep)
+        return self.__matches[key]
+
+    def sample(
+        self,
+        length: int,
+        energy_band: Optional[Tuple[float, float]] = None,
+        fixed: Optional[Dict[int, str]] = None,
+    ) -> Optional[str]:
+        """
+        A random helix of a length from an energy band
+        :param length: number of basepairs
+        :param energy_band: (min, max) energy per basepair in kcal/mol, every
+        helix if None
+        :param fixed: basepairs the helix must have, see `get_matches`
+        :return: sequence as `strand1&strand2` or None if no helix qualifies
+        """
+        if fixed:
+            matches = self.get_matches(length, energy_band, fixed)
+            if len(matches) == 0:
+                return None
+            index = int(matches[random.randrange(len(matches))])
+        else:
+            lo, hi = self.get_band(length, energy_band)
+            if lo == hi:
+                return None
+            index = random.randrange(lo, hi)
+        code = int(self.get_helices(length)["code"][index])
+        return decode_helix(code, length)
+
+    def get_counts(self) -> Dict[int, int]:
+        """
+        number of helices of every length
+        """
+        return {n: len(self.get_helices(n)) for n in range(1, self.max_length + 1)}
+
+
+@functools.lru_cache(maxsize=None)
+def get_helix_library(path) -> HelixLibrary:
+    """
+    `HelixLibrary` of path, opened once per process so its mapped files and
+    cached matches are kept between work units
+    """
+    return HelixLibrary(path)
@@ -1,14 +1,20 @@
+import time
+from dataclasses import dataclass, fields
+from typing import Dict
+
 from rna_secstruct import SecStruct
 from rna_secstruct.motif import Motif
-from vienna import fold, cofold
 
 from rna_secstruct_design.constraints import (
     MaxRepeatingConstraint,
     MaxGCStretchConstraint,
     MaxRepeatingIncreaseConstraint,
     MaxGCStretchIncreaseConstraint,
+    MaxOffTargetPairingIncreaseConstraint,
 )
+from rna_secstruct_design.folding import fold_cache
 from rna_secstruct_design.logger import get_logger
+from rna_secstruct_design.profiler import profiler
 from rna_secstruct_design.selection import get_selection
 from rna_secstruct_design.util import random_weighted_basepair
 
@@ -63,30 +69,125 @@ def get_designable_sequence(secstruct: SecStruct, exclude=None):
     return design_sequence
 
 
+@dataclass
+class DesignStats:
+    """
+    What it took `HelixRandomizer.run` to find a design: candidate sequences
+    generated, where the rejected ones died, folds performed and time spent.
+    """
+
+    iterations: int = 0
+    helix_samples: int = 0
+    library_samples: int = 0
+    helix_repeat_rejects: int = 0
+    helix_gc_rejects: int = 0
+    helix_exhausted: int = 0
+    repeat_rejects: int = 0
+    gc_rejects: int = 0
+    off_target_rejects: int = 0
+    off_target_hits: int = 0
+    misfold_rejects: int = 0
+    accepted: int = 0
+    folds: int = 0
+    fold_cache_hits: int = 0
+    time: float = 0.0
+
+    def get_rejects(self) -> Dict[str, int]:
+        """
+        rejected candidate sequences by the stage that rejected them
+        """
+        return {
+            "helix_exhausted": self.helix_exhausted,
+            "repeat": self.repeat_rejects,
+            "gc": self.gc_rejects,
+            "off_target": self.off_target_rejects,
+            "misfold": self.misfold_rejects,
+        }
+
+
+DESIGN_STATS_COLUMNS = [f.name for f in fields(DesignStats)]
+
+
 class HelixRandomizer(object):
-    def __init__(self):
+    def __init__(self, max_off_target=None, helix_library=None, energy_band=None):
+        """
+        :param max_off_target: reject candidates before folding them if they can
+        form a stretch of more than max_off_target basepairs that the structure
+        does not have and that is longer than the helices it competes with. No
+        prefilter if None.
+        :param helix_library: optional `HelixLibrary` to sample helices from,
+        helices with kept positions or longer than the library are still
+        generated one basepair at a time
+        :param energy_band: (min, max) energy per basepair in kcal/mol of the
+        helices sampled from helix_library, all of them if None
+        """
         # do not want to repeat a base more than 4 times in a helix
         self.h_repeat_constraint = MaxRepeatingConstraint(4)
         # do not want more than 3 gcs in a row
         self.h_gc_constraint = MaxGCStretchConstraint(3)
+        self.max_off_target = max_off_target
+        self.helix_library = helix_library
+        self.energy_band = energy_band
+
+    def __get_library_helix_sequence(self, h, exclude):
+        """
+        samples the helix from the library if it is short enough and a helix with
+        its kept basepairs is in the energy band, its helices already satisfy the
+        helix constraints
+        """
+        strand1, strand2 = h.strands
+        if len(strand1) > self.helix_library.max_length:
+            return None
+        org_seq = h.sequence.split("&")
+        org_seq[1] = org_seq[1][::-1]
+        # basepairs with a kept position are kept whole as in
+        # generate_helix_sequence
+        fixed = {}
+        for i, (s1, s2) in enumerate(zip(strand1, strand2[::-1])):
+            if s1 in exclude or s2 in exclude:
+                fixed[i] = org_seq[0][i] + org_seq[1][i]
+        with profiler.stage("helix_sampling"):
+            return self.helix_library.sample(len(strand1), self.energy_band, fixed)
 
-    def __get_randomized_helix_sequence(self, h, exclude):
+    def __get_randomized_helix_sequence(self, h, exclude, stats):
+        if self.helix_library is not None:
+            h_seq = self.__get_library_helix_sequence(h, exclude)
+            if h_seq is not None:
+                stats.helix_samples += 1
+                stats.library_samples += 1
+                return h_seq
         for i in range(100):
-            h_seq = generate_helix_sequence(h, exclude)
-            if not self.h_repeat_constraint.satisifes(h_seq):
-                continue
-            if not self.h_gc_constraint.satisifes(h_seq, h.structure):
-                continue
-            if i == 99:
-                log.warning(
-                    "Could not find a helix sequence that satisfies constraints"
-                )
+            stats.helix_samples += 1
+            with profiler.stage("helix_sampling"):
+                h_seq = generate_helix_sequence(h, exclude)
+            with profiler.stage("constraint_checks"):
+                if not self.h_repeat_constraint.satisifes(h_seq):
+                    stats.helix_repeat_rejects += 1
+                    continue
+                if not self.h_gc_constraint.satisifes(h_seq, h.structure):
+                    stats.helix_gc_rejects += 1
+                    continue
             return h_seq
+        log.warning("Could not find a helix sequence that satisfies constraints")
+        return None
 
-    def run(self, secstruct, exclude=None, attempts=10):
+    def run(self, secstruct, exclude=None, attempts=10, return_stats=False):
+        """
+        designs new helix sequences for secstruct and keeps the one with the
+        lowest ensemble defect out of attempts that fold into the structure
+        :param secstruct: SecStruct object to design
+        :param exclude: list of indices to not change sequence
+        :param attempts: number of designs that fold correctly to pick from
+        :param return_stats: also return the `DesignStats` of the run
+        :return: ensemble defect and sequence, and `DesignStats` if return_stats
+        """
+        start = time.perf_counter()
+        stats = DesignStats()
+        hits, misses = fold_cache.hits, fold_cache.misses
         log.debug("running helix randomizer")
         log.debug(f"exclude: {exclude}")
-        secstruct = SecStruct(secstruct.sequence, secstruct.structure)
+        with profiler.stage("secstruct_parse"):
+            secstruct = SecStruct(secstruct.sequence, secstruct.structure)
         if exclude is None:
             log.debug("no exclude given, using flanks")
             exclude = get_selection(secstruct, {"flanks": ""})
@@ -101,32 +202,56 @@ class HelixRandomizer(object):
         gc_constraint = MaxGCStretchIncreaseConstraint(
             3, designable_sequence, secstruct.structure
         )
+        off_target_constraint = None
+        if self.max_off_target is not None:
+            # stretches between positions that are not designed are allowed
+            off_target_constraint = MaxOffTargetPairingIncreaseConstraint(
+                self.max_off_target, designable_sequence, secstruct.structure
+            )
         best = 1000
         best_seq = ""
         count = 0
         seq_count = 0
-        use_cofold = False
         if secstruct.sequence.count("&") > 0:
-            use_cofold = True
             log.debug("using cofold for design")
         while True:
             seq_count += 1
             if seq_count > 1000:
                 log.warn("Could not find a sequence that satisfies constraints")
                 break
+            stats.iterations += 1
+            exhausted = False
             for h in secstruct.get_helices():
-                new_seq = self.__get_randomized_helix_sequence(h, exclude)
-                secstruct.change_motif(h.m_id, new_seq, h.structure)
-            if not repeat_constraint.satisifes(secstruct.sequence):
-                continue
-            if not gc_constraint.satisifes(secstruct.sequence, secstruct.structure):
+                new_seq = self.__get_randomized_helix_sequence(h, exclude, stats)
+                if new_seq is None:
+                    exhausted = True
+                    break
+                with profiler.stage("secstruct_update"):
+                    secstruct.change_motif(h.m_id, new_seq, h.structure)
+            if exhausted:
+                stats.helix_exhausted += 1
                 continue
-            if not use_cofold:
-                r = fold(secstruct.sequence)
-            else:
-                r = cofold(secstruct.sequence)
+            with profiler.stage("constraint_checks"):
+                if not repeat_constraint.satisifes(secstruct.sequence):
+                    stats.repeat_rejects += 1
+                    continue
+                if not gc_constraint.satisifes(secstruct.sequence, secstruct.structure):
+                    stats.gc_rejects += 1
+                    continue
+            if off_target_constraint is not None:
+                with profiler.stage("off_target_filter"):
+                    stretches = off_target_constraint.get_new_stretches(
+                        secstruct.sequence, secstruct.structure
+                    )
+                if len(stretches) > 0:
+                    stats.off_target_rejects += 1
+                    stats.off_target_hits += len(stretches)
+                    continue
+            r = fold_cache.fold(secstruct.sequence)
             if r.dot_bracket != secstruct.structure:
+                stats.misfold_rejects += 1
                 continue
+            stats.accepted += 1
             if r.ens_defect < best:
                 best = r.ens_defect
                 best_seq = secstruct.sequence
@@ -134,4 +259,9 @@ class HelixRandomizer(object):
             if count >= attempts:
                 break
         log.debug(f"sequence: {best_seq} and ens_defect: {best}")
+        stats.folds = fold_cache.misses - misses
+        stats.fold_cache_hits = fold_cache.hits - hits
+        stats.time = time.perf_counter() - start
+        if return_stats:
+            return best, best_seq, stats
         return best, best_seq
@@ -0,0 +1,293 @@
+import queue
+import time
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing import Pool
+from typing import Iterator, List, Optional
+
+from rna_secstruct_design.commands import get_input_rows
+from rna_secstruct_design.formats import open_writer
+from rna_secstruct_design.logger import get_logger
+from rna_secstruct_design.pipeline import REJECT_COLUMNS, Stage, _load_yaml
+from rna_secstruct_design.profiler import profiler, ProfiledTask
+
+# runs many small helix_rand, replace and mut_scan jobs on one pool so the
+# interpreter, imports and pool startup are paid once. Each job is a single
+# pipeline stage with its own input and output:
+#
+#   num_processes: 4
+#   chunk_size: 100
+#   jobs:
+#     - type: mut_scan
+#       name: tlr_scan             defaults to the output file
+#       seq: GGAAC...              or input: with a csv, fasta, ... file
+#       struct: ((..
+#       param_file: mut-scan-tlr.yml
+#       output: tlr_scan.csv
+#     - type: helix_rand
+#       input: constructs.csv
+#       num_seqs: 10
+#       output: designs.csv
+#
+# work units are submitted one per job in turn, so a job with a large input
+# cannot hold the pool until it is done, and at most 4 x num_processes are in
+# flight. Every job keeps its own queue of pending units and writes their results
+# in order as they finish, a slow unit only holds up the output of its own job.
+
+log = get_logger("JOBS")
+
+
+@dataclass
+class Job:
+    """
+    A stage run on its own input and written to its own output
+    """
+
+    name: str
+    stage: Stage
+    seq: Optional[str] = None
+    struct: Optional[str] = None
+    input: Optional[str] = None
+    output: str = "output.csv"
+    format: Optional[str] = None
+    error: Optional[str] = None
+    time: float = 0.0
+
+    @classmethod
+    def from_spec(cls, spec: dict) -> "Job":
+        spec = dict(spec)
+        kwargs = {}
+        for key in ["seq", "struct", "input", "output", "format"]:
+            if key in spec:
+                kwargs[key] = spec.pop(key)
+        name = spec.pop("name", kwargs.get("output", "output.csv"))
+        if (kwargs.get("seq") is None) == (kwargs.get("input") is None):
+            raise ValueError(f"job {name}: needs one of seq or input")
+        # a single sequence keeps the mutant names of mut_scan unprefixed
+        if spec.get("type") == "mut_scan" and "seq" in kwargs:
+            spec.setdefault("prefix_names", False)
+        return cls(name, Stage.from_spec(spec), **kwargs)
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[list]:
+        """
+        inputs of the work units of the stage, read lazily, see `Stage.iter_units`
+        """
+        rows = get_input_rows(self.seq, self.struct, self.input)
+        return self.stage.iter_units(rows, chunk_size)
+
+    def __str__(self):
+        if self.error is not None:
+            return f"{self.name}: failed, {self.error}"
+        return f"{self.name}: {self.stage}, {self.time:.1f}s -> {self.output}"
+
+
+def load_jobs(path) -> dict:
+    """
+    Reads a jobs file, see the example at the top of this module
+    :return: dictionary of the spec with a list of `Job` under jobs
+    """
+    spec = _load_yaml(path)
+    if not isinstance(spec, dict) or not spec.get("jobs"):
+        raise ValueError(f"{path} must have a list of jobs")
+    spec["jobs"] = [Job.from_spec(j) for j in spec["jobs"]]
+    names = [job.name for job in spec["jobs"]]
+    if len(set(names)) != len(names):
+        raise ValueError("job names must be unique")
+    return spec
+
+
+class _RunningJob(object):
+    """
+    scheduling state of one job
+    """
+
+    def __init__(self, job: Job, chunk_size: int):
+        self.job = job
+        self.func = job.stage.get_func()
+        if profiler.enabled:
+            self.func = ProfiledTask(self.func, profiler.cprofile_file)
+        self.chunks = None
+        self.chunk_size = chunk_size
+        self.writer = None
+        self.rejects_writer = None
+        self.start = None
+        # ids of the work units submitted but not written yet, in order
+        self.pending = deque()
+        # results of pending units that finished, by id
+        self.finished = {}
+        self.num_units = 0
+        self.exhausted = False
+
+    def open(self) -> None:
+        self.start = time.perf_counter()
+        self.chunks = self.job.iter_chunks(self.chunk_size)
+        stage = self.job.stage
+        self.writer = open_writer(self.job.output, stage.columns, self.job.format)
+        if stage.rejects is not None:
+            self.rejects_writer = open_writer(stage.rejects, REJECT_COLUMNS)
+
+    def next_chunk(self):
+        chunk = next(self.chunks, None)
+        self.exhausted = chunk is None
+        return chunk
+
+    @property
+    def done(self) -> bool:
+        return self.exhausted and len(self.pending) == 0
+
+    def pop_ready(self) -> Iterator:
+        """
+        (result, error) of the finished units at the head of the queue, in order
+        """
+        while len(self.pending) > 0 and self.pending[0] in self.finished:
+            yield self.finished.pop(self.pending.popleft())
+
+    def write(self, result) -> None:
+        if profiler.enabled:
+            result, stats = result
+            profiler.merge(stats)
+        result_rows, reject_rows, metrics = result
+        self.job.stage.add_results(result_rows, reject_rows, metrics)
+        self.writer.write_rows(result_rows)
+        if self.rejects_writer is not None and len(reject_rows) > 0:
+            self.rejects_writer.write_rows(reject_rows)
+
+    def close(self) -> None:
+        if self.start is None:
+            return
+        for w in (self.writer, self.rejects_writer):
+            if w is not None:
+                w.close()
+        self.job.time = time.perf_counter() - self.start
+        self.start = None
+
+
+class JobRunner(object):
+    """
+    Runs jobs with their work units shared round robin on one pool
+    """
+
+    def __init__(self, jobs: List[Job], num_processes: int = 1, chunk_size=100):
+        self.jobs = jobs
+        self.num_processes = num_processes
+        self.chunk_size = chunk_size
+
+    def run(self) -> List[Job]:
+        """
+        Runs every job. A job that fails is logged and stopped, the others go on.
+        :return: the jobs with their stats and errors
+        """
+        pool = None
+        if self.num_processes > 1:
+            pool = Pool(self.num_processes)
+        running = [_RunningJob(job, self.chunk_size) for job in self.jobs]
+        try:
+            self.__run(running, pool)
+        finally:
+            for r in running:
+                r.close()
+            if pool is not None:
+                pool.close()
+                pool.join()
+        for job in self.jobs:
+            log.info(str(job))
+        return self.jobs
+
+    def __run(self, running: List[_RunningJob], pool) -> None:
+        max_pending = max(1, self.num_processes * 4)
+        # (job, unit id, result, error) of finished units, put by the pool
+        finished = queue.Queue()
+        active = deque(r for r in running if self.__start(r))
+        num_running = 0
+        while len(active) > 0 or num_running > 0:
+            num_running += self.__submit(
+                active, pool, max_pending, num_running, finished
+            )
+            if num_running == 0:
+                continue
+            r, unit_id, result, error = finished.get()
+            num_running -= 1
+            r.finished[unit_id] = (result, error)
+            self.__write_ready(r, active)
+
+    def __submit(self, active, pool, max_pending, num_running, finished) -> int:
+        """
+        submits one unit per active job in turn until max_pending are running, a
+        job whose results wait for its oldest unit is skipped
+        :return: number of units submitted
+        """
+        num_submitted = 0
+        num_waiting = 0
+        while len(active) > num_waiting and num_running + num_submitted < max_pending:
+            r = active.popleft()
+            if len(r.pending) >= max_pending:
+                active.append(r)
+                num_waiting += 1
+                continue
+            chunk = self.__next_chunk(r)
+            if chunk is None:
+                if r.done:
+                    r.close()
+                continue
+            unit_id = r.num_units
+            r.num_units += 1
+            r.pending.append(unit_id)
+            if pool is None:
+                r.finished[unit_id] = self.__run_unit(r, chunk)
+                self.__write_ready(r, active)
+            else:
+                pool.apply_async(
+                    r.func,
+                    (chunk,),
+                    callback=lambda res, r=r, i=unit_id: finished.put(
+                        (r, i, res, None)
+                    ),
+                    error_callback=lambda e, r=r, i=unit_id: finished.put(
+                        (r, i, None, e)
+                    ),
+                )
+                num_submitted += 1
+            if r.job.error is None:
+                active.append(r)
+        return num_submitted
+
+    def __write_ready(self, r: _RunningJob, active) -> None:
+        for result, error in r.pop_ready():
+            if r.job.error is not None:
+                continue
+            try:
+                if error is not None:
+                    raise error
+                r.write(result)
+            except Exception as e:
+                self.__fail(r, e, active)
+        if r.done:
+            r.close()
+
+    def __run_unit(self, r: _RunningJob, chunk):
+        try:
+            return r.func(chunk), None
+        except Exception as e:
+            return None, e
+
+    def __start(self, r: _RunningJob) -> bool:
+        try:
+            r.open()
+        except Exception as e:
+            self.__fail(r, e, None)
+            return False
+        return True
+
+    def __next_chunk(self, r: _RunningJob):
+        try:
+            return r.next_chunk()
+        except Exception as e:
+            self.__fail(r, e, None)
+            return None
+
+    def __fail(self, r: _RunningJob, e: Exception, active) -> None:
+        log.error(f"job {r.job.name} failed: {e}")
+        r.job.error = str(e)
+        r.close()
+        if active is not None and r in active:
+            active.remove(r)
@@ -1,6 +1,7 @@
 import itertools
+import math
 import random
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Iterator
 from dataclasses import dataclass
 
 from rna_secstruct import SecStruct
@@ -8,7 +9,7 @@ from rna_secstruct.parser import ConnectivityList
 from seq_tools.structure import SequenceStructure
 
 from rna_secstruct_design.util import random_helix
-
+from rna_secstruct_design.profiler import profiler
 
 # introduce mutations into the sequence at allowed positions #########################
 
@@ -19,6 +20,13 @@ class Mutation:
     sequence: str
 
 
+@dataclass(frozen=True, order=True)
+class StructureVariant:
+    name: str
+    sequence: str
+    structure: str
+
+
 def possible_nucleotide_mutations(nucleotide: str) -> list:
     """
     Given a RNA nucleotide, returns all possible other nucleotides it could be.
@@ -83,6 +91,24 @@ def find_double_mutations(sequence: str, exclude: list) -> list:
     return result
 
 
+def get_mutation_name(sequence: str, new_sequence: str) -> str:
+    """
+    Names a mutant by its substitutions in the same format as
+    `find_multiple_mutations`, for example `A1U_U2A`.
+    :param sequence: the original sequence
+    :param new_sequence: the mutant sequence, must be the same length
+    :return: name of the mutant
+    """
+    if len(sequence) != len(new_sequence):
+        raise ValueError("sequences must be the same length")
+    names = []
+    for i, (nuc, new_nuc) in enumerate(zip(sequence, new_sequence)):
+        if nuc != new_nuc:
+            names.append(nuc + str(i + 1) + new_nuc)
+    return "_".join(names)
+
+
+@profiler.timed("mutations")
 def find_multiple_mutations(sequence: str, num: int, exclude: list) -> List[Mutation]:
     """
     Given a RNA sequence and a list indicating mutation positions, returns all new
@@ -92,30 +118,36 @@ def find_multiple_mutations(sequence: str, num: int, exclude: list) -> List[Muta
     :param num: The number of mutations to make.
     :param exclude: A list of positions in the sequence where mutations are not allowed.
     """
-    allowed_pos = []
-    for i in range(0, len(sequence)):
-        if i not in exclude:
-            allowed_pos.append(i)
-    combos = itertools.product(allowed_pos, repeat=num)
-    count = 0
-    seen = []
-    results = []
-    for muts in combos:
-        if len(set(muts)) != len(muts):
-            continue
-        muts = sorted(muts)
-        key = "-".join([str(x) for x in muts])
-        if key in seen:
-            continue
-        seen.append(key)
+    return list(iter_multiple_mutations(sequence, num, exclude))
+
+
+def count_multiple_mutations(sequence: str, num: int, exclude: list) -> int:
+    """
+    Returns the number of mutants `iter_multiple_mutations` generates without
+    building them.
+    """
+    exclude = set(exclude)
+    num_allowed = sum(1 for i in range(len(sequence)) if i not in exclude)
+    return math.comb(num_allowed, num) * 3**num
+
+
+def iter_multiple_mutations(
+    sequence: str, num: int, exclude: list
+) -> Iterator[Mutation]:
+    """
+    Lazy version of `find_multiple_mutations`, mutants are yielded in the same
+    order
+    """
+    exclude = set(exclude)
+    allowed_pos = [i for i in range(0, len(sequence)) if i not in exclude]
+    for muts in itertools.combinations(allowed_pos, num):
         mut_pos = []
         for i in muts:
             muts_at_pos = []
             for new_nucleotide in possible_nucleotide_mutations(sequence[i]):
                 muts_at_pos.append([i, new_nucleotide])
             mut_pos.append(muts_at_pos)
-        mut_combos = list(itertools.product(*mut_pos))
-        for mut_combo in mut_combos:
+        for mut_combo in itertools.product(*mut_pos):
             names = []
             new_sequence = sequence[:]
             for mut in mut_combo:
@@ -123,9 +155,7 @@ def find_multiple_mutations(sequence: str, num: int, exclude: list) -> List[Muta
                 new_sequence = (
                     new_sequence[: mut[0]] + mut[1] + new_sequence[mut[0] + 1 :]
                 )
-            results.append(Mutation("_".join(names), new_sequence))
-        count += 1
-    return results
+            yield Mutation("_".join(names), new_sequence)
 
 
 # mutate basepairs ###################################################################
@@ -176,8 +206,28 @@ def get_basepair_mutation(struct: SecStruct, pos, new_bp=None, gu=True) -> SecSt
 def get_basepair_mutations(
     struct: SecStruct, num: int, exclude=None, gu=True, flank_bp=False, max_muts=1000000
 ) -> List[str]:
+    """
+    List of the mutants of `iter_basepair_mutations`
+    """
+    return list(iter_basepair_mutations(struct, num, exclude, gu, flank_bp, max_muts))
+
+
+def iter_basepair_mutations(
+    struct: SecStruct, num: int, exclude=None, gu=True, flank_bp=False, max_muts=1000000
+) -> Iterator[str]:
+    """
+    Lazily yields mutants of struct that change num basepairs each, every set of
+    basepairs at most once and in random order when they are capped by max_muts
+    :param struct: SecStruct to mutate
+    :param num: number of basepairs changed per mutant
+    :param exclude: positions not to mutate
+    :param gu: allow GU basepairs
+    :param flank_bp: allow basepairs next to unpaired positions
+    :param max_muts: max number of mutants
+    """
     if exclude is None:
         exclude = []
+    exclude = set(exclude)
     allowed_pos = []
     for i in range(0, len(struct.structure)):
         # exclude positions in exclude
@@ -198,20 +248,8 @@ def get_basepair_mutations(
             continue
         allowed_pos.append(i)
     cl = ConnectivityList(struct.sequence, struct.structure)
-    seen = []
-    combos = itertools.product(allowed_pos, repeat=num)
-    sequences = []
-    combos = list(combos)
-    random.shuffle(combos)
-    count = 0
-    for muts in combos:
+    for muts in _iter_position_sets(allowed_pos, num, max_muts):
         sequence = str(struct.sequence)
-        muts = sorted(muts)
-        if len(set(muts)) != len(muts):
-            continue
-        mut_key = "-".join([str(x) for x in muts])
-        if mut_key in seen:
-            continue
         for m in muts:
             new_bp = random.choice(possible_basepair_mutations(cl.get_basepair(m), gu))
             sequence = (
@@ -221,14 +259,34 @@ def get_basepair_mutations(
                 + new_bp[1]
                 + sequence[cl.get_paired_nucleotide(m) + 1 :]
             )
-        count += 1
-        if count > max_muts:
-            break
-        seen.append(mut_key)
-        sequences.append(sequence)
-    return sequences
+        yield sequence
+
+
+def _iter_position_sets(positions, num, max_sets) -> Iterator[Tuple[int, ...]]:
+    """
+    yields at most max_sets distinct sorted sets of num positions, all of them if
+    there are no more than max_sets and a random sample otherwise
+    """
+    total = math.comb(len(positions), num)
+    if total <= max_sets:
+        yield from itertools.combinations(positions, num)
+        return
+    if max_sets > total // 2:
+        # sampling would mostly draw sets already seen
+        sets = list(itertools.combinations(positions, num))
+        random.shuffle(sets)
+        yield from sets[:max_sets]
+        return
+    seen = set()
+    while len(seen) < max_sets:
+        key = tuple(sorted(random.sample(positions, num)))
+        if key in seen:
+            continue
+        seen.add(key)
+        yield key
 
 
+@profiler.timed("mutations")
 def get_basepair_mutuations_random(
     struct: SecStruct, num: int, exclude=None, gu=True, flank_bp=False, max_muts=1
 ):
@@ -354,6 +412,45 @@ def scan_helix_lengths(
     return structs
 
 
+def iter_all_helix_lengths(
+    struct: SecStruct, h_ranges: Dict[int, Tuple[int, int]]
+) -> Iterator[Tuple[Tuple[int, ...], SecStruct]]:
+    """
+    Lazily iterates though all possible helical lengths in a given secstruct
+    object in the same order as `scan_all_helix_lengths`. Each length of the first
+    helix is only built once and shared by every setting of the later helices, so
+    a scan over n helices does one `change_helix_length` per node of the
+    combination tree instead of n per combination. The yielded structures can be
+    shared between combinations and should not be modified.
+    :param struct: a secondary structure
+    :param h_ranges: a dictionary of the positions of the helices and the
+        minimum and maximum lengths of the helices
+    :return: iterator of the helix lengths and the secondary structure
+    """
+    helix_pos = list(h_ranges.keys())
+    ranges = [range(v[0], v[1] + 1) for v in h_ranges.values()]
+
+    def iter_lengths(current, depth, lengths):
+        if depth == len(helix_pos):
+            yield lengths, current
+            return
+        for length in ranges[depth]:
+            new_struct = change_helix_length(current, helix_pos[depth], length)
+            yield from iter_lengths(new_struct, depth + 1, lengths + (length,))
+
+    return iter_lengths(struct, 0, ())
+
+
+def count_all_helix_lengths(h_ranges: Dict[int, Tuple[int, int]]) -> int:
+    """
+    Returns the number of structures a helix length scan generates
+    """
+    count = 1
+    for v in h_ranges.values():
+        count *= max(v[1] - v[0] + 1, 0)
+    return count
+
+
 def scan_all_helix_lengths(
     struct: SecStruct, h_ranges: Dict[int, Tuple[int, int]]
 ) -> List[SecStruct]:
@@ -366,18 +463,12 @@ def scan_all_helix_lengths(
         minimum and maximum lengths of the helices
     :return: a list of secondary structures with all possible helical lengths
     """
-    ranges = []
-    helix_pos = []
-    structs = []
-    for k, v in h_ranges.items():
-        ranges.append(list(range(v[0], v[1] + 1)))
-        helix_pos.append(k)
-    for i in itertools.product(*ranges):
-        new_struct = struct.get_copy()
-        for j, pos in enumerate(helix_pos):
-            new_struct = change_helix_length(new_struct, pos, i[j])
-        structs.append(new_struct)
-    return structs
+    # the iterator yields struct itself where no length changes, every result is
+    # a copy of its own
+    return [
+        new_struct.get_copy()
+        for _, new_struct in iter_all_helix_lengths(struct, h_ranges)
+    ]
 
 
 # unpaired insertions ################################################################
@@ -414,51 +505,108 @@ def add_unpaired(
     return structs
 
 
-def add_unpaired_sweep(
+def _get_insertion_slots(struct: SequenceStructure, n_include, exclude):
+    slots = []
+    for i, char in enumerate(struct.structure):
+        if i < 1:
+            continue
+        if i in exclude:
+            continue
+        if char != ".":
+            slots.append(i)
+    if len(slots) < n_include:
+        raise ValueError(
+            "n_include must be less than the number of unpaired nucleotides"
+        )
+    return slots
+
+
+def _get_inserted_structure(structure: str, combo) -> str:
+    pieces = []
+    prev_pos = 0
+    for pos in combo:
+        pieces.extend([structure[prev_pos:pos], "."])
+        prev_pos = pos
+    pieces.append(structure[prev_pos:])
+    new_structure = "".join(pieces)
+    # do not create lone basepairs next to the new unpaired nucleotides
+    if new_structure.find(".(.") != -1 or new_structure.find(".).") != -1:
+        return None
+    return new_structure
+
+
+def iter_add_unpaired_sweep(
     struct: SequenceStructure, n_include, exclude=None, all_nucleotides=False
-) -> List[SequenceStructure]:
+) -> Iterator[StructureVariant]:
     """
-    Create a list of secondary structures each with n unpaired nucleotide added.
+    Lazily generates every secondary structure with n unpaired nucleotides added.
+    New nucleotides are only inserted directly 5' of paired positions, so two
+    different insertions never produce the same sequence and structure. Each
+    variant is named by its insertions, `4insA` is an A inserted after position 4.
     :param struct: a secondary structure
     :param n_include: the number of unpaired nucleotides to add
     :param exclude: a list of positions to exclude
     :param all_nucleotides: if True, add all possible nucleotides at each position
-    :return: a list of secondary structures with n unpaired nucleotides added
+    :return: iterator of StructureVariant
     """
     if exclude is None:
         exclude = []
     if n_include < 1:
         raise ValueError("n_include must be greater than 0")
-    unpaired = []
-    for i, char in enumerate(struct.structure):
-        if i < 1:
-            continue
-        if i in exclude:
+    slots = _get_insertion_slots(struct, n_include, exclude)
+    nucs = "AUCG" if all_nucleotides else "A"
+    sequence = struct.sequence
+    for combo in itertools.combinations(slots, n_include):
+        new_structure = _get_inserted_structure(struct.structure, combo)
+        if new_structure is None:
             continue
-        if char != ".":
-            unpaired.append(i)
-    if len(unpaired) < n_include:
-        raise ValueError(
-            "n_include must be less than the number of unpaired nucleotides"
-        )
-    combos = itertools.combinations(unpaired, n_include)
-    structs = []
-    for combo in combos:
-        combo = sorted(combo)
-        new_structs = [SequenceStructure(struct.sequence, struct.structure)]
-        cur_structs = []
-        while len(combo) > 0:
-            pos = combo.pop()
-            for s in new_structs:
-                new_structs = add_unpaired(s, pos, 1, all_nucleotides)
-                for ns in new_structs:
-                    if ns.structure.find(".(.") != -1 or ns.structure.find(".).") != -1:
-                        continue
-                    cur_structs.append(ns)
-            new_structs = cur_structs
-            cur_structs = []
-        structs.extend(new_structs)
-    return structs
+        segments = [sequence[: combo[0]]]
+        for i, pos in enumerate(combo[1:]):
+            segments.append(sequence[combo[i] : pos])
+        segments.append(sequence[combo[-1] :])
+        for new_nucs in itertools.product(nucs, repeat=n_include):
+            pieces = [segments[0]]
+            for nuc, segment in zip(new_nucs, segments[1:]):
+                pieces.extend([nuc, segment])
+            name = "_".join(f"{pos}ins{nuc}" for pos, nuc in zip(combo, new_nucs))
+            yield StructureVariant(name, "".join(pieces), new_structure)
+
+
+def count_add_unpaired_sweep(
+    struct: SequenceStructure, n_include, exclude=None, all_nucleotides=False
+) -> int:
+    """
+    Returns the number of structures `iter_add_unpaired_sweep` generates without
+    building them.
+    """
+    if exclude is None:
+        exclude = []
+    if n_include < 1:
+        raise ValueError("n_include must be greater than 0")
+    slots = _get_insertion_slots(struct, n_include, exclude)
+    num_nucs = 4 if all_nucleotides else 1
+    count = 0
+    for combo in itertools.combinations(slots, n_include):
+        if _get_inserted_structure(struct.structure, combo) is not None:
+            count += num_nucs**n_include
+    return count
+
+
+def add_unpaired_sweep(
+    struct: SequenceStructure, n_include, exclude=None, all_nucleotides=False
+) -> List[SequenceStructure]:
+    """
+    Create a list of secondary structures each with n unpaired nucleotide added.
+    :param struct: a secondary structure
+    :param n_include: the number of unpaired nucleotides to add
+    :param exclude: a list of positions to exclude
+    :param all_nucleotides: if True, add all possible nucleotides at each position
+    :return: a list of secondary structures with n unpaired nucleotides added
+    """
+    return [
+        SequenceStructure(v.sequence, v.structure)
+        for v in iter_add_unpaired_sweep(struct, n_include, exclude, all_nucleotides)
+    ]
 
 
 # deletions ##########################################################################
@@ -481,76 +629,218 @@ def remove_nucleotides(struct: SequenceStructure, pos) -> SequenceStructure:
     return new_struct
 
 
+def _get_deletable(struct: SequenceStructure, n_remove, exclude, unpaired_only):
+    if exclude is None:
+        exclude = []
+    if n_remove < 1:
+        raise ValueError("n_remove must be greater than 0")
+    exclude = set(exclude)
+    deletable = []
+    for i, char in enumerate(struct.structure):
+        if i in exclude or char == "&":
+            deletable.append(False)
+        elif unpaired_only:
+            deletable.append(char == ".")
+        else:
+            deletable.append(True)
+    if sum(deletable) < n_remove:
+        if unpaired_only:
+            raise ValueError(
+                "n_remove must be less than the number of unpaired nucleotides"
+            )
+        raise ValueError("n_remove must be less than the number of nucleotides")
+    return deletable
+
+
+def _get_deletable_after(deletable) -> List[int]:
+    """
+    number of deletable positions after each position
+    """
+    deletable_after = [0] * len(deletable)
+    for i in range(len(deletable) - 1, 0, -1):
+        deletable_after[i - 1] = deletable_after[i] + deletable[i]
+    return deletable_after
+
+
+def _get_next_deletion_states(
+    tokens, deletable, deletable_after, states, n_read, n_remove
+):
+    """
+    Advances a set of partial deletions by one kept token. Each state is the
+    position of the last kept token and maps to the state it came from. States
+    are grouped by the token they keep next, which makes every path through the
+    groups a distinct result.
+    """
+    next_states = {}
+    for j in states:
+        remaining = n_remove - (j + 1 - n_read)
+        for q in range(j + 1, min(j + 2 + remaining, len(tokens))):
+            # enough deletable positions must be left to finish
+            left = remaining - (q - j - 1)
+            if deletable_after[q] >= left:
+                next_states.setdefault(tokens[q], {}).setdefault(q, j)
+            if not deletable[q]:
+                break
+    return next_states
+
+
+def _iter_canonical_deletions(tokens, deletable, n_remove):
+    """
+    Yields the kept positions of every distinct result of deleting n_remove
+    deletable tokens, each result exactly once.
+    """
+    n_keep = len(tokens) - n_remove
+    deletable_after = _get_deletable_after(deletable)
+    if n_keep == 0:
+        if all(deletable):
+            yield []
+        return
+    path = [{-1: None}]
+    stack = [
+        iter(
+            _get_next_deletion_states(
+                tokens, deletable, deletable_after, path[0], 0, n_remove
+            ).values()
+        )
+    ]
+    while len(stack) > 0:
+        states = next(stack[-1], None)
+        if states is None:
+            stack.pop()
+            path.pop()
+            continue
+        path.append(states)
+        if len(path) - 1 < n_keep:
+            next_states = _get_next_deletion_states(
+                tokens, deletable, deletable_after, states, len(path) - 1, n_remove
+            )
+            stack.append(iter(next_states.values()))
+            continue
+        kept = []
+        pos = min(states)
+        for depth in range(n_keep, 0, -1):
+            kept.append(pos)
+            pos = path[depth][pos]
+        path.pop()
+        yield kept[::-1]
+
+
+def _count_canonical_deletions(tokens, deletable, n_remove) -> int:
+    n_keep = len(tokens) - n_remove
+    deletable_after = _get_deletable_after(deletable)
+    if n_keep == 0:
+        return int(all(deletable))
+    # number of distinct prefixes that end in each set of states
+    layer = {(-1,): 1}
+    for n_read in range(n_keep):
+        next_layer = {}
+        for states, count in layer.items():
+            next_states = _get_next_deletion_states(
+                tokens, deletable, deletable_after, states, n_read, n_remove
+            )
+            for group in next_states.values():
+                key = tuple(group)
+                next_layer[key] = next_layer.get(key, 0) + count
+        layer = next_layer
+    return sum(layer.values())
+
+
+def _iter_deletion_variants(struct: SequenceStructure, deletable, n_remove):
+    sequence, structure = struct.sequence, struct.structure
+    tokens = [seq + ss for seq, ss in zip(sequence, structure)]
+    for kept in _iter_canonical_deletions(tokens, deletable, n_remove):
+        kept_set = set(kept)
+        name = "_".join(
+            f"{sequence[i]}{i + 1}del"
+            for i in range(len(sequence))
+            if i not in kept_set
+        )
+        yield StructureVariant(
+            name,
+            "".join([sequence[i] for i in kept]),
+            "".join([structure[i] for i in kept]),
+        )
+
+
+def iter_remove_unpaired_nucleotide_sweep(
+    struct: SequenceStructure, n_remove: int, exclude=None
+) -> Iterator[StructureVariant]:
+    """
+    Lazily generates every distinct secondary structure with n unpaired nucleotides
+    removed. Removing any nucleotide of a run of identical nucleotides gives the
+    same result, so each distinct sequence/structure is only generated once. Each
+    variant is named by one set of deletions that produces it.
+    :param struct: a secondary structure
+    :param n_remove: the number of unpaired nucleotides to remove
+    :param exclude: a list of positions to not remove
+    :return: iterator of StructureVariant
+    """
+    deletable = _get_deletable(struct, n_remove, exclude, True)
+    return _iter_deletion_variants(struct, deletable, n_remove)
+
+
+def count_remove_unpaired_nucleotide_sweep(
+    struct: SequenceStructure, n_remove: int, exclude=None
+) -> int:
+    """
+    Returns the number of distinct structures
+    `iter_remove_unpaired_nucleotide_sweep` generates without building them.
+    """
+    deletable = _get_deletable(struct, n_remove, exclude, True)
+    tokens = [seq + ss for seq, ss in zip(struct.sequence, struct.structure)]
+    return _count_canonical_deletions(tokens, deletable, n_remove)
+
+
 def remove_unpaired_nucleotide_sweep(
     struct: SequenceStructure, n_remove: int, exclude=None
 ) -> List[SequenceStructure]:
     """
-    Create a list of secondary structures each with n unpaired nucleotide removed.
+    Create a list of distinct secondary structures each with n unpaired nucleotide
+    removed.
     :param struct: a secondary structure
     :param n_remove: the number of unpaired nucleotides to remove
     """
-    if exclude is None:
-        exclude = []
-    if n_remove < 1:
-        raise ValueError("n_remove must be greater than 0")
-    sequence = list(struct.sequence)
-    structure = list(struct.structure)
-    unpaired = []
-    for i, char in enumerate(structure):
-        if i in exclude:
-            continue
-        if char == ".":
-            unpaired.append(i)
-    if len(unpaired) < n_remove:
-        raise ValueError(
-            "n_remove must be less than the number of unpaired nucleotides"
-        )
-    combos = itertools.combinations(unpaired, n_remove)
-    structs = []
-    for combo in combos:
-        new_seq = sequence[:]
-        new_str = structure[:]
-        for pos in combo:
-            new_seq[pos] = "X"
-            new_str[pos] = "X"
-        new_seq = [x for x in new_seq if x != "X"]
-        new_str = [x for x in new_str if x != "X"]
-        new_struct = SequenceStructure("".join(new_seq), "".join(new_str))
-        structs.append(new_struct)
-    return structs
+    return [
+        SequenceStructure(v.sequence, v.structure)
+        for v in iter_remove_unpaired_nucleotide_sweep(struct, n_remove, exclude)
+    ]
+
+
+def iter_remove_nucleotide_sweep(
+    struct: SequenceStructure, n_remove: int, exclude=None
+) -> Iterator[StructureVariant]:
+    """
+    Lazily generates every distinct secondary structure with n nucleotides removed.
+    :param struct: a secondary structure
+    :param n_remove: the number of nucleotides to remove
+    :param exclude: a list of positions to not remove
+    :return: iterator of StructureVariant
+    """
+    deletable = _get_deletable(struct, n_remove, exclude, False)
+    return _iter_deletion_variants(struct, deletable, n_remove)
+
+
+def count_remove_nucleotide_sweep(
+    struct: SequenceStructure, n_remove: int, exclude=None
+) -> int:
+    """
+    Returns the number of distinct structures `iter_remove_nucleotide_sweep`
+    generates without building them.
+    """
+    deletable = _get_deletable(struct, n_remove, exclude, False)
+    tokens = [seq + ss for seq, ss in zip(struct.sequence, struct.structure)]
+    return _count_canonical_deletions(tokens, deletable, n_remove)
 
 
 def remove_nucleotide_sweep(
-    struct: SequenceStructure, n_remove: int, exclude: None
+    struct: SequenceStructure, n_remove: int, exclude=None
 ) -> List[SequenceStructure]:
     """
-    Create a list of secondary structures each with n nucleotides removed.
+    Create a list of distinct secondary structures each with n nucleotides removed.
     :param struct: a secondary structure
     :param n_remove: the number of nucleotides to remove
     """
-    if exclude is None:
-        exclude = []
-    if n_remove < 1:
-        raise ValueError("n_remove must be greater than 0")
-    sequence = list(struct.sequence)
-    structure = list(struct.structure)
-    nucleotides = []
-    for i, char in enumerate(structure):
-        if i in exclude:
-            continue
-        nucleotides.append(i)
-    if len(nucleotides) < n_remove:
-        raise ValueError("n_remove must be less than the number of nucleotides")
-    combos = itertools.combinations(nucleotides, n_remove)
-    structs = []
-    for combo in combos:
-        new_seq = sequence[:]
-        new_str = structure[:]
-        for pos in combo:
-            new_seq[pos] = "X"
-            new_str[pos] = "X"
-        new_seq = [x for x in new_seq if x != "X"]
-        new_str = [x for x in new_str if x != "X"]
-        new_struct = SequenceStructure("".join(new_seq), "".join(new_str))
-        structs.append(new_struct)
-    return structs
+    return [
+        SequenceStructure(v.sequence, v.structure)
+        for v in iter_remove_nucleotide_sweep(struct, n_remove, exclude)
+    ]
@@ -0,0 +1,316 @@
+import functools
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from typing import Callable, Iterable, Iterator, List, Optional
+
+import yaml
+
+from rna_secstruct_design.batch import chunked, map_chunks
+from rna_secstruct_design.commands import (
+    fold_sequences_chunk,
+    iter_row_mutations,
+    randomize_helices_chunk,
+    replace_chunk,
+)
+from rna_secstruct_design.formats import open_writer
+from rna_secstruct_design.logger import get_logger
+from rna_secstruct_design.progress import BatchMetrics
+from rna_secstruct_design.selection import selection_from_file
+
+# runs helix_rand, replace and mut_scan one after another in a single process.
+# Records stream from stage to stage in chunks: every stage keeps at most
+# 4 x num_processes chunks in flight on the one shared worker pool and only pulls
+# more from the stage before it as its own results are taken, so no stage is ever
+# fully materialized. The workers keep their fold caches between stages.
+#
+#   input: designs.csv              optional if given on the command line
+#   output: final.csv               optional if given on the command line
+#   num_processes: 4
+#   chunk_size: 100
+#   stages:
+#     - type: helix_rand
+#       num_seqs: 10
+#       param_file: helix_params.yml
+#       output: designs.csv         every stage can also write its own results
+#     - type: replace
+#       param_file: replace.yml     or params: with the patterns inline
+#       rejects: rejects.csv
+#     - type: mut_scan
+#       num_muts: 1
+#
+# the work units of mut_scan are chunk_size mutants rather than input rows, the
+# mutants are enumerated here and only folded by the workers.
+
+log = get_logger("PIPELINE")
+
+RESULT_COLUMNS = ["name", "sequence", "structure", "ens_defect"]
+HELIX_RAND_COLUMNS = ["name", "num", "sequence", "structure", "ens_defect"]
+REJECT_COLUMNS = ["name", "reason", "structure"]
+
+
+def helix_rand_stage(
+    rows,
+    params,
+    num_seqs=10,
+    min_distance=0,
+    max_off_target=None,
+    helix_library=None,
+    energy_band=None,
+):
+    """
+    pool work unit of a helix_rand stage
+    :return: result rows, reject rows and `BatchMetrics`
+    """
+    import pandas as pd
+
+    df_results, metrics = randomize_helices_chunk(
+        (pd.DataFrame(rows), None),
+        params,
+        num_seqs,
+        min_distance,
+        max_off_target,
+        helix_library,
+        energy_band,
+    )
+    # the design stats columns are not passed on
+    results = [
+        {c: row[c] for c in HELIX_RAND_COLUMNS} for row in df_results.to_dict("records")
+    ]
+    return results, [], metrics
+
+
+def replace_stage(rows, params):
+    """
+    pool work unit of a replace stage
+    :return: result rows, reject rows and `BatchMetrics`
+    """
+    import pandas as pd
+
+    (df_results, df_rejects), metrics = replace_chunk(
+        (pd.DataFrame(rows), None), params
+    )
+    return df_results.to_dict("records"), df_rejects.to_dict("records"), metrics
+
+
+def mut_scan_units(rows, chunk_size, params, num_muts=1, prefix_names=True):
+    """
+    splits the input rows of a mut_scan stage into work units of chunk_size
+    mutants, so the mutants of a single sequence are folded in parallel
+    :param prefix_names: prefix each mutant name with the name of its row
+    :return: iterator of (list of `Mutation`, number of input rows started in it)
+    """
+    mutations = []
+    num_rows = 0
+    for row in rows:
+        num_rows += 1
+        for mut in iter_row_mutations(row, params, num_muts, prefix_names):
+            mutations.append(mut)
+            if len(mutations) == chunk_size:
+                yield mutations, num_rows
+                mutations, num_rows = [], 0
+    if len(mutations) > 0 or num_rows > 0:
+        yield mutations, num_rows
+
+
+def mut_scan_stage(unit):
+    """
+    pool work unit of a mut_scan stage
+    :param unit: mutants and number of input rows from `mut_scan_units`
+    :return: result rows, reject rows and `BatchMetrics`
+    """
+    mutations, num_rows = unit
+    results, metrics = fold_sequences_chunk((mutations, None))
+    # items counts input rows like the other stages
+    metrics.items = num_rows
+    return results, [], metrics
+
+
+@dataclass(frozen=True)
+class StageType:
+    func: Callable
+    options: List[str]
+    columns: List[str]
+    # reads the param_file of a stage
+    load_params: Callable = selection_from_file
+    # splits the input rows into work units with the params and options of the
+    # stage, chunks of rows if None
+    split: Optional[Callable] = None
+
+
+def _load_yaml(path):
+    with open(path) as f:
+        return yaml.safe_load(f)
+
+
+STAGE_TYPES = {
+    "helix_rand": StageType(
+        helix_rand_stage,
+        [
+            "num_seqs",
+            "min_distance",
+            "max_off_target",
+            "helix_library",
+            "energy_band",
+        ],
+        HELIX_RAND_COLUMNS,
+    ),
+    "replace": StageType(replace_stage, [], RESULT_COLUMNS, _load_yaml),
+    "mut_scan": StageType(
+        mut_scan_stage,
+        ["num_muts", "prefix_names"],
+        RESULT_COLUMNS,
+        split=mut_scan_units,
+    ),
+}
+
+
+@dataclass
+class Stage:
+    """
+    One stage of a pipeline spec and what it did
+    """
+
+    type: str
+    params: dict
+    options: dict
+    output: Optional[str] = None
+    rejects: Optional[str] = None
+    metrics: BatchMetrics = field(default_factory=BatchMetrics)
+    num_results: int = 0
+    num_rejects: int = 0
+
+    @classmethod
+    def from_spec(cls, spec: dict) -> "Stage":
+        spec = dict(spec)
+        stage_type = spec.pop("type", None)
+        if stage_type not in STAGE_TYPES:
+            raise ValueError(
+                f"unknown stage type {stage_type}, must be one of "
+                f"{', '.join(STAGE_TYPES)}"
+            )
+        params = spec.pop("params", None)
+        param_file = spec.pop("param_file", None)
+        if params is not None and param_file is not None:
+            raise ValueError(f"{stage_type}: cannot specify params and param_file")
+        if param_file is not None:
+            params = STAGE_TYPES[stage_type].load_params(param_file)
+        output = spec.pop("output", None)
+        rejects = spec.pop("rejects", None)
+        for key in spec:
+            if key not in STAGE_TYPES[stage_type].options:
+                raise ValueError(f"{stage_type}: unknown option {key}")
+        if "energy_band" in spec:
+            spec["energy_band"] = tuple(spec["energy_band"])
+        return cls(stage_type, params or {}, spec, output, rejects)
+
+    @property
+    def columns(self) -> List[str]:
+        return STAGE_TYPES[self.type].columns
+
+    def add_results(self, result_rows, reject_rows, metrics: BatchMetrics) -> None:
+        """
+        counts the results of one work unit
+        """
+        self.metrics.merge(metrics)
+        self.num_results += len(result_rows)
+        self.num_rejects += len(reject_rows)
+
+    def iter_units(self, rows: Iterable[dict], chunk_size: int) -> Iterator:
+        """
+        the inputs of the work units of the stage, chunks of chunk_size rows or
+        what the split of the stage type makes of them
+        """
+        split = STAGE_TYPES[self.type].split
+        if split is None:
+            return chunked(rows, chunk_size)
+        return split(rows, chunk_size, self.params, **self.options)
+
+    def get_func(self):
+        """
+        the pool work unit of the stage with its parameters bound, it takes the
+        inputs of `iter_units`
+        """
+        stage_type = STAGE_TYPES[self.type]
+        if stage_type.split is not None:
+            # the parameters are used by the split
+            return stage_type.func
+        return functools.partial(stage_type.func, params=self.params, **self.options)
+
+    def __str__(self):
+        rejects = f", {self.num_rejects} rejected" if self.num_rejects else ""
+        return (
+            f"{self.type}: {self.metrics.items} in, {self.num_results} out{rejects}, "
+            f"{self.metrics.folds} folds, "
+            f"{self.metrics.cache_hit_rate:.0%} fold cache hits"
+        )
+
+
+def load_pipeline_spec(path) -> dict:
+    """
+    Reads and checks a pipeline spec
+    :param path: yaml file, see the example at the top of this module
+    :return: dictionary of the spec
+    """
+    spec = _load_yaml(path)
+    if not isinstance(spec, dict) or not spec.get("stages"):
+        raise ValueError(f"{path} must have a list of stages")
+    return spec
+
+
+class Pipeline(object):
+    """
+    Chains the stages of a spec on one worker pool
+    """
+
+    def __init__(self, spec: dict):
+        self.stages = [Stage.from_spec(s) for s in spec["stages"]]
+        self.num_processes = spec.get("num_processes", 1)
+        self.chunk_size = spec.get("chunk_size", 100)
+
+    def run(self, records: Iterable[dict], output, fmt=None) -> int:
+        """
+        Streams records through every stage and writes the results of the last
+        one to output
+        :param records: dictionaries with `name`, `sequence` and `structure`
+        :param output: output file of the last stage
+        :param fmt: output format, from the extension of output if None
+        :return: number of rows written to output
+        """
+        pool = None
+        if self.num_processes > 1:
+            pool = Pool(self.num_processes)
+        try:
+            rows = iter(records)
+            for stage in self.stages:
+                rows = self.__iter_stage(stage, rows, pool)
+            with open_writer(output, self.stages[-1].columns, fmt) as writer:
+                for chunk in chunked(rows, self.chunk_size):
+                    writer.write_rows(chunk)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        for stage in self.stages:
+            log.info(str(stage))
+        return writer.num_rows
+
+    def __iter_stage(self, stage: Stage, rows: Iterator[dict], pool) -> Iterator:
+        units = stage.iter_units(rows, self.chunk_size)
+        results = map_chunks(stage.get_func(), units, self.num_processes, pool)
+        writer = rejects_writer = None
+        try:
+            if stage.output is not None:
+                writer = open_writer(stage.output, stage.columns)
+            if stage.rejects is not None:
+                rejects_writer = open_writer(stage.rejects, REJECT_COLUMNS)
+            for result_rows, reject_rows, metrics in results:
+                stage.add_results(result_rows, reject_rows, metrics)
+                if writer is not None and len(result_rows) > 0:
+                    writer.write_rows(result_rows)
+                if rejects_writer is not None and len(reject_rows) > 0:
+                    rejects_writer.write_rows(reject_rows)
+                yield from result_rows
+        finally:
+            for w in (writer, rejects_writer):
+                if w is not None:
+                    w.close()
@@ -0,0 +1,201 @@
+import cProfile
+import functools
+import json
+import os
+import time
+from contextlib import nullcontext
+from typing import Optional
+
+
+class _Stage(object):
+    """
+    times one run of a stage while the profiler is enabled
+    """
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *args):
+        self.profiler.add_time(self.name, time.perf_counter() - self.start)
+
+
+# returned by every stage while the profiler is disabled, nothing is allocated
+_NULL_STAGE = nullcontext()
+
+
+class Profiler(object):
+    """
+    Accumulates wall time and call counts per named stage plus plain counters.
+    Disabled by default, in which case a stage costs a single attribute check.
+    Each process has its own profiler, pool workers send theirs back with their
+    results through `ProfiledTask`.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.cprofile_file = None
+        self.__stages = {}
+        self.__counters = {}
+
+    def enable(self, cprofile_file=None) -> None:
+        """
+        :param cprofile_file: optional path to write cProfile stats of a single
+        worker process to
+        """
+        global _cprofile, _cprofile_checked
+        self.enabled = True
+        self.cprofile_file = cprofile_file
+        _cprofile, _cprofile_checked = None, False
+        if cprofile_file is not None and os.path.exists(cprofile_file):
+            os.remove(cprofile_file)
+
+    def disable(self) -> None:
+        self.enabled = False
+        self.cprofile_file = None
+
+    def stage(self, name: str):
+        """
+        Context manager that records the time spent inside it as the stage name
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def timed(self, name: str):
+        """
+        Decorator that records every call of a function as the stage name
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Stage(self, name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def add_time(self, name: str, seconds: float, count: int = 1) -> None:
+        stage = self.__stages.setdefault(name, [0.0, 0])
+        stage[0] += seconds
+        stage[1] += count
+
+    def count(self, name: str, num: int = 1) -> None:
+        if self.enabled:
+            self.__counters[name] = self.__counters.get(name, 0) + num
+
+    def get_stats(self) -> dict:
+        return {
+            "stages": {
+                name: {"time": t, "count": c} for name, (t, c) in self.__stages.items()
+            },
+            "counters": dict(self.__counters),
+        }
+
+    def pop_stats(self) -> dict:
+        stats = self.get_stats()
+        self.reset()
+        return stats
+
+    def merge(self, stats: dict) -> None:
+        for name, stage in stats["stages"].items():
+            self.add_time(name, stage["time"], stage["count"])
+        for name, num in stats["counters"].items():
+            self.__counters[name] = self.__counters.get(name, 0) + num
+
+    def reset(self) -> None:
+        self.__stages = {}
+        self.__counters = {}
+
+    def get_report(self, command: str, wall_time: float) -> dict:
+        """
+        Per-stage breakdown sorted by time. Stage times are summed over all
+        processes and stages can be nested, so fractions can add up to more than 1.
+        """
+        stages = {}
+        for name, (t, c) in sorted(self.__stages.items(), key=lambda x: -x[1][0]):
+            stages[name] = {
+                "time": t,
+                "count": c,
+                "mean": t / c if c > 0 else 0.0,
+                "fraction": t / wall_time if wall_time > 0 else 0.0,
+            }
+        return {
+            "command": command,
+            "wall_time": wall_time,
+            "stages": stages,
+            "counters": dict(self.__counters),
+        }
+
+    def write_report(self, path, command: str, wall_time: float) -> None:
+        with open(path, "w") as f:
+            json.dump(self.get_report(command, wall_time), f, indent=2)
+
+
+# one profiler per process
+profiler = Profiler()
+
+# cProfile of this process if it claimed the cProfile output file
+_cprofile = None
+_cprofile_checked = False
+# pid of the worker whose profiler was last cleared by `ProfiledTask`
+_worker_pid = None
+
+
+def _get_cprofile(cprofile_file) -> Optional[cProfile.Profile]:
+    """
+    The first process to create cprofile_file owns it, every other process
+    returns None, so only one worker is profiled
+    """
+    global _cprofile, _cprofile_checked
+    if cprofile_file is None:
+        return None
+    if not _cprofile_checked:
+        _cprofile_checked = True
+        try:
+            os.close(os.open(cprofile_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            _cprofile = cProfile.Profile()
+        except FileExistsError:
+            _cprofile = None
+    return _cprofile
+
+
+class ProfiledTask(object):
+    """
+    Wraps a pool work unit so it runs with the profiler enabled and also returns
+    the stage timings it recorded, which the caller merges into its own profiler
+    """
+
+    def __init__(self, func, cprofile_file=None):
+        self.func = func
+        self.cprofile_file = cprofile_file
+        self.parent_pid = os.getpid()
+
+    def __call__(self, chunk):
+        global _worker_pid
+        pid = os.getpid()
+        if pid != self.parent_pid and pid != _worker_pid:
+            # forked workers start with a copy of the parent's timings
+            _worker_pid = pid
+            profiler.reset()
+        profiler.enabled = True
+        cprof = _get_cprofile(self.cprofile_file)
+        if cprof is not None:
+            cprof.enable()
+        try:
+            result = self.func(chunk)
+        finally:
+            if cprof is not None:
+                cprof.disable()
+                # stats are cumulative, rewrite them after every task
+                cprof.dump_stats(self.cprofile_file)
+        return result, profiler.pop_stats()
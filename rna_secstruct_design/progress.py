@@ -0,0 +1,173 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+
+@dataclass
+class BatchMetrics:
+    """
+    Counters for a chunk of work. Workers fill one in per chunk and return it with
+    their results so the main process can aggregate them.
+    """
+
+    items: int = 0
+    folds: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    rejects: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def cache_hit_rate(self) -> float:
+        lookups = self.cache_hits + self.cache_misses
+        if lookups == 0:
+            return 0.0
+        return self.cache_hits / lookups
+
+    def add_reject(self, reason: str, count: int = 1) -> None:
+        self.rejects[reason] = self.rejects.get(reason, 0) + count
+
+    def merge(self, other: "BatchMetrics") -> None:
+        self.items += other.items
+        self.folds += other.folds
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        for reason, count in other.rejects.items():
+            self.add_reject(reason, count)
+
+
+@contextmanager
+def record_folds(metrics: BatchMetrics, cache):
+    """
+    Adds the folds and cache lookups made by cache inside the block to metrics
+    :param metrics: metrics to update
+    :param cache: `FoldCache` used inside the block
+    """
+    hits, misses = cache.hits, cache.misses
+    try:
+        yield metrics
+    finally:
+        metrics.cache_hits += cache.hits - hits
+        metrics.cache_misses += cache.misses - misses
+        metrics.folds += cache.misses - misses
+
+
+def format_time(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "--:--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressReporter(object):
+    """
+    Aggregates `BatchMetrics` from every chunk of a batch command and reports
+    items done/total, folds per second, ETA, cache hit rate and rejections. The
+    status line goes to stderr and, if a metrics file is given, is also written as
+    JSON lines every `metrics_interval` seconds. total is None when the input is
+    streamed and its length is not known up front.
+    """
+
+    def __init__(
+        self,
+        total: Optional[int],
+        name: str = "",
+        show: bool = True,
+        metrics_file=None,
+        metrics_interval: float = 10.0,
+        stream=None,
+    ):
+        self.total = total
+        self.name = name
+        self.show = show
+        self.metrics = BatchMetrics()
+        self.metrics_interval = metrics_interval
+        self.__stream = stream if stream is not None else sys.stderr
+        self.__is_tty = hasattr(self.__stream, "isatty") and self.__stream.isatty()
+        # redraw in place on a terminal, otherwise do not flood log files
+        self.__show_interval = 0.5 if self.__is_tty else 30.0
+        self.__metrics_f = None
+        if metrics_file is not None:
+            self.__metrics_f = open(metrics_file, "w")
+        self.__start = time.perf_counter()
+        self.__last_show = self.__start
+        self.__last_metrics = self.__start
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_status(self) -> dict:
+        elapsed = time.perf_counter() - self.__start
+        done = self.metrics.items
+        eta = None
+        if self.total is not None and 0 < done and elapsed > 0:
+            eta = max(self.total - done, 0) * elapsed / done
+        return {
+            "command": self.name,
+            "time": time.time(),
+            "elapsed": elapsed,
+            "done": done,
+            "total": self.total,
+            "folds": self.metrics.folds,
+            "folds_per_sec": self.metrics.folds / elapsed if elapsed > 0 else 0.0,
+            "eta": eta,
+            "cache_hit_rate": self.metrics.cache_hit_rate,
+            "rejects": dict(self.metrics.rejects),
+        }
+
+    def format_status(self, status: dict) -> str:
+        if status["total"] is None:
+            done = f"{status['done']} done"
+        else:
+            percent = 0.0
+            if status["total"] > 0:
+                percent = 100 * status["done"] / status["total"]
+            done = f"{status['done']}/{status['total']} ({percent:.1f}%)"
+        line = (
+            f"{self.name}: {done} "
+            f"{status['folds_per_sec']:.1f} folds/s "
+            f"ETA {format_time(status['eta'])} "
+            f"cache hits {status['cache_hit_rate'] * 100:.1f}%"
+        )
+        if len(status["rejects"]) > 0:
+            rejects = ", ".join(f"{k}={v}" for k, v in status["rejects"].items())
+            line += f" rejected {rejects}"
+        return line
+
+    def update(self, metrics: BatchMetrics) -> None:
+        self.metrics.merge(metrics)
+        now = time.perf_counter()
+        if self.show and now - self.__last_show >= self.__show_interval:
+            self.__last_show = now
+            self.__render(self.get_status())
+        if self.__metrics_f and now - self.__last_metrics >= self.metrics_interval:
+            self.__last_metrics = now
+            self.__write_metrics(self.get_status())
+
+    def close(self) -> None:
+        status = self.get_status()
+        if self.show:
+            self.__render(status)
+            if self.__is_tty:
+                self.__stream.write("\n")
+                self.__stream.flush()
+        if self.__metrics_f:
+            self.__write_metrics(status)
+            self.__metrics_f.close()
+            self.__metrics_f = None
+
+    def __render(self, status: dict) -> None:
+        if self.__is_tty:
+            self.__stream.write("\r\033[K" + self.format_status(status))
+        else:
+            self.__stream.write(self.format_status(status) + "\n")
+        self.__stream.flush()
+
+    def __write_metrics(self, status: dict) -> None:
+        self.__metrics_f.write(json.dumps(status) + "\n")
+        self.__metrics_f.flush()
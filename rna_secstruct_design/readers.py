@@ -0,0 +1,194 @@
+import bz2
+import csv
+import gzip
+import io
+import itertools
+import sys
+from typing import Iterable, Iterator, Optional
+
+from rna_secstruct_design.formats import get_format, _import_pyarrow
+
+# streaming readers for design inputs. Records are yielded one at a time as
+# dictionaries with `name`, `sequence` and `structure` so a library never has to
+# fit in memory, and "-" reads from stdin so inputs can be piped in
+
+STDIN = "-"
+
+STRUCTURE_CHARACTERS = set("().[]{}<>&")
+
+
+def open_text(path):
+    """
+    Opens path for reading text, gzip and bz2 files are decompressed on the fly
+    and "-" is stdin
+    """
+    if path == STDIN:
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt")
+    return open(path)
+
+
+def get_input_format(path) -> str:
+    """
+    Returns the format of an input file from its extension, ignoring a gzip or bz2
+    extension: one of `FORMATS`. stdin is None as it has to be sniffed
+    """
+    if path == STDIN:
+        return None
+    return get_format(path)
+
+
+def is_structure(line: str) -> bool:
+    return len(line) > 0 and set(line) <= STRUCTURE_CHARACTERS
+
+
+def iter_fasta_records(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    Parses FASTA records with an optional dot-bracket structure after the sequence
+    as written by RNAfold. Sequences and structures can span several lines and
+    anything after the structure, such as the free energy, is ignored. T is read
+    as U.
+
+        >name
+        GGAAAC
+        (....) ( -1.20)
+
+    :param lines: lines of text
+    :return: dictionaries with `name`, `sequence` and `structure`, structure is
+    None if the record has none
+    """
+    name, seq, struct = None, [], []
+    for line in lines:
+        line = line.strip()
+        if len(line) == 0 or line.startswith(";"):
+            continue
+        if line.startswith(">"):
+            if name is not None:
+                yield _get_fasta_record(name, seq, struct)
+            name, seq, struct = line[1:].strip(), [], []
+            continue
+        if name is None:
+            raise ValueError(f"fasta line before the first header: {line}")
+        token = line.split()[0]
+        if is_structure(token):
+            struct.append(token)
+        elif len(struct) > 0:
+            raise ValueError(f"sequence after the structure in record {name}")
+        else:
+            seq.append(token)
+    if name is not None:
+        yield _get_fasta_record(name, seq, struct)
+
+
+def _get_fasta_record(name: str, seq: list, struct: list) -> dict:
+    sequence = "".join(seq).upper().replace("T", "U")
+    structure = None
+    if len(struct) > 0:
+        structure = "".join(struct)
+        if len(structure) != len(sequence):
+            raise ValueError(
+                f"sequence and structure of record {name} have different lengths"
+            )
+    return {"name": name, "sequence": sequence, "structure": structure}
+
+
+def iter_csv_records(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    Parses csv rows, which need a `sequence` and a `structure` column
+    """
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None:
+        return
+    if "sequence" not in reader.fieldnames:
+        raise ValueError("sequence column not found")
+    if "structure" not in reader.fieldnames:
+        raise ValueError("structure column not found")
+    yield from reader
+
+
+def iter_table_records(path, fmt: str, batch_size: int = 10000) -> Iterator[dict]:
+    """
+    Reads a parquet or arrow file one batch at a time
+    """
+    _import_pyarrow()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        batches = pq.ParquetFile(path).iter_batches(batch_size=batch_size)
+    else:
+        import pyarrow.ipc as ipc
+
+        f = ipc.open_file(path)
+        batches = (f.get_batch(i) for i in range(f.num_record_batches))
+    for batch in batches:
+        if "sequence" not in batch.schema.names:
+            raise ValueError("sequence column not found")
+        if "structure" not in batch.schema.names:
+            raise ValueError("structure column not found")
+        yield from batch.to_pylist()
+
+
+def iter_records(path, fmt: Optional[str] = None) -> Iterator[dict]:
+    """
+    Lazily reads design inputs from any of the `FORMATS`. csv, fasta and delta
+    files can be gzip or bz2 compressed and "-" reads from stdin, in which case
+    the format is fasta if the first line starts with ">" and csv otherwise. Rows
+    without a name are named `seq_<index>`.
+    :param path: input file or "-"
+    :param fmt: one of `FORMATS`, from the extension if None
+    :return: dictionaries with at least `name`, `sequence` and `structure`
+    """
+    if fmt is None:
+        fmt = get_input_format(path)
+    if fmt in ["parquet", "arrow"]:
+        records = iter_table_records(path, fmt)
+    elif fmt == "rlib":
+        records = _iter_store_records(path)
+    elif fmt == "delta":
+        records = _iter_delta_records(path)
+    else:
+        records = _iter_text_records(path, fmt)
+    for i, record in enumerate(records):
+        if not record.get("name"):
+            record["name"] = f"seq_{i}"
+        yield record
+
+
+def _iter_store_records(path) -> Iterator[dict]:
+    from rna_secstruct_design.store import RlibStore
+
+    with RlibStore(path) as store:
+        yield from store.iter_records()
+
+
+def _iter_delta_records(path) -> Iterator[dict]:
+    from rna_secstruct_design.delta import DeltaReader
+
+    with DeltaReader(path) as reader:
+        yield from reader
+
+
+def _iter_text_records(path, fmt: Optional[str]) -> Iterator[dict]:
+    f = open_text(path)
+    try:
+        lines = iter(f)
+        if fmt is None:
+            first = list(itertools.islice(lines, 1))
+            fmt = "fasta" if first and first[0].startswith(">") else "csv"
+            lines = itertools.chain(first, lines)
+        if fmt == "fasta":
+            yield from iter_fasta_records(lines)
+        elif fmt == "csv":
+            yield from iter_csv_records(lines)
+        else:
+            raise ValueError(f"cannot read {fmt} from {path}")
+    finally:
+        if path == STDIN:
+            # leave stdin itself open
+            f.detach()
+        else:
+            f.close()
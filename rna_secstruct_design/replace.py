@@ -1,6 +1,13 @@
+import itertools
+import re
+from collections import deque
+from typing import Dict, List, Tuple
+
 from seq_tools.structure import SequenceStructure
 from seq_tools.structure import find as find_structure
 
+from rna_secstruct_design.util import get_pair_table
+
 
 def replace_seq_structures(org_seq_struct, sub_seq_struct, new_seq_struct):
     def replace_substrings(s, bounds, replacements):
@@ -29,3 +36,203 @@ def replace_gaaa_w_uucg(seq_struct):
     sub_seq_struct = SequenceStructure("GGAAAC", "(....)")
     new_seq_struct = SequenceStructure("CUUCGG", "(....)")
     return replace_seq_structures(seq_struct, sub_seq_struct, new_seq_struct)
+
+
+# multi-pattern search and replace ###################################################
+
+
+def _get_wildcard_regex(seq: str, ss: str):
+    """
+    regex of a strand over the tokens of `MultiPatternReplacer`, `N` matches any
+    nucleotide. The lookahead finds overlapping matches.
+    """
+    tokens = [
+        ("[^&]" if c == "N" else re.escape(c)) + re.escape(s) for c, s in zip(seq, ss)
+    ]
+    return re.compile("(?=" + "".join(tokens) + ")")
+
+
+class MultiPatternReplacer(object):
+    """
+    Compiles a set of sequence/structure search and replace patterns once and finds
+    all of them in a single pass over each sequence/structure with an Aho-Corasick
+    automaton. Each position is a token of its nucleotide and its dot-bracket
+    character, so a pattern only matches where both agree. Patterns with `&` are
+    split into strands, each strand is searched for on its own, and strand hits are
+    combined into a match only if they are in order and basepair with each other
+    the same way they do in the pattern. `N` in a pattern sequence matches any
+    nucleotide, strands with `N` are searched with a regex instead of the automaton.
+
+    :param params: dictionary of patterns as used by the `replace` command, each
+    entry needs `sequence`, `structure`, `r_sequence` and `r_structure`
+    """
+
+    def __init__(self, params: Dict[str, Dict[str, str]]):
+        self.names = []
+        self.strands = []
+        self.replacements = []
+        self.pairs = []
+        for name, param in params.items():
+            strands = list(
+                zip(param["sequence"].split("&"), param["structure"].split("&"))
+            )
+            r_strands = list(
+                zip(param["r_sequence"].split("&"), param["r_structure"].split("&"))
+            )
+            if len(strands) != len(r_strands):
+                raise ValueError(
+                    f"pattern {name} has {len(strands)} strands but its replacement "
+                    f"has {len(r_strands)}"
+                )
+            for seq, ss in strands + r_strands:
+                if len(seq) != len(ss):
+                    raise ValueError(
+                        f"pattern {name} sequence and structure are different lengths"
+                    )
+            pattern_ss = "".join([ss for _, ss in strands])
+            pairs = get_pair_table(pattern_ss)
+            self.names.append(name)
+            self.strands.append(strands)
+            self.replacements.append(r_strands)
+            self.pairs.append([(i, j) for i, j in enumerate(pairs) if j > i])
+        self.__build_automaton()
+
+    def __build_automaton(self):
+        # goto transitions, failure links and outputs for each state
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        # strands with wildcards as (pattern, strand, length, regex)
+        self.wildcards = []
+        for p_i, strands in enumerate(self.strands):
+            for s_i, (seq, ss) in enumerate(strands):
+                if len(seq) == 0:
+                    raise ValueError(f"pattern {self.names[p_i]} has an empty strand")
+                if "N" in seq:
+                    regex = _get_wildcard_regex(seq, ss)
+                    self.wildcards.append((p_i, s_i, len(seq), regex))
+                    continue
+                state = 0
+                for token in zip(seq, ss):
+                    token = token[0] + token[1]
+                    if token not in self.goto[state]:
+                        self.goto.append({})
+                        self.fail.append(0)
+                        self.out.append([])
+                        self.goto[state][token] = len(self.goto) - 1
+                    state = self.goto[state][token]
+                self.out[state].append((p_i, s_i, len(seq)))
+        queue = deque(self.goto[0].values())
+        while len(queue) > 0:
+            state = queue.popleft()
+            for token, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail != 0 and token not in self.goto[fail]:
+                    fail = self.fail[fail]
+                fail = self.goto[fail].get(token, 0)
+                self.fail[next_state] = fail
+                self.out[next_state] = self.out[next_state] + self.out[fail]
+
+    def __find_strands(self, sequence, structure):
+        """
+        returns the start and end of every strand hit for every pattern
+        """
+        hits = [[[] for _ in strands] for strands in self.strands]
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        tokens = list(map(str.__add__, sequence, structure))
+        for i, token in enumerate(tokens):
+            while state != 0 and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for p_i, s_i, length in out[state]:
+                hits[p_i][s_i].append((i + 1 - length, i + 1))
+        if len(self.wildcards) > 0:
+            tokens = "".join(tokens)
+            for p_i, s_i, length, regex in self.wildcards:
+                for m in regex.finditer(tokens):
+                    # tokens are two characters, skip matches that straddle them
+                    if m.start() % 2 == 0:
+                        start = m.start() // 2
+                        hits[p_i][s_i].append((start, start + length))
+        return hits
+
+    def __is_consistent(self, p_i, bounds, pair_table):
+        """
+        checks that the strand hits basepair the same way as in the pattern
+        """
+        positions = []
+        for start, end in bounds:
+            positions.extend(range(start, end))
+        for i, j in self.pairs[p_i]:
+            if pair_table[positions[i]] != positions[j]:
+                return False
+        return True
+
+    def find(self, sequence: str, structure: str) -> Dict[str, List[List[Tuple]]]:
+        """
+        Finds every match of every pattern in a single pass.
+        :param sequence: sequence to search, strands separated by `&`
+        :param structure: dot-bracket structure to search
+        :return: dictionary of pattern name to a list of matches, each match is a
+        list of (start, end) bounds, one per strand of the pattern
+        """
+        if len(sequence) != len(structure):
+            raise ValueError("sequence and structure are different lengths")
+        hits = self.__find_strands(sequence, structure)
+        pair_table = None
+        matches = {}
+        for p_i, name in enumerate(self.names):
+            if len(hits[p_i]) == 1:
+                matches[name] = [[b] for b in hits[p_i][0]]
+                continue
+            matches[name] = []
+            if any(len(h) == 0 for h in hits[p_i]):
+                continue
+            if pair_table is None:
+                pair_table = get_pair_table(structure)
+            for bounds in itertools.product(*hits[p_i]):
+                in_order = all(
+                    bounds[k][1] <= bounds[k + 1][0] for k in range(len(bounds) - 1)
+                )
+                if not in_order:
+                    continue
+                if self.__is_consistent(p_i, bounds, pair_table):
+                    matches[name].append(list(bounds))
+        return matches
+
+    def replace(self, sequence: str, structure: str) -> SequenceStructure:
+        """
+        Replaces every pattern in a sequence/structure at the same time. Each
+        pattern must be found exactly once and matches cannot overlap.
+        :param sequence: sequence to search, strands separated by `&`
+        :param structure: dot-bracket structure to search
+        :return: new SequenceStructure with all replacements applied
+        """
+        matches = self.find(sequence, structure)
+        edits = []
+        for p_i, name in enumerate(self.names):
+            if len(matches[name]) == 0:
+                raise ValueError(
+                    f"cannot find substructure {name} in original sequence/structure"
+                )
+            elif len(matches[name]) > 1:
+                raise ValueError(
+                    f"found multiple substructures {name} in original "
+                    f"sequence/structure"
+                )
+            for (start, end), r_strand in zip(matches[name][0], self.replacements[p_i]):
+                edits.append((start, end, r_strand[0], r_strand[1]))
+        edits.sort()
+        seqs, sss = [], []
+        prev_pos = 0
+        for start, end, r_seq, r_ss in edits:
+            if start < prev_pos:
+                raise ValueError("substructures to replace overlap")
+            seqs.extend([sequence[prev_pos:start], r_seq])
+            sss.extend([structure[prev_pos:start], r_ss])
+            prev_pos = end
+        seqs.append(sequence[prev_pos:])
+        sss.append(structure[prev_pos:])
+        return SequenceStructure("".join(seqs), "".join(sss))
@@ -2,6 +2,7 @@ import yaml
 from seq_tools.structure import SequenceStructure, find
 from rna_secstruct.secstruct import SecStruct, MotifSearchParams
 from rna_secstruct_design.util import str_to_range
+from rna_secstruct_design.profiler import profiler
 
 
 def flatten(l):
@@ -21,6 +22,7 @@ def selection_from_file(filename):
     return selection
 
 
+@profiler.timed("selection")
 def get_selection(secstruct, params):
     pos = []
     for k, v in params.items():
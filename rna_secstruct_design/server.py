@@ -0,0 +1,374 @@
+import asyncio
+import json
+import math
+import os
+from collections import deque
+from dataclasses import asdict
+from multiprocessing import Pool
+from typing import AsyncIterator, List, Optional
+
+from rna_secstruct_design.batch import apply_async
+from rna_secstruct_design.commands import get_input_rows
+from rna_secstruct_design.logger import get_logger
+from rna_secstruct_design.pipeline import Stage
+
+# a local design service that keeps its worker pool, and with it the fold caches,
+# parsed structures of the workers, warm between requests.
+# Clients talk to it in json lines over a unix socket or a localhost port. A
+# request is a pipeline stage with its input:
+#
+#   {"id": 1, "type": "mut_scan", "seq": "GGAAC...", "struct": "((..", "num_muts": 1}
+#   {"id": 2, "type": "helix_rand", "records": [{"name": ..., "sequence": ...,
+#    "structure": ...}], "params": {...}, "num_seqs": 10}
+#
+# results are streamed back as they finish, one line per work unit in order, then
+# a final line with the stats of the request:
+#
+#   {"id": 1, "rows": [...], "rejects": [...]}
+#   {"id": 1, "done": true, "num_rows": 48, "num_rejects": 0, "metrics": {...}}
+#   {"id": 1, "error": "..."}      if the request fails
+#
+# when more work units are queued than there are workers, units of different
+# requests are sent to a worker together, up to batch_size, so small requests
+# share one round trip to the pool. Units of the same request are never batched,
+# they would run one after another on a single worker.
+
+log = get_logger("SERVER")
+
+DEFAULT_PORT = 8765
+# requests lines can carry many records
+MAX_LINE_SIZE = 1 << 24
+REQUEST_KEYS = ["id", "seq", "struct", "records"]
+# stage keys a client cannot send, they name files on the server
+FILE_KEYS = ["output", "rejects", "param_file", "helix_library"]
+
+
+def run_units(units):
+    """
+    pool work unit of the server: several stage work units run one after another
+    :param units: list of (stage work unit, rows)
+    :return: (result, None) or (None, error message) of every unit
+    """
+    results = []
+    for func, rows in units:
+        try:
+            results.append((func(rows), None))
+        except Exception as e:
+            results.append((None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def parse_request(request: dict) -> Stage:
+    """
+    the stage of a request, everything but its input and id. Parameters are
+    only accepted inline as params, the server does not read files for clients
+    """
+    if not isinstance(request, dict):
+        raise ValueError("request must be a json object")
+    spec = {k: v for k, v in request.items() if k not in REQUEST_KEYS}
+    for key in FILE_KEYS:
+        if key in spec:
+            raise ValueError(f"{key} is not supported by the server")
+    return Stage.from_spec(spec)
+
+
+class DesignServer(object):
+    """
+    Serves design requests on a warm worker pool
+    """
+
+    def __init__(
+        self,
+        num_processes: int = 1,
+        chunk_size: int = 100,
+        batch_size: int = 8,
+        max_requests: int = 16,
+        max_rows: int = 10000,
+    ):
+        """
+        :param num_processes: number of worker processes
+        :param chunk_size: input rows per work unit, mutants for mut_scan
+        :param batch_size: max work units sent to a worker at once
+        :param max_requests: requests run at the same time, others wait
+        :param max_rows: max input rows of a request
+        """
+        self.num_processes = max(1, num_processes)
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.max_requests = max_requests
+        self.max_rows = max_rows
+        self.num_requests = 0
+        self.num_batches = 0
+        self.pool = None
+        self.__queue = None
+        # queued units taken off the queue but not sent yet
+        self.__backlog = deque()
+        self.__requests = None
+        self.__batches = None
+        self.__dispatcher = None
+        self.__running = set()
+        self.__server = None
+
+    async def start(self) -> None:
+        """
+        starts the worker pool and the batch dispatcher
+        """
+        if self.pool is not None:
+            return
+        self.pool = Pool(self.num_processes)
+        self.__queue = asyncio.Queue()
+        self.__requests = asyncio.Semaphore(self.max_requests)
+        # batches in flight, enough to keep every worker busy
+        self.__batches = asyncio.Semaphore(self.num_processes * 2)
+        self.__dispatcher = asyncio.create_task(self.__dispatch())
+
+    async def close(self) -> None:
+        """
+        stops listening and shuts down the worker pool
+        """
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+        if self.__dispatcher is not None:
+            self.__dispatcher.cancel()
+            try:
+                await self.__dispatcher
+            except asyncio.CancelledError:
+                pass
+            self.__dispatcher = None
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    async def __aenter__(self) -> "DesignServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def listen(
+        self,
+        socket_path: Optional[str] = None,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+    ) -> None:
+        """
+        accepts connections on a unix socket if socket_path is given, otherwise
+        on host and port
+        """
+        await self.start()
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self.__server = await asyncio.start_unix_server(
+                self.__handle_connection, socket_path, limit=MAX_LINE_SIZE
+            )
+            log.info(f"listening on {socket_path}")
+        else:
+            self.__server = await asyncio.start_server(
+                self.__handle_connection, host, port, limit=MAX_LINE_SIZE
+            )
+            log.info(f"listening on {host}:{port}")
+
+    async def serve_forever(self, **kwargs) -> None:
+        """
+        listens, see `listen`, until cancelled
+        """
+        await self.listen(**kwargs)
+        try:
+            await self.__server.serve_forever()
+        finally:
+            await self.close()
+
+    async def handle_request(self, request: dict) -> AsyncIterator[dict]:
+        """
+        Runs a request and yields its response messages, see the top of this
+        module. Errors are yielded as messages and not raised.
+        """
+        request_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            stage = parse_request(request)
+        except Exception as e:
+            yield {"id": request_id, "error": str(e)}
+            return
+        pending = deque()
+        # the mutants of a single sequence can make many units, only a few per
+        # worker are queued at a time
+        max_pending = self.num_processes * 4
+        async with self.__requests:
+            self.num_requests += 1
+            try:
+                rows = await self.__get_rows(request)
+                func = stage.get_func()
+                for unit in stage.iter_units(rows, self.chunk_size):
+                    pending.append(self.__submit(stage, func, unit))
+                    if len(pending) >= max_pending:
+                        yield await self.__get_message(stage, request_id, pending)
+                while len(pending) > 0:
+                    yield await self.__get_message(stage, request_id, pending)
+            except Exception as e:
+                for future in pending:
+                    future.cancel()
+                yield {"id": request_id, "error": str(e)}
+                return
+        yield {
+            "id": request_id,
+            "done": True,
+            "num_rows": stage.num_results,
+            "num_rejects": stage.num_rejects,
+            "metrics": asdict(stage.metrics),
+        }
+
+    async def __get_message(self, stage: Stage, request_id, pending) -> dict:
+        """
+        waits for the oldest pending unit of a request and counts its results
+        """
+        result_rows, reject_rows, metrics = await pending.popleft()
+        stage.add_results(result_rows, reject_rows, metrics)
+        return {"id": request_id, "rows": result_rows, "rejects": reject_rows}
+
+    async def __get_rows(self, request: dict) -> List[dict]:
+        records = request.get("records")
+        seq = request.get("seq")
+        if (records is None) == (seq is None):
+            raise ValueError("request needs one of seq or records")
+        if records is not None:
+            if len(records) > self.max_rows:
+                raise ValueError(f"more than {self.max_rows} records")
+            return records
+        if request.get("struct") is None:
+            # folding the structure is left to a worker to keep the loop free
+            return await apply_async(self.pool, get_input_rows, seq, None, None)
+        return get_input_rows(seq, request["struct"], None)
+
+    def __submit(self, stage: Stage, func, rows) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        # the stage tells the units of a request apart from those of others
+        self.__queue.put_nowait((stage, func, rows, future))
+        return future
+
+    async def __dispatch(self) -> None:
+        """
+        sends the queued work units to the pool in batches
+        """
+        while True:
+            # waiting for a free slot first lets the backlog build up while the
+            # workers are busy
+            await self.__batches.acquire()
+            try:
+                units = await self.__next_batch()
+            except BaseException:
+                self.__batches.release()
+                raise
+            if len(units) == 0:
+                self.__batches.release()
+                continue
+            self.num_batches += 1
+            task = asyncio.create_task(self.__run_batch(units))
+            self.__running.add(task)
+            task.add_done_callback(self.__running.discard)
+
+    async def __next_batch(self) -> list:
+        """
+        the next work units to send to a worker together, at most one per request
+        and ceil(queued units / num_processes), so units are only batched when
+        every worker has some already
+        """
+        if len(self.__backlog) == 0:
+            self.__backlog.append(await self.__queue.get())
+        while not self.__queue.empty():
+            self.__backlog.append(self.__queue.get_nowait())
+        # units of requests that failed or were cancelled
+        self.__backlog = deque(u for u in self.__backlog if not u[3].done())
+        max_units = min(
+            self.batch_size, math.ceil(len(self.__backlog) / self.num_processes)
+        )
+        units = []
+        skipped = []
+        stages = set()
+        # only look a few units ahead for other requests, a large request can
+        # queue thousands of units
+        max_skipped = max_units * self.num_processes
+        while (
+            len(self.__backlog) > 0
+            and len(units) < max_units
+            and len(skipped) < max_skipped
+        ):
+            unit = self.__backlog.popleft()
+            if id(unit[0]) in stages:
+                skipped.append(unit)
+                continue
+            stages.add(id(unit[0]))
+            units.append(unit)
+        self.__backlog.extendleft(reversed(skipped))
+        return units
+
+    async def __run_batch(self, units) -> None:
+        try:
+            results = await apply_async(
+                self.pool, run_units, [(f, rows) for _, f, rows, _ in units]
+            )
+        except Exception as e:
+            results = [(None, str(e))] * len(units)
+        finally:
+            self.__batches.release()
+        for (_, _, _, future), (result, error) in zip(units, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(ValueError(error))
+            else:
+                future.set_result(result)
+
+    async def __handle_connection(self, reader, writer) -> None:
+        """
+        answers the requests of one client, one json object per line. Requests
+        of a connection run concurrently and their responses are interleaved,
+        clients match them by id.
+        """
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def send(message):
+            async with lock:
+                writer.write(json.dumps(message).encode() + b"\n")
+                await writer.drain()
+
+        async def respond(request):
+            async for message in self.handle_request(request):
+                await send(message)
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # the rest of the line is still coming, the stream cannot be
+                    # read in sync again
+                    await send(
+                        {"id": None, "error": f"request over {MAX_LINE_SIZE} bytes"}
+                    )
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    await send({"id": None, "error": f"invalid json: {e}"})
+                    continue
+                task = asyncio.create_task(respond(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
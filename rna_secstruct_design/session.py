@@ -0,0 +1,257 @@
+import asyncio
+from multiprocessing import Pool
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Union
+
+from rna_secstruct_design.batch import (
+    apply_async,
+    imap_bounded,
+    imap_unordered_bounded,
+)
+from rna_secstruct_design.commands import get_input_rows
+from rna_secstruct_design.folding import get_fold_backend, set_fold_backend
+from rna_secstruct_design.pipeline import Stage
+from rna_secstruct_design.progress import BatchMetrics
+
+# library api to the helix_rand, replace and mut_scan work units. A session owns
+# one worker pool, so the fold caches, parsed structures and helix libraries of
+# the workers stay warm across calls, and yields result rows as they finish:
+#
+#   with DesignSession(num_processes=4) as session:
+#       for row in session.iter_mut_scan("GGGAUCGAAAGAUCCC"):
+#           ...
+#       designs = list(session.iter_helix_designs(records, num_seqs=10))
+#
+# every iter_ method has an async twin, aiter_, that awaits the pool instead of
+# blocking the event loop.
+
+Records = Union[str, Iterable[dict]]
+
+
+def _init_worker(backend) -> None:
+    set_fold_backend(backend)
+
+
+class DesignSession(object):
+    """
+    Runs design work units on a pool owned for the life of the session
+    """
+
+    def __init__(self, num_processes: int = 1, chunk_size: int = 10, fold_backend=None):
+        """
+        :param num_processes: number of worker processes, work runs in this
+        process if 1
+        :param chunk_size: input rows per work unit, mutants for mut_scan
+        :param fold_backend: optional backend for every fold of the session, see
+        `set_fold_backend`
+        """
+        self.num_processes = num_processes
+        self.chunk_size = chunk_size
+        self.fold_backend = fold_backend
+        self.metrics = BatchMetrics()
+        self.pool = None
+        self.__old_backend = None
+        self.__open = False
+
+    def open(self) -> "DesignSession":
+        """
+        starts the worker pool and sets the fold backend
+        """
+        if self.__open:
+            return self
+        if self.fold_backend is not None:
+            self.__old_backend = get_fold_backend()
+            set_fold_backend(self.fold_backend)
+        if self.num_processes > 1:
+            self.pool = Pool(self.num_processes, _init_worker, (get_fold_backend(),))
+        self.__open = True
+        return self
+
+    def close(self) -> None:
+        """
+        shuts down the worker pool and restores the fold backend
+        """
+        if not self.__open:
+            return
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.fold_backend is not None:
+            set_fold_backend(self.__old_backend)
+        self.__open = False
+
+    def __enter__(self) -> "DesignSession":
+        return self.open()
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "DesignSession":
+        return self.open()
+
+    async def __aexit__(self, *args) -> None:
+        self.close()
+
+    def iter_mut_scan(
+        self,
+        records: Records,
+        params: Optional[dict] = None,
+        num_muts: int = 1,
+        ordered: bool = True,
+    ) -> Iterator[dict]:
+        """
+        Folds every mutant of records
+        :param records: dictionaries with `name`, `sequence` and `structure`, or a
+        single sequence whose mutants keep their own names
+        :param params: selection parameters of positions to exclude from mutation
+        :param num_muts: number of mutations per mutant
+        :param ordered: yield in input order, otherwise as work units finish
+        :return: rows with `name`, `sequence`, `structure` and `ens_defect`
+        """
+        stage = self.__get_mut_scan_stage(records, params, num_muts)
+        return self.__iter_stage(stage, records, ordered)
+
+    def iter_helix_designs(
+        self,
+        records: Records,
+        params: Optional[dict] = None,
+        num_seqs: int = 10,
+        ordered: bool = True,
+        **options,
+    ) -> Iterator[dict]:
+        """
+        Designs new helix sequences for every record
+        :param records: dictionaries with `name`, `sequence` and `structure`, or a
+        single sequence
+        :param params: selection parameters of positions to keep
+        :param num_seqs: number of designs per record
+        :param ordered: yield in input order, otherwise as work units finish
+        :param options: other options of the helix_rand pipeline stage, such as
+        min_distance or helix_library
+        :return: rows with `name`, `num`, `sequence`, `structure` and `ens_defect`
+        """
+        stage = self.__get_stage("helix_rand", params, num_seqs=num_seqs, **options)
+        return self.__iter_stage(stage, records, ordered)
+
+    def iter_replace(
+        self,
+        records: Records,
+        params: dict,
+        ordered: bool = True,
+        rejects: Optional[List[dict]] = None,
+    ) -> Iterator[dict]:
+        """
+        Replaces the sequence and structure patterns of params in every record
+        :param records: dictionaries with `name`, `sequence` and `structure`, or a
+        single sequence
+        :param params: replace patterns as in the param file of replace
+        :param ordered: yield in input order, otherwise as work units finish
+        :param rejects: optional list the rejected records are appended to
+        :return: rows with `name`, `sequence`, `structure` and `ens_defect`
+        """
+        stage = self.__get_stage("replace", params)
+        return self.__iter_stage(stage, records, ordered, rejects)
+
+    def aiter_mut_scan(
+        self, records: Records, params: Optional[dict] = None, num_muts: int = 1
+    ) -> AsyncIterator[dict]:
+        """
+        `iter_mut_scan` for asyncio, rows are yielded in input order
+        """
+        stage = self.__get_mut_scan_stage(records, params, num_muts)
+        return self.__aiter_stage(stage, records)
+
+    def aiter_helix_designs(
+        self,
+        records: Records,
+        params: Optional[dict] = None,
+        num_seqs: int = 10,
+        **options,
+    ) -> AsyncIterator[dict]:
+        """
+        `iter_helix_designs` for asyncio, rows are yielded in input order
+        """
+        stage = self.__get_stage("helix_rand", params, num_seqs=num_seqs, **options)
+        return self.__aiter_stage(stage, records)
+
+    def aiter_replace(
+        self, records: Records, params: dict, rejects: Optional[List[dict]] = None
+    ) -> AsyncIterator[dict]:
+        """
+        `iter_replace` for asyncio, rows are yielded in input order
+        """
+        stage = self.__get_stage("replace", params)
+        return self.__aiter_stage(stage, records, rejects)
+
+    def __get_stage(self, stage_type: str, params, **options) -> Stage:
+        return Stage.from_spec({"type": stage_type, "params": params, **options})
+
+    def __get_mut_scan_stage(self, records, params, num_muts) -> Stage:
+        # like the mut_scan command a single sequence keeps unprefixed names
+        prefix_names = not isinstance(records, str)
+        return self.__get_stage(
+            "mut_scan", params, num_muts=num_muts, prefix_names=prefix_names
+        )
+
+    def __get_rows(self, records: Records) -> Iterable[dict]:
+        if isinstance(records, str):
+            return get_input_rows(records, None, None)
+        return records
+
+    def __add_results(self, stage: Stage, result, rejects) -> list:
+        result_rows, reject_rows, metrics = result
+        stage.add_results(result_rows, reject_rows, metrics)
+        self.metrics.merge(metrics)
+        if rejects is not None:
+            rejects.extend(reject_rows)
+        return result_rows
+
+    def __iter_stage(
+        self, stage: Stage, records: Records, ordered: bool, rejects=None
+    ) -> Iterator[dict]:
+        if not self.__open:
+            raise ValueError("session is not open")
+        units = stage.iter_units(self.__get_rows(records), self.chunk_size)
+        func = stage.get_func()
+        if self.pool is None:
+            results = map(func, units)
+        elif ordered:
+            results = imap_bounded(self.pool, func, units, self.num_processes * 4)
+        else:
+            results = imap_unordered_bounded(
+                self.pool, func, units, self.num_processes * 4
+            )
+        for result in results:
+            yield from self.__add_results(stage, result, rejects)
+
+    async def __aiter_stage(
+        self, stage: Stage, records: Records, rejects=None
+    ) -> AsyncIterator[dict]:
+        if not self.__open:
+            raise ValueError("session is not open")
+        if isinstance(records, str):
+            records = await asyncio.to_thread(get_input_rows, records, None, None)
+        func = stage.get_func()
+        # without a pool work units run one at a time in a thread, the fold cache
+        # is not thread safe
+        max_pending = self.num_processes * 4 if self.pool is not None else 1
+        pending = []
+        try:
+            for unit in stage.iter_units(records, self.chunk_size):
+                pending.append(self.__submit(func, unit))
+                if len(pending) >= max_pending:
+                    result = await pending.pop(0)
+                    for row in self.__add_results(stage, result, rejects):
+                        yield row
+            while len(pending) > 0:
+                result = await pending.pop(0)
+                for row in self.__add_results(stage, result, rejects):
+                    yield row
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def __submit(self, func, unit) -> asyncio.Future:
+        if self.pool is None:
+            return asyncio.ensure_future(asyncio.to_thread(func, unit))
+        return apply_async(self.pool, func, unit)
@@ -0,0 +1,452 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from rna_secstruct_design.encoding import NUCLEOTIDE_CODES, encode_sequences
+from rna_secstruct_design.profiler import profiler
+
+# binary sequence library (.rlib). Sequences are 2-bit packed into records of a
+# fixed stride so any record or slice of records can be read straight out of a
+# memory map. Strings that repeat, such as structures, are kept once in a shared
+# table and each record stores an index into it. The `&` strand breaks of
+# multi-strand sequences are not packed, their positions are kept on the side.
+#
+# layout, every section starts at a multiple of 8 bytes:
+#   header       MAGIC, version, num_records, stride, max_length, meta offset and
+#                length (`HEADER`)
+#   data         num_records x stride bytes of packed sequences
+#   lengths      uint32 per record
+#   columns      uint32 table index, int64 or float64 value per record for each
+#                column
+#   names        uint64 offsets (num_records + 1) followed by utf-8 names
+#   breaks       only if a sequence has strand breaks: uint32 offsets
+#                (num_records + 1) followed by uint32 positions, the number of
+#                nucleotides before each break
+#   meta         json with the columns, section offsets and the shared table
+
+MAGIC = b"RLIB"
+VERSION = 2
+# versions that can be read, version 1 has no strand breaks or int columns
+READ_VERSIONS = [1, 2]
+COLUMN_DTYPES = {"float": np.float64, "int": np.int64, "string": np.uint32}
+HEADER = struct.Struct("<4sIQIIQQ")
+DATA_OFFSET = 64
+
+BASES = "ACGU"
+_PACK = np.full(256, 255, dtype=np.uint8)
+for _i, _nuc in enumerate(BASES):
+    _PACK[ord(_nuc)] = _i
+    _PACK[ord(_nuc.lower())] = _i
+_PACK[ord("T")] = _PACK[ord("t")] = BASES.index("U")
+_UNPACK = np.frombuffer(BASES.encode(), dtype=np.uint8)
+# 2-bit code to the codes of `encode_sequences`
+_TO_ENCODED = np.array([NUCLEOTIDE_CODES[nuc] for nuc in BASES], dtype=np.uint8)
+_SHIFTS = np.array([6, 4, 2, 0], dtype=np.uint8)
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) // 8 * 8
+
+
+def pack_sequence(sequence: str) -> bytes:
+    """
+    Packs a sequence into 2 bits per nucleotide, 4 nucleotides per byte with the
+    first in the high bits
+    """
+    codes = _PACK[np.frombuffer(sequence.encode("ascii"), dtype=np.uint8)]
+    if (codes == 255).any():
+        raise ValueError(f"can only store A, C, G and U sequences: {sequence}")
+    padded = np.zeros((len(codes) + 3) // 4 * 4, dtype=np.uint8)
+    padded[: len(codes)] = codes
+    return (padded.reshape(-1, 4) << _SHIFTS).sum(axis=1, dtype=np.uint8).tobytes()
+
+
+def unpack_codes(packed: np.ndarray, length: int) -> np.ndarray:
+    """
+    Unpacks a (rows, stride) array of packed records into (rows, length) 2-bit
+    codes
+    """
+    codes = (packed[:, :, None] >> _SHIFTS) & 3
+    return codes.reshape(len(packed), packed.shape[1] * 4)[:, :length]
+
+
+def split_breaks(sequence: str):
+    """
+    Removes the `&` strand breaks of a sequence
+    :return: the sequence without breaks and the number of nucleotides before
+    each break
+    """
+    if "&" not in sequence:
+        return sequence, []
+    strands = sequence.split("&")
+    breaks = []
+    pos = 0
+    for strand in strands[:-1]:
+        pos += len(strand)
+        breaks.append(pos)
+    return "".join(strands), breaks
+
+
+def join_breaks(sequence: str, breaks) -> str:
+    """
+    Puts the strand breaks removed by `split_breaks` back into a sequence
+    """
+    if len(breaks) == 0:
+        return sequence
+    starts = [0] + [int(b) for b in breaks]
+    ends = starts[1:] + [len(sequence)]
+    return "&".join(sequence[s:e] for s, e in zip(starts, ends))
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, (int, np.integer)) and not isinstance(value, bool)
+
+
+def _is_number(value) -> bool:
+    # strings that look like numbers stay strings, csv values are all strings
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+
+
+class RlibWriter(object):
+    """
+    Writes records to a .rlib file with the same interface as `CSVWriter`.
+    `name` and `sequence` are always stored, every other column is stored as an
+    int64 if its first value is an integer, as a float64 if it is another number
+    and as an index into the shared string table otherwise. An int column becomes
+    a float64 one when a later value is another number or missing, and a number
+    column becomes a string one when a later value is not a number.
+    Sequences can have `&` strand breaks. The stride is only known once every
+    sequence has been seen, so packed sequences are spooled to a temporary file
+    and laid out on close.
+    """
+
+    def __init__(self, path, columns):
+        if "sequence" not in columns:
+            raise ValueError("sequence column not found")
+        self.path = path
+        self.columns = columns
+        self.num_rows = 0
+        self.__extra = [c for c in columns if c not in ["name", "sequence"]]
+        self.__kinds = {}
+        self.__values = {}
+        self.__strings = {}
+        self.__lengths = array("I")
+        self.__names = bytearray()
+        self.__name_offsets = array("Q", [0])
+        self.__breaks = array("I")
+        self.__break_offsets = array("I", [0])
+        self.__spool = tempfile.TemporaryFile()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write_rows(self, rows: List[dict]) -> None:
+        with profiler.stage("write_output"):
+            for row in rows:
+                self.__add(row)
+
+    def write_dataframe(self, df) -> None:
+        if len(df) == 0:
+            return
+        self.write_rows(df.to_dict("records"))
+
+    def __add(self, row: dict) -> None:
+        sequence, breaks = split_breaks(row["sequence"])
+        self.__breaks.extend(breaks)
+        self.__break_offsets.append(len(self.__breaks))
+        self.__spool.write(pack_sequence(sequence))
+        self.__lengths.append(len(sequence))
+        name = row.get("name")
+        if name is None:
+            name = f"seq_{self.num_rows}"
+        self.__names += str(name).encode("utf-8")
+        self.__name_offsets.append(len(self.__names))
+        for col in self.__extra:
+            self.__add_value(col, row.get(col))
+        self.num_rows += 1
+
+    def __add_value(self, col: str, value) -> None:
+        if col not in self.__kinds:
+            if _is_int(value):
+                self.__kinds[col], typecode = "int", "q"
+            elif _is_number(value):
+                self.__kinds[col], typecode = "float", "d"
+            else:
+                self.__kinds[col], typecode = "string", "I"
+            self.__values[col] = array(typecode)
+        missing = value is None or value == ""
+        if self.__kinds[col] == "int":
+            if _is_int(value):
+                self.__values[col].append(int(value))
+                return
+            if missing or _is_number(value):
+                self.__kinds[col] = "float"
+                self.__values[col] = array("d", self.__values[col])
+            else:
+                self.__to_strings(col)
+        if self.__kinds[col] == "float":
+            if missing:
+                self.__values[col].append(float("nan"))
+                return
+            if _is_number(value):
+                self.__values[col].append(float(value))
+                return
+            self.__to_strings(col)
+        self.__values[col].append(self.__get_string_index(value))
+
+    def __get_string_index(self, value) -> int:
+        value = "" if value is None else str(value)
+        index = self.__strings.get(value)
+        if index is None:
+            index = len(self.__strings)
+            self.__strings[value] = index
+        return index
+
+    def __to_strings(self, col: str) -> None:
+        """
+        turns a number column into a string one, missing values become empty
+        """
+        values = [None if v != v else v for v in self.__values[col]]
+        self.__kinds[col] = "string"
+        self.__values[col] = array("I", [self.__get_string_index(v) for v in values])
+
+    def close(self) -> None:
+        if self.__spool is None:
+            return
+        with profiler.stage("write_output"):
+            self.__write()
+        self.__spool.close()
+        self.__spool = None
+
+    def __write(self) -> None:
+        lengths = np.frombuffer(self.__lengths, dtype=np.uint32)
+        max_length = int(lengths.max()) if len(lengths) > 0 else 0
+        stride = (max_length + 3) // 4
+        sizes = (lengths.astype(np.int64) + 3) // 4
+        with open(self.path, "wb") as f:
+            f.write(b"\0" * DATA_OFFSET)
+            self.__spool.seek(0)
+            # lay out the spooled sequences in fixed stride records, a block at a time
+            for start in range(0, self.num_rows, 65536):
+                block_sizes = sizes[start : start + 65536]
+                spooled = self.__spool.read(int(block_sizes.sum()))
+                records = np.zeros((len(block_sizes), stride), dtype=np.uint8)
+                pos = 0
+                for i, size in enumerate(block_sizes):
+                    records[i, :size] = np.frombuffer(spooled, np.uint8, size, pos)
+                    pos += size
+                f.write(records.tobytes())
+            sections = {}
+            sections["lengths"] = self.__write_section(f, lengths.tobytes())
+            columns = []
+            for col in self.__extra:
+                kind = self.__kinds.get(col, "string")
+                values = self.__values.get(col, array("I"))
+                offset = self.__write_section(f, values.tobytes())
+                columns.append({"name": col, "kind": kind, "offset": offset})
+            sections["name_offsets"] = self.__write_section(
+                f, self.__name_offsets.tobytes()
+            )
+            sections["names"] = self.__write_section(f, bytes(self.__names))
+            if len(self.__breaks) > 0:
+                sections["break_offsets"] = self.__write_section(
+                    f, self.__break_offsets.tobytes()
+                )
+                sections["breaks"] = self.__write_section(f, self.__breaks.tobytes())
+            meta = {
+                "columns": columns,
+                "sections": sections,
+                "strings": list(self.__strings),
+            }
+            meta_bytes = json.dumps(meta).encode("utf-8")
+            meta_offset = self.__write_section(f, meta_bytes)
+            f.seek(0)
+            f.write(
+                HEADER.pack(
+                    MAGIC,
+                    VERSION,
+                    self.num_rows,
+                    stride,
+                    max_length,
+                    meta_offset,
+                    len(meta_bytes),
+                )
+            )
+
+    def __write_section(self, f, data: bytes) -> int:
+        offset = _align(f.tell())
+        f.write(b"\0" * (offset - f.tell()))
+        f.write(data)
+        return offset
+
+
+class RlibStore(object):
+    """
+    Read-only, memory-mapped view of a .rlib file. Packed sequences, lengths and
+    columns are numpy arrays over the map so opening a library of any size is
+    instant and only the records that are used are read from disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.__f = open(path, "rb")
+        size = os.fstat(self.__f.fileno()).st_size
+        if size < DATA_OFFSET:
+            raise ValueError(f"{path} is not a rlib file")
+        self.__mm = mmap.mmap(self.__f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n, stride, max_length, meta_offset, meta_len = (
+            HEADER.unpack_from(self.__mm, 0)
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a rlib file")
+        if version not in READ_VERSIONS:
+            raise ValueError(f"unsupported rlib version {version}")
+        self.num_records = n
+        self.stride = stride
+        self.max_length = max_length
+        meta = json.loads(self.__mm[meta_offset : meta_offset + meta_len])
+        sections = meta["sections"]
+        self.strings = meta["strings"]
+        self.packed = self.__array(np.uint8, DATA_OFFSET, (n, stride))
+        self.lengths = self.__array(np.uint32, sections["lengths"], (n,))
+        self.columns = {}
+        self.__kinds = {}
+        for col in meta["columns"]:
+            dtype = COLUMN_DTYPES[col["kind"]]
+            self.columns[col["name"]] = self.__array(dtype, col["offset"], (n,))
+            self.__kinds[col["name"]] = col["kind"]
+        self.__name_offsets = self.__array(
+            np.uint64, sections["name_offsets"], (n + 1,)
+        )
+        self.__names_offset = sections["names"]
+        self.__break_offsets = self.__breaks = None
+        if "breaks" in sections:
+            self.__break_offsets = self.__array(
+                np.uint32, sections["break_offsets"], (n + 1,)
+            )
+            num_breaks = int(self.__break_offsets[-1])
+            self.__breaks = self.__array(np.uint32, sections["breaks"], (num_breaks,))
+
+    def __array(self, dtype, offset: int, shape) -> np.ndarray:
+        return np.ndarray(shape, dtype=dtype, buffer=self.__mm, offset=offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.num_records
+
+    def __getitem__(self, i: int) -> dict:
+        if i < 0:
+            i += self.num_records
+        if not 0 <= i < self.num_records:
+            raise IndexError(f"record {i} out of range")
+        return self.get_records(i, i + 1)[0]
+
+    def close(self) -> None:
+        # drop the views before closing the map they point into
+        self.packed = self.lengths = None
+        self.columns = {}
+        self.__name_offsets = self.__break_offsets = self.__breaks = None
+        try:
+            self.__mm.close()
+        except BufferError:
+            # arrays sliced out of the store are still alive, the map is released
+            # with them
+            pass
+        self.__f.close()
+
+    def get_name(self, i: int) -> str:
+        start = self.__names_offset + int(self.__name_offsets[i])
+        end = self.__names_offset + int(self.__name_offsets[i + 1])
+        return self.__mm[start:end].decode("utf-8")
+
+    def get_breaks(self, i: int) -> List[int]:
+        """
+        number of nucleotides before each strand break of record i
+        """
+        if self.__breaks is None:
+            return []
+        start, end = self.__break_offsets[i], self.__break_offsets[i + 1]
+        return self.__breaks[start:end].tolist()
+
+    def get_codes(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """
+        2-bit codes (0-3 for A, C, G, U) of a slice of records as a
+        (rows, max_length) array, positions past the end of a sequence are 0.
+        Strand breaks are left out.
+        """
+        stop = self.num_records if stop is None else stop
+        return unpack_codes(self.packed[start:stop], self.max_length)
+
+    def get_encoded(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """
+        A slice of records encoded like `encode_sequences`, ready for the vectorized
+        metrics in `rna_secstruct_design.dataframe`
+        """
+        stop = self.num_records if stop is None else stop
+        if self.__breaks is not None:
+            # strand breaks shift the positions after them
+            return encode_sequences(self.get_sequences(start, stop))
+        encoded = _TO_ENCODED[self.get_codes(start, stop)]
+        lengths = self.lengths[start:stop]
+        encoded[np.arange(self.max_length) >= lengths[:, None]] = 0
+        width = int(lengths.max()) if len(lengths) > 0 else 0
+        return encoded[:, :width]
+
+    def get_sequences(self, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        stop = self.num_records if stop is None else stop
+        letters = _UNPACK[self.get_codes(start, stop)]
+        sequences = [
+            row[:length].tobytes().decode("ascii")
+            for row, length in zip(letters, self.lengths[start:stop])
+        ]
+        if self.__breaks is None:
+            return sequences
+        return [
+            join_breaks(seq, self.get_breaks(i))
+            for i, seq in enumerate(sequences, start)
+        ]
+
+    def get_column(self, col: str, start: int = 0, stop: Optional[int] = None):
+        """
+        Values of a column for a slice of records, a numpy array for int and float
+        columns and a list of strings otherwise
+        """
+        stop = self.num_records if stop is None else stop
+        values = self.columns[col][start:stop]
+        if self.__kinds[col] != "string":
+            return values
+        return [self.strings[v] for v in values]
+
+    def get_records(self, start: int = 0, stop: Optional[int] = None) -> List[dict]:
+        stop = self.num_records if stop is None else stop
+        stop = min(stop, self.num_records)
+        data = {"name": [self.get_name(i) for i in range(start, stop)]}
+        data["sequence"] = self.get_sequences(start, stop)
+        for col in self.columns:
+            values = self.get_column(col, start, stop)
+            data[col] = values.tolist() if isinstance(values, np.ndarray) else values
+        return [dict(zip(data, row)) for row in zip(*data.values())]
+
+    def get_dataframe(self, start: int = 0, stop: Optional[int] = None):
+        import pandas as pd
+
+        columns = ["name", "sequence"] + list(self.columns)
+        return pd.DataFrame(self.get_records(start, stop), columns=columns)
+
+    def iter_records(self, batch_size: int = 10000) -> Iterator[dict]:
+        for start in range(0, self.num_records, batch_size):
+            yield from self.get_records(start, start + batch_size)
@@ -1,5 +1,7 @@
 import re
 import random
+from typing import List, Tuple
+
 from rna_secstruct.secstruct import SecStruct
 from seq_tools import SequenceStructure
 
@@ -144,6 +146,99 @@ def max_gc_stretch(sequence, structure) -> int:
     return longest_gc_stretch
 
 
+def get_pair_table(structure: str) -> List[int]:
+    """
+    Returns the partner of each position in a dot-bracket structure or -1 if the
+    position is unpaired. `&` strand breaks are kept as unpaired positions so the
+    table can be indexed with the same positions as the structure string.
+    :param structure: dot-bracket structure
+    :return: list of partner positions
+    """
+    pairs = [-1] * len(structure)
+    stack = []
+    for i, ss in enumerate(structure):
+        if ss == "(":
+            stack.append(i)
+        elif ss == ")":
+            if len(stack) == 0:
+                raise ValueError(f"unbalanced structure: {structure}")
+            j = stack.pop()
+            pairs[i] = j
+            pairs[j] = i
+    if len(stack) != 0:
+        raise ValueError(f"unbalanced structure: {structure}")
+    return pairs
+
+
+def get_helix_pairs(structure: str) -> List[List[Tuple[int, int]]]:
+    """
+    Returns the basepairs of each helix in a dot-bracket structure. A helix is a
+    run of stacked basepairs, (i, j) followed by (i + 1, j - 1).
+    :param structure: dot-bracket structure
+    :return: list of helices, each a list of (5' position, 3' position) pairs
+    """
+    pair_table = get_pair_table(structure)
+    helices = []
+    for i, j in enumerate(pair_table):
+        if j < i:
+            continue
+        if i > 0 and pair_table[i - 1] == j + 1:
+            helices[-1].append((i, j))
+        else:
+            helices.append([(i, j)])
+    return helices
+
+
+# purines pair with pyrimidines in every watson-crick and GU basepair, so two
+# stretches can only pair if their purine/pyrimidine patterns are complementary
+_PURINES = {"A": 1, "G": 1, "C": 0, "U": 0, "T": 0}
+
+
+def find_off_target_stretches(
+    sequence: str, structure: str, min_length: int, min_loop: int = 3
+) -> List[Tuple[int, int]]:
+    """
+    Finds stretches of min_length consecutive basepairs, GU included, that the
+    sequence could form but the structure does not contain any of. Every window
+    of min_length positions is indexed by its purine/pyrimidine pattern, only
+    windows with the reverse complementary pattern are checked base by base.
+    Stretches longer than min_length are reported once per window they cover.
+    :param sequence: sequence of RNA, positions that are not A, C, G or U never
+    pair
+    :param structure: target structure of the sequence
+    :param min_length: number of consecutive basepairs of a stretch
+    :param min_loop: min unpaired positions closed by the innermost basepair
+    :return: list of (i, j), the outermost basepair of every stretch, it pairs
+    i to i + min_length - 1 with j to j - min_length + 1
+    """
+    k = min_length
+    pair_table = get_pair_table(structure)
+    full = (1 << k) - 1
+    index = {}
+    patterns = []
+    pattern, valid = 0, 0
+    for pos, base in enumerate(sequence):
+        bit = _PURINES.get(base)
+        valid = valid + 1 if bit is not None else 0
+        pattern = ((pattern << 1) | (bit or 0)) & full
+        if valid >= k:
+            start = pos - k + 1
+            index.setdefault(pattern, []).append(start)
+            patterns.append((start, pattern))
+    stretches = []
+    for i, pattern in patterns:
+        reverse = int(format(pattern, f"0{k}b")[::-1], 2)
+        for start in index.get(reverse ^ full, []):
+            if start - (i + k - 1) - 1 < min_loop:
+                continue
+            j = start + k - 1
+            if any(pair_table[i + t] == j - t for t in range(k)):
+                continue
+            if all(sequence[i + t] + sequence[j - t] in BASEPAIRS for t in range(k)):
+                stretches.append((i, j))
+    return stretches
+
+
 def hamming(a, b):
     """hamming distance between two strings"""
     dist = 0
@@ -44,6 +44,7 @@ setup(
     ],
     include_package_data=True,
     install_requires=requirements,
+    extras_require={"arrow": ["pyarrow"]},
     zip_safe=False,
     keywords="rna_secstruct_design",
     classifiers=[
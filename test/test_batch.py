@@ -0,0 +1,40 @@
+import csv
+from multiprocessing import Pool
+
+from rna_secstruct_design.batch import chunked, imap_bounded, CSVWriter
+
+
+def square(x):
+    return x * x
+
+
+def test_chunked():
+    chunks = list(chunked(range(7), 3))
+    assert chunks == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_imap_bounded():
+    pulled = []
+
+    def iter_items():
+        for i in range(10):
+            pulled.append(i)
+            yield i
+
+    with Pool(2) as p:
+        results = imap_bounded(p, square, iter_items(), 2)
+        assert next(results) == 0
+        # only the items needed to keep 2 tasks running have been pulled
+        assert len(pulled) <= 3
+        assert list(results) == [x * x for x in range(1, 10)]
+
+
+def test_csv_writer(tmp_path):
+    path = tmp_path / "out.csv"
+    with CSVWriter(path, ["name", "value"]) as writer:
+        writer.write_rows([{"name": "a", "value": 1}])
+        writer.write_rows([{"name": "b", "value": 2}])
+    assert writer.num_rows == 2
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    assert [r["name"] for r in rows] == ["a", "b"]
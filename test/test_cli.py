@@ -1 +1,54 @@
+import subprocess
+import sys
 
+from click.testing import CliRunner
+
+from rna_secstruct_design.cli import cli
+
+# seconds, generous so it holds on slow machines but catches pandas and friends
+# being imported at module level again
+IMPORT_TIME_BUDGET = 0.5
+
+HEAVY_MODULES = ["pandas", "numpy", "vienna", "seq_tools", "rna_secstruct"]
+
+
+def test_import_time():
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import rna_secstruct_design.cli\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(elapsed, *loaded)\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    import_time, *loaded = out.stdout.split()
+    assert loaded == []
+    assert float(import_time) < IMPORT_TIME_BUDGET
+
+
+def test_help():
+    runner = CliRunner()
+    result = runner.invoke(cli, ["--help"])
+    assert result.exit_code == 0
+    assert "mut-scan" in result.output
+
+
+def test_commands_defers_optional_modules():
+    # only modules of this package, what the dependencies import is up to them
+    modules = [
+        "rna_secstruct_design.clustering",
+        "rna_secstruct_design.diversity",
+        "rna_secstruct_design.helix_library",
+    ]
+    code = (
+        "import sys\n"
+        "import rna_secstruct_design.commands\n"
+        f"print(*[m for m in {modules!r} if m in sys.modules])\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert out.stdout.split() == []
@@ -0,0 +1,76 @@
+import editdistance
+import numpy as np
+
+from rna_secstruct_design.clustering import (
+    UnionFind,
+    cluster_sequences,
+    get_qgram_items,
+)
+from rna_secstruct_design.encoding import encode_sequences
+
+
+def brute_force_clusters(seqs, max_distance):
+    uf = UnionFind(len(seqs))
+    for i in range(len(seqs)):
+        for j in range(i):
+            if editdistance.eval(seqs[i], seqs[j]) <= max_distance:
+                uf.union(i, j)
+    return [uf.find(i) for i in range(len(seqs))]
+
+
+def same_partition(a, b):
+    pairs = range(len(a))
+    return all((a[i] == a[j]) == (b[i] == b[j]) for i in pairs for j in pairs)
+
+
+def get_library(num, seed=0):
+    rng = np.random.default_rng(seed)
+    bases = ["".join(rng.choice(list("ACGU"), rng.integers(1, 40))) for _ in range(20)]
+    seqs = []
+    for _ in range(num):
+        seq = list(bases[rng.integers(len(bases))])
+        for _ in range(rng.integers(0, 3)):
+            pos = rng.integers(len(seq))
+            op = rng.integers(3)
+            if op == 0:
+                seq[pos] = rng.choice(list("ACGU"))
+            elif op == 1:
+                seq.insert(pos, rng.choice(list("ACGU")))
+            elif len(seq) > 1:
+                del seq[pos]
+        seqs.append("".join(seq))
+    return seqs
+
+
+def test_get_qgram_items():
+    seqs = ["AAAA", "AC"]
+    seq_ids, items = get_qgram_items(encode_sequences(seqs), np.array([4, 2]), 2)
+    assert seq_ids.tolist() == [0, 0, 0, 1]
+    # AA occurs three times in the first sequence, each occurrence is its own item
+    assert len(set(items[:3].tolist())) == 3
+    assert items[3] not in items[:3]
+
+
+def test_cluster_sequences():
+    seqs = ["GGAAAC", "GGAAAU", "GGAAUU", "CCCCUUUUGG", "CCCCUUUUG", "A"]
+    cluster_ids, stats = cluster_sequences(seqs, 1)
+    assert cluster_ids.tolist() == [0, 0, 0, 1, 1, 2]
+    assert stats.clusters == 3
+    cluster_ids, _ = cluster_sequences(seqs, 0)
+    assert cluster_ids.tolist() == [0, 1, 2, 3, 4, 5]
+
+
+def test_cluster_sequences_matches_brute_force():
+    seqs = get_library(150)
+    for max_distance in [1, 2, 3]:
+        for q in [None, 2, 4]:
+            cluster_ids, stats = cluster_sequences(seqs, max_distance, q)
+            expected = brute_force_clusters(seqs, max_distance)
+            assert same_partition(cluster_ids.tolist(), expected)
+            assert stats.compared <= len(seqs) * (len(seqs) - 1) // 2
+
+
+def test_cluster_sequences_empty():
+    cluster_ids, stats = cluster_sequences([], 1)
+    assert len(cluster_ids) == 0
+    assert stats.clusters == 0
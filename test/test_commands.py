@@ -0,0 +1,45 @@
+import pytest
+
+from rna_secstruct.secstruct import SecStruct
+
+from rna_secstruct_design.commands import (
+    parse_helix_ranges,
+    iter_indel_variants,
+    count_mutations,
+    get_mutations,
+    iter_mutations,
+)
+
+
+def test_parse_helix_ranges():
+    h_ranges = parse_helix_ranges(["0:2-10", "2:3-4"])
+    assert h_ranges == {0: (2, 10), 2: (3, 4)}
+    with pytest.raises(ValueError):
+        parse_helix_ranges(["0:2"])
+
+
+def test_iter_indel_variants():
+    secstruct = SecStruct("GGGGAAAACCCC", "((((....))))")
+    count, variants = iter_indel_variants(secstruct, "remove-unpaired", 1, [], False)
+    variants = list(variants)
+    assert count == len(variants) == 1
+    assert variants[0][1] == "GGGGAAACCCC"
+    with pytest.raises(ValueError):
+        iter_indel_variants(secstruct, "swap", 1, [], False)
+
+
+def test_get_mutations():
+    rows = [
+        {"name": "a", "sequence": "GGGAAACCC", "structure": "(((...)))"},
+        {"name": "b", "sequence": "GGGAAACCC", "structure": "(((...)))"},
+    ]
+    muts = get_mutations(rows, {}, 1)
+    assert len(muts) == 2 * 9 * 3
+    assert muts[0].name == "a_G1A"
+    assert muts[27].name == "b_G1A"
+    muts = get_mutations(rows[:1], {}, 1, prefix_names=False)
+    assert muts[0].name == "G1A"
+    for num_muts in [1, 2]:
+        muts = list(iter_mutations(rows, {}, num_muts))
+        assert muts == get_mutations(rows, {}, num_muts)
+        assert count_mutations(rows, {}, num_muts) == len(muts)
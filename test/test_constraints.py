@@ -3,6 +3,8 @@ from rna_secstruct_design.constraints import (
     MaxRepeatingIncreaseConstraint,
     MaxGCStretchConstraint,
     MaxGCStretchIncreaseConstraint,
+    MaxOffTargetPairingConstraint,
+    MaxOffTargetPairingIncreaseConstraint,
 )
 
 
@@ -34,3 +36,23 @@ def test_max_gc_stretch_increase_constraint():
     assert con.satisifes("CAGGAAAACCUG", "((((....))))")
     assert con.satisifes("GGGGAAAACCCC", "((((....))))") == False
     assert con.satisifes("GGGAAAAAUCCC", "((((....))))")
+
+
+def test_max_off_target_pairing_constraint():
+    """Test that the max off target pairing constraint works"""
+    con = MaxOffTargetPairingConstraint(3)
+    assert con.get_stretches("GGGGAAAACCCCAA", "." * 14) == [(0, 11, 4)]
+    assert not con.satisifes("GGGGAAAACCCCAA", "." * 14)
+    assert con.satisifes("GGGGAAAACCCCAA", "((((....))))..")
+    # pairing the outer strands of two hairpins is no longer than their helices
+    seq = "GGGGAAAACCCCAAGGGGAAAACCCC"
+    assert con.satisifes(seq, "((((....))))..((((....))))")
+    assert MaxOffTargetPairingConstraint(2).satisifes(seq, "((((....))))..((((....))))")
+
+
+def test_max_off_target_pairing_increase_constraint():
+    """Test that the max off target pairing increase constraint works"""
+    con = MaxOffTargetPairingIncreaseConstraint(3, "GGGGAAAACCCCNNNNNN", "." * 18)
+    assert con.satisifes("GGGGAAAACCCCAAAAAA", "." * 18)
+    assert (0, 17, 4) in con.get_new_stretches("GGGGAAAACCCCAAUUUU", "." * 18)
+    assert not con.satisifes("GGGGAAAACCCCAAUUUU", "." * 18)
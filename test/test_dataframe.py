@@ -63,3 +63,12 @@ def test_has_repeating_nucleotides_less_than():
     df = get_test_data_rna()
     assert has_repeating_nucleotides_less_than(df, 5)
     assert not has_repeating_nucleotides_less_than(df, 4)
+
+
+def test_get_max_gc_stretch_dedup():
+    """
+    test get_max_gc_stretch on deduplicated rows
+    """
+    df = pd.concat([get_test_data_rna()] * 3, ignore_index=True)
+    gc_stretches = get_max_gc_stretch(df, dedup=True)
+    assert list(gc_stretches) == [4, 2] * 3
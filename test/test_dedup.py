@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+from rna_secstruct_design.dedup import (
+    dedup_dataframe,
+    dedup_mutations,
+    get_aliases,
+    apply_deduplicated,
+)
+from rna_secstruct_design.mutations import Mutation
+
+
+def get_test_data() -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            ["seq_0", "GGGGUUUUCCCC", "((((....))))"],
+            ["seq_1", "GAGGUAUUCCUC", "((((....))))"],
+            ["seq_2", "GGGGUUUUCCCC", "((((....))))"],
+            ["seq_3", "GGGGUUUUCCCC", "(((......)))"],
+        ],
+        columns=["name", "sequence", "structure"],
+    )
+
+
+def test_dedup_dataframe():
+    df_unique, groups, stats = dedup_dataframe(get_test_data())
+    assert list(df_unique["name"]) == ["seq_0", "seq_1", "seq_3"]
+    assert groups["seq_0"] == ["seq_0", "seq_2"]
+    assert stats.total == 4
+    assert stats.unique == 3
+    assert stats.saved == 1
+    assert get_aliases(groups, "seq_1") == ["seq_1"]
+    assert get_aliases(None, "seq_1") == ["seq_1"]
+
+
+def test_dedup_duplicate_names():
+    df = get_test_data()
+    df.loc[3, "name"] = "seq_1"
+    with pytest.raises(ValueError):
+        dedup_dataframe(df)
+    with pytest.raises(ValueError):
+        dedup_mutations([Mutation("A1U", "UUC"), Mutation("A1U", "GUC")])
+    muts = [Mutation("A1U", "UUC"), Mutation("A1U", "GUC"), Mutation("A1U", "UUC")]
+    unique, groups, stats = dedup_mutations(muts, key_by_index=True)
+    assert [(m.name, m.sequence) for m in unique] == [("0", "UUC"), ("1", "GUC")]
+    assert get_aliases(groups, "0") == ["A1U", "A1U"]
+    assert get_aliases(groups, "1") == ["A1U"]
+
+
+def test_dedup_mutations():
+    muts = [Mutation("A1U", "UUC"), Mutation("A1G", "GUC"), Mutation("x", "UUC")]
+    unique, groups, stats = dedup_mutations(muts)
+    assert [m.name for m in unique] == ["A1U", "A1G"]
+    assert groups["A1U"] == ["A1U", "x"]
+    assert stats.saved == 1
+
+
+def test_apply_deduplicated():
+    df = get_test_data()
+    calls = []
+
+    def get_lengths(df_unique):
+        calls.append(len(df_unique))
+        return df_unique["sequence"].str.count("G")
+
+    results = apply_deduplicated(df, get_lengths)
+    assert calls == [3]
+    assert list(results) == [4, 3, 4, 4]
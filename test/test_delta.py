@@ -0,0 +1,76 @@
+import pytest
+
+from rna_secstruct_design.formats import get_format
+from rna_secstruct_design.readers import iter_records
+
+from rna_secstruct_design.delta import (
+    DeltaReader,
+    DeltaWriter,
+    apply_structure_diff,
+    apply_substitutions,
+    get_structure_diff,
+    read_delta,
+)
+
+WILD_TYPES = [
+    {"name": "a", "sequence": "GGGAAACCC", "structure": "(((...)))"},
+    {"name": "a_b", "sequence": "GGAAAC", "structure": "(....)"},
+]
+
+ROWS = [
+    {
+        "name": "a_G1A",
+        "sequence": "AGGAAACCC",
+        "structure": ".((...)).",
+        "ens_defect": 1.5,
+    },
+    {
+        "name": "a_b_G2C",
+        "sequence": "GCAAAC",
+        "structure": "(....)",
+        "ens_defect": 0.25,
+    },
+    {
+        "name": "a_other",
+        "sequence": "GGGAAACCG",
+        "structure": "......(((",
+        "ens_defect": 3.0,
+    },
+]
+
+
+def test_structure_diff():
+    assert get_structure_diff("(((...)))", "(((...)))") == "="
+    assert get_structure_diff("(((...)))", ".((...)).") == "1:.;9:."
+    for new in [".((...)).", "........."]:
+        diff = get_structure_diff("(((...)))", new)
+        assert apply_structure_diff("(((...)))", diff) == new
+
+
+def test_apply_substitutions():
+    assert apply_substitutions("GGGAAACCC", "G1A_C9G") == "AGGAAACCG"
+    with pytest.raises(ValueError):
+        apply_substitutions("GGGAAACCC", "A1G")
+
+
+def test_delta_round_trip(tmp_path):
+    path = tmp_path / "out.delta"
+    with DeltaWriter(path, WILD_TYPES) as writer:
+        writer.write_rows(ROWS)
+    lines = path.read_text().splitlines()
+    assert lines[3] == "0\tG1A\t1:.;9:.\t1.5\t"
+    assert lines[4] == "1\tG2C\t=\t0.25\t"
+    with DeltaReader(path) as reader:
+        assert reader.wild_types == WILD_TYPES
+        assert list(reader) == ROWS
+    assert read_delta(path)["name"].tolist() == ["a_G1A", "a_b_G2C", "a_other"]
+
+
+@pytest.mark.parametrize("ext", [".delta.gz", ".delta.bz2"])
+def test_delta_compressed(tmp_path, ext):
+    path = tmp_path / ("out" + ext)
+    assert get_format(path) == "delta"
+    with DeltaWriter(path, WILD_TYPES) as writer:
+        writer.write_rows(ROWS)
+    assert not path.read_bytes().startswith(b"#delta")
+    assert list(iter_records(path)) == ROWS
@@ -0,0 +1,47 @@
+import numpy as np
+
+from rna_secstruct_design.diversity import (
+    MinDistanceFilter,
+    hamming_distances,
+    max_min_select,
+    nearest_neighbor_distances,
+    pack_sequences,
+)
+
+
+def hamming(a, b):
+    return sum(x != y for x, y in zip(a, b)) + abs(len(a) - len(b))
+
+
+def get_sequences(num, seed=0):
+    rng = np.random.default_rng(seed)
+    lengths = rng.choice([20, 70, 130], num)
+    return ["".join(rng.choice(list("ACGU"), n)) for n in lengths]
+
+
+def test_hamming_distances():
+    seqs = get_sequences(50)
+    expected = np.array([[hamming(a, b) for b in seqs] for a in seqs])
+    dist = hamming_distances(pack_sequences(seqs), block_size=16)
+    assert np.array_equal(dist, expected)
+
+
+def test_nearest_neighbor_distances():
+    seqs = ["GGAAAC", "GGAAAU", "CCUUUG"]
+    nearest = nearest_neighbor_distances(pack_sequences(seqs), block_size=2)
+    assert nearest.tolist() == [1, 1, 6]
+
+
+def test_max_min_select():
+    seqs = ["AAAAAA", "AAAAAU", "UUUUUU", "AAAUUU"]
+    assert max_min_select(seqs, 2) == [0, 2]
+    # AAAAAU is only 1 from AAAAAA
+    assert sorted(max_min_select(seqs, min_distance=2)) == [0, 2, 3]
+
+
+def test_min_distance_filter():
+    f = MinDistanceFilter(2)
+    assert f.accept("GGAAAC")
+    assert not f.accept("GGAAAU")
+    assert f.accept("GGAAUU")
+    assert len(f) == 2
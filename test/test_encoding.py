@@ -0,0 +1,25 @@
+import numpy as np
+
+from rna_secstruct_design.encoding import (
+    encode_sequences,
+    max_run_lengths,
+    run_lengths,
+)
+
+
+def test_encode_sequences():
+    encoded = encode_sequences(["ACGU", "GA&U", "AC"])
+    assert encoded.shape == (3, 4)
+    assert encoded[0].tolist() == [1, 2, 3, 4]
+    assert encoded[1].tolist() == [3, 1, 5, 4]
+    assert encoded[2].tolist() == [1, 2, 0, 0]
+
+
+def test_max_run_lengths():
+    mask = np.array([[1, 1, 0, 1, 1, 1], [0, 0, 0, 0, 0, 0]], dtype=bool)
+    assert max_run_lengths(mask).tolist() == [3, 0]
+
+
+def test_run_lengths():
+    encoded = encode_sequences(["AAGGGU"])
+    assert run_lengths(encoded)[0].tolist() == [1, 2, 1, 2, 3, 1]
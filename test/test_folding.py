@@ -0,0 +1,49 @@
+from vienna import fold, cofold
+
+from rna_secstruct_design.folding import (
+    fold_mfe,
+    fold_sequence,
+    FoldCache,
+    StubFoldBackend,
+    set_fold_backend,
+)
+
+
+def test_fold_mfe():
+    seq = "GGGGAAAACCCC"
+    assert fold_mfe(seq) == fold(seq).dot_bracket
+
+
+def test_fold_mfe_cofold():
+    seq = "GGGGAA&UUCCCC"
+    assert fold_mfe(seq) == cofold(seq).dot_bracket
+
+
+def test_fold_cache():
+    cache = FoldCache(max_size=1)
+    r = cache.fold("GGGAAACCC")
+    assert cache.fold("GGGAAACCC") is r
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.fold("GGGGAAACCCC")
+    assert len(cache) == 1
+    cache.fold("GGGAAACCC")
+    assert cache.misses == 3
+
+
+def test_stub_fold_backend():
+    set_fold_backend(StubFoldBackend("((((....))))"))
+    try:
+        assert fold_sequence("GGGGAAAACCCC").dot_bracket == "((((....))))"
+        assert fold_mfe("AAAAAAAAAAAA") == "((((....))))"
+        assert fold_sequence("GGGAAACCC").dot_bracket == "........."
+        assert fold_sequence("GG&CC").dot_bracket == "..&.."
+    finally:
+        set_fold_backend(None)
+    assert fold_sequence("GGGAAACCC").dot_bracket == "(((...)))"
+
+
+def test_fold_mfe_three_strands():
+    seq = "GGGAA&AAUU&AAUCCC"
+    structure = fold_mfe(seq)
+    assert len(structure) == len(seq)
+    assert [i for i, c in enumerate(structure) if c == "&"] == [5, 10]
@@ -0,0 +1,108 @@
+import pandas as pd
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+ipc = pytest.importorskip("pyarrow.ipc")
+
+from rna_secstruct_design.formats import (
+    ArrowWriter,
+    get_format,
+    open_writer,
+    read_dataframe,
+)
+from rna_secstruct_design.readers import iter_records
+
+COLUMNS = ["name", "sequence", "structure", "ens_defect"]
+
+
+def get_rows(start, num):
+    return [
+        {
+            "name": f"seq_{i}",
+            "sequence": "GGAAAC",
+            "structure": "(....)" if i % 2 == 0 else "......",
+            "ens_defect": i / 10,
+        }
+        for i in range(start, start + num)
+    ]
+
+
+def test_get_format():
+    assert get_format("out.parquet") == "parquet"
+    assert get_format("out.arrow") == "arrow"
+    assert get_format("out.txt") == "csv"
+    assert get_format("out.csv", "arrow") == "arrow"
+    assert get_format("out.delta.gz") == "delta"
+    assert get_format("out.fa.bz2") == "fasta"
+
+
+def test_parquet_writer(tmp_path):
+    path = tmp_path / "out.parquet"
+    with ArrowWriter(path, COLUMNS, "parquet", row_group_size=4) as writer:
+        writer.write_rows(get_rows(0, 5))
+        writer.write_dataframe(pd.DataFrame(get_rows(5, 5)))
+    assert writer.num_rows == 10
+    f = pq.ParquetFile(path)
+    assert f.num_row_groups == 3
+    schema = f.schema_arrow
+    assert (
+        str(schema.field("structure").type)
+        == "dictionary<values=string, indices=int32, ordered=0>"
+    )
+    assert str(schema.field("ens_defect").type) == "float"
+    df = read_dataframe(path)
+    assert list(df["name"]) == [f"seq_{i}" for i in range(10)]
+    assert df["structure"][1] == "......"
+
+
+def test_arrow_writer(tmp_path):
+    path = tmp_path / "out.arrow"
+    # the second batch adds a structure to the dictionary
+    with ArrowWriter(path, COLUMNS, "arrow", row_group_size=1) as writer:
+        for i in range(3):
+            writer.write_rows(get_rows(i * 3, 3))
+    table = ipc.open_file(path).read_all()
+    assert table.num_rows == 9
+    df = read_dataframe(path)
+    assert list(df["name"]) == [f"seq_{i}" for i in range(9)]
+    assert df["ens_defect"].dtype == "float32"
+
+
+def test_parquet_writer_size(tmp_path):
+    # unique names and row groups must not make the file larger than pandas does
+    rows = [
+        {
+            "name": f"seq_{i}_A{i % 48}U",
+            "sequence": "GGAAAC" * 5,
+            "structure": "(....)" * 5,
+            "ens_defect": i / 100,
+        }
+        for i in range(100000)
+    ]
+    path = tmp_path / "out.parquet"
+    with ArrowWriter(path, COLUMNS, "parquet", row_group_size=10000) as writer:
+        writer.write_rows(rows)
+    pd.DataFrame(rows).to_parquet(tmp_path / "pandas.parquet")
+    size = path.stat().st_size
+    assert size < 1.2 * (tmp_path / "pandas.parquet").stat().st_size
+
+
+def test_empty_writer(tmp_path):
+    path = tmp_path / "out.parquet"
+    with open_writer(path, COLUMNS):
+        pass
+    df = read_dataframe(path)
+    assert len(df) == 0
+    assert list(df.columns) == COLUMNS
+
+
+@pytest.mark.parametrize("name", ["out.csv.gz", "out.fa.bz2"])
+def test_compressed_writer(tmp_path, name):
+    path = tmp_path / name
+    with open_writer(path, COLUMNS) as writer:
+        writer.write_rows(get_rows(0, 3))
+    records = list(iter_records(path))
+    assert [r["name"] for r in records] == ["seq_0", "seq_1", "seq_2"]
+    assert records[1]["structure"] == "......"
+    with pytest.raises(ValueError):
+        open_writer(tmp_path / "out.parquet.gz", COLUMNS)
@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+from rna_secstruct_design.constraints import (
+    MaxRepeatingConstraint,
+    MaxGCStretchConstraint,
+)
+from rna_secstruct_design.helix_library import (
+    HelixLibrary,
+    build_helix_library,
+    decode_helix,
+    enumerate_helices,
+    get_helix_energy,
+)
+from rna_secstruct_design.util import can_form_helix
+
+
+@pytest.fixture(scope="module")
+def library(tmp_path_factory):
+    path = tmp_path_factory.mktemp("helices")
+    build_helix_library(path, max_length=5)
+    return HelixLibrary(path)
+
+
+def test_get_helix_energy():
+    # GG/CC, GC/CG and CA/GU stacks and one AU end
+    assert get_helix_energy("GGCA&UGCC") == pytest.approx(-3.3 - 3.4 - 2.1 + 0.5)
+    assert get_helix_energy("G&C") == 0.0
+    assert get_helix_energy("GU&GC") == pytest.approx(-2.5 + 0.5)
+
+
+def test_enumerate_helices():
+    helices = enumerate_helices(4)
+    codes = set(helices["code"].tolist())
+    repeat_constraint = MaxRepeatingConstraint(4)
+    gc_constraint = MaxGCStretchConstraint(3)
+    # every helix that satisfies the constraints and no other
+    for code in range(6**4):
+        seq = decode_helix(code, 4)
+        expected = repeat_constraint.satisifes(seq) and gc_constraint.satisifes(
+            seq, "((((&))))"
+        )
+        assert (code in codes) == expected
+    energies = helices["energy"].tolist()
+    assert energies == sorted(energies)
+    first = decode_helix(int(helices["code"][0]), 4)
+    assert energies[0] == pytest.approx(get_helix_energy(first))
+
+
+def test_library_sample(library):
+    assert library.max_length == 5
+    assert library.get_counts()[1] == 6
+    random.seed(0)
+    for _ in range(20):
+        seq = library.sample(5, (-2.5, -1.5))
+        strand1, strand2 = seq.split("&")
+        assert can_form_helix(strand1, strand2)
+        assert -12.5 <= get_helix_energy(seq) <= -7.5
+    # no helix is that stable
+    assert library.sample(5, (-10.0, -9.0)) is None
+
+
+def test_library_sample_fixed(library):
+    random.seed(0)
+    for _ in range(20):
+        seq = library.sample(4, None, {0: "GC", 3: "UA"})
+        assert seq[0] == "G" and seq[3] == "U"
+        assert seq[5] == "A" and seq[-1] == "C"
+    assert library.sample(4, None, {0: "AA"}) is None
+
+
+def test_not_a_library(tmp_path):
+    with pytest.raises(ValueError):
+        HelixLibrary(tmp_path)
@@ -1,7 +1,10 @@
 from rna_secstruct_design.helix_randomizer import (
     generate_helix_sequence,
     HelixRandomizer,
+    DesignStats,
 )
+from rna_secstruct_design.constraints import MaxOffTargetPairingConstraint
+from rna_secstruct_design.helix_library import HelixLibrary, build_helix_library
 from rna_secstruct_design.util import can_form_helix
 from rna_secstruct_design.selection import get_selection
 from rna_secstruct.secstruct import SecStruct
@@ -26,6 +29,53 @@ class TestHelixRandomizer:
         assert ens_defect < 1
         assert seq[5:11] == "GAAAAC"
 
+    def test_return_stats(self):
+        hr = HelixRandomizer()
+        secstruct = SecStruct("AAGGGGAAAACCCC", "..((((....))))")
+        ens_defect, seq, stats = hr.run(secstruct, attempts=5, return_stats=True)
+        assert stats.accepted == 5
+        assert stats.iterations == stats.accepted + sum(stats.get_rejects().values())
+        assert stats.folds + stats.fold_cache_hits == stats.accepted + (
+            stats.misfold_rejects
+        )
+
+    def test_max_off_target(self):
+        hr = HelixRandomizer(max_off_target=3)
+        secstruct = SecStruct(
+            "AAGGGGAAAACCCCAAGGGGAAAACCCC", "..((((....))))..((((....))))"
+        )
+        ens_defect, seq, stats = hr.run(secstruct, attempts=5, return_stats=True)
+        assert stats.accepted == 5
+        assert stats.iterations == stats.accepted + sum(stats.get_rejects().values())
+        assert stats.off_target_hits >= stats.off_target_rejects
+        con = MaxOffTargetPairingConstraint(3)
+        assert con.satisifes(seq, secstruct.structure)
+
+    def test_helix_library(self, tmp_path):
+        build_helix_library(tmp_path, max_length=4)
+        hr = HelixRandomizer(
+            helix_library=HelixLibrary(tmp_path), energy_band=(-2.5, -1.0)
+        )
+        secstruct = SecStruct("AAGGGGAAAACCCC", "..((((....))))")
+        ens_defect, seq, stats = hr.run(secstruct, attempts=5, return_stats=True)
+        assert stats.accepted == 5
+        assert stats.library_samples == stats.helix_samples
+        # the kept flanking basepair
+        assert seq[5:11] == "GAAAAC"
+
+    def test_helix_exhausted(self):
+        hr = HelixRandomizer()
+        secstruct = SecStruct("GGGGAAAACCCC", "((((....))))")
+        helix = secstruct.get_helices()[0]
+        # every position is kept so the gc stretch can never be fixed
+        exclude = list(range(12))
+        stats = DesignStats()
+        h_seq = hr._HelixRandomizer__get_randomized_helix_sequence(
+            helix, exclude, stats
+        )
+        assert h_seq is None
+        assert stats.helix_gc_rejects == 100
+
     def test_long_helix(self):
         hr = HelixRandomizer()
         secstruct = SecStruct(
@@ -0,0 +1,92 @@
+import pandas as pd
+import pytest
+import yaml
+
+from rna_secstruct_design.jobs import Job, JobRunner, load_jobs
+from rna_secstruct_design.mutations import find_multiple_mutations
+
+SEQ = "GGGAUCGAAAGAUCCC"
+STRUCT = "((((((....))))))"
+
+
+def get_jobs(tmp_path):
+    pd.DataFrame(
+        [
+            {"name": "a", "sequence": SEQ, "structure": STRUCT},
+            {"name": "b", "sequence": "GGCAUGGAAACAUGCC", "structure": STRUCT},
+        ]
+    ).to_csv(tmp_path / "input.csv", index=False)
+    return [
+        {
+            "name": "scan",
+            "type": "mut_scan",
+            "seq": SEQ,
+            "struct": STRUCT,
+            "output": str(tmp_path / "scan.csv"),
+        },
+        {
+            "name": "designs",
+            "type": "helix_rand",
+            "input": str(tmp_path / "input.csv"),
+            "num_seqs": 2,
+            "output": str(tmp_path / "designs.csv"),
+        },
+    ]
+
+
+def test_job_from_spec():
+    job = Job.from_spec({"type": "mut_scan", "seq": SEQ, "output": "scan.csv"})
+    assert job.name == "scan.csv"
+    assert job.stage.options == {"prefix_names": False}
+    with pytest.raises(ValueError):
+        Job.from_spec({"type": "mut_scan", "output": "scan.csv"})
+    with pytest.raises(ValueError):
+        Job.from_spec({"type": "mut_scan", "seq": SEQ, "input": "x.csv"})
+
+
+def test_load_jobs(tmp_path):
+    path = tmp_path / "jobs.yml"
+    jobs = get_jobs(tmp_path)
+    jobs[1]["name"] = "scan"
+    path.write_text(yaml.safe_dump({"jobs": jobs}))
+    with pytest.raises(ValueError):
+        load_jobs(path)
+
+
+@pytest.mark.parametrize("num_processes", [1, 2])
+def test_job_runner(tmp_path, num_processes):
+    specs = get_jobs(tmp_path)
+    specs.append(
+        {
+            "name": "missing",
+            "type": "mut_scan",
+            "input": str(tmp_path / "missing.csv"),
+            "output": str(tmp_path / "missing_out.csv"),
+        }
+    )
+    # fails in a worker, the structure does not match the sequence
+    pd.DataFrame([{"name": "c", "sequence": SEQ, "structure": "(("}]).to_csv(
+        tmp_path / "bad.csv", index=False
+    )
+    specs.append(
+        {
+            "name": "bad",
+            "type": "helix_rand",
+            "input": str(tmp_path / "bad.csv"),
+            "output": str(tmp_path / "bad_out.csv"),
+        }
+    )
+    jobs = [Job.from_spec(s) for s in specs]
+    JobRunner(jobs, num_processes, chunk_size=1).run()
+    scan, designs, missing, bad = jobs
+    assert scan.error is None and designs.error is None
+    assert missing.error is not None and bad.error is not None
+    df_scan = pd.read_csv(tmp_path / "scan.csv")
+    # 3 substitutions at each of the 16 positions, one work unit each and
+    # written in order
+    assert len(df_scan) == scan.stage.num_results == 16 * 3
+    assert list(df_scan["name"]) == [
+        m.name for m in find_multiple_mutations(SEQ, 1, [])
+    ]
+    df_designs = pd.read_csv(tmp_path / "designs.csv")
+    assert list(df_designs["name"]) == ["a_1", "a_2", "b_1", "b_2"]
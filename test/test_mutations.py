@@ -4,16 +4,26 @@ from rna_secstruct_design.mutations import (
     possible_nucleotide_mutations,
     find_mutations,
     find_multiple_mutations,
+    get_mutation_name,
     get_basepair_mutation,
     get_basepair_mutations,
+    iter_basepair_mutations,
     get_basepair_mutuations_random,
     change_helix_length,
     scan_helix_lengths,
     scan_all_helix_lengths,
+    iter_all_helix_lengths,
+    count_all_helix_lengths,
     add_unpaired,
     add_unpaired_sweep,
     remove_nucleotides,
     remove_unpaired_nucleotide_sweep,
+    remove_nucleotide_sweep,
+    iter_add_unpaired_sweep,
+    count_add_unpaired_sweep,
+    iter_remove_unpaired_nucleotide_sweep,
+    count_remove_unpaired_nucleotide_sweep,
+    count_remove_nucleotide_sweep,
 )
 from rna_secstruct_design.selection import get_selection
 
@@ -114,6 +124,16 @@ def test_scan_all_helix_lengths():
     }
     results = scan_all_helix_lengths(seqstruct, h_ranges)
     assert len(results) == 81
+    assert all(r is not seqstruct for r in results)
+
+
+def test_iter_all_helix_lengths():
+    seqstruct = SecStruct("GGAGGAAAACCCC", "((.((....))))")
+    h_ranges = {0: [2, 4], 2: [2, 3]}
+    results = list(iter_all_helix_lengths(seqstruct, h_ranges))
+    assert len(results) == count_all_helix_lengths(h_ranges) == 6
+    assert [lengths for lengths, _ in results[:2]] == [(2, 2), (2, 3)]
+    assert results[-1][1].structure == "((((.(((....)))))))"
 
 
 def test_add_unpaired():
@@ -127,6 +147,16 @@ def test_add_unpaired_sweep():
     exclude = [2, 3, 4, 5, 6, 7, 8]
     new_secstructs = add_unpaired_sweep(seqstruct, 2, exclude, all_nucleotides=True)
     assert len(new_secstructs) == 32
+    assert count_add_unpaired_sweep(seqstruct, 2, exclude, all_nucleotides=True) == 32
+
+
+def test_iter_add_unpaired_sweep():
+    seqstruct = SequenceStructure("GGGGAAAACCCC", "((((....))))")
+    variants = list(iter_add_unpaired_sweep(seqstruct, 1, exclude=[2, 3, 8, 9, 10, 11]))
+    assert len(variants) == 1
+    assert variants[0].name == "1insA"
+    assert variants[0].sequence == "GAGGGAAAACCCC"
+    assert variants[0].structure == "(.(((....))))"
 
 
 def test_remove_nucleotides():
@@ -142,12 +172,32 @@ def test_remove_nucleotides():
 
 def test_remove_nucleotide_sweep():
     seqstruct = SequenceStructure("GGGGAAAACCCC", "((((....))))")
+    # removing any of the As gives the same structure
     new_secstructs = remove_unpaired_nucleotide_sweep(seqstruct, 1)
-    assert len(new_secstructs) == 4
+    assert len(new_secstructs) == 1
+    assert new_secstructs[0].sequence == "GGGGAAACCCC"
     seq = "CGACAUGGAGUUUCGCCGAGCCUGCGAACUACAGCGAACACUCUUCGGAGUACCCGCUGCGUAGGCGUUUGACGCGAGGCUCCUAAAUCG"
     ss = "(((...((((((((((((((((((((.....(((((...((((....))))...))))))))))))..)))..))))))))))....)))"
     seqstruct = SequenceStructure(seq, ss)
     new_secstructs = remove_unpaired_nucleotide_sweep(seqstruct, 2)
+    assert len(new_secstructs) == count_remove_unpaired_nucleotide_sweep(seqstruct, 2)
+    keys = set([(s.sequence, s.structure) for s in new_secstructs])
+    assert len(keys) == len(new_secstructs)
+
+
+def test_iter_remove_unpaired_nucleotide_sweep():
+    seqstruct = SequenceStructure("GGGAAGUCCC", "(((....)))")
+    variants = list(iter_remove_unpaired_nucleotide_sweep(seqstruct, 2, exclude=[5]))
+    assert [v.sequence for v in variants] == ["GGGAGCCC", "GGGGUCCC"]
+    assert variants[1].name == "A4del_A5del"
+    assert variants[1].structure == "(((..)))"
+
+
+def test_remove_nucleotide_sweep_all():
+    seqstruct = SequenceStructure("GGGAAACCC", "(((...)))")
+    new_secstructs = remove_nucleotide_sweep(seqstruct, 1)
+    assert len(new_secstructs) == 3
+    assert count_remove_nucleotide_sweep(seqstruct, 2) == 6
 
 
 def test_mutate_basepair():
@@ -163,6 +213,11 @@ def test_mutate_basepairs():
     ss = "((((...))))"
     struct = SecStruct(seq, ss)
     new_seqs = get_basepair_mutations(struct, 2)
+    # 3 of the 4 basepairs do not flank the loop, taken 2 at a time
+    assert len(set(new_seqs)) == 3
+    assert len(get_basepair_mutations(struct, 2, max_muts=2)) == 2
+    new_seqs = list(iter_basepair_mutations(struct, 2, flank_bp=True, max_muts=3))
+    assert len(set(new_seqs)) == 3
 
 
 def test_mutate_basepair_random():
@@ -171,3 +226,10 @@ def test_mutate_basepair_random():
     struct = SecStruct(seq, ss)
     new_seqs = get_basepair_mutuations_random(struct, 3)
     assert new_seqs[-1] != "C"
+
+
+def test_get_mutation_name():
+    assert get_mutation_name("GGGAAACCC", "GCGAAACGC") == "G2C_C8G"
+    assert get_mutation_name("GGGAAACCC", "GGGAAACCC") == ""
+    with pytest.raises(ValueError):
+        get_mutation_name("GGG", "GG")
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+import yaml
+
+from rna_secstruct_design.pipeline import Pipeline, Stage, load_pipeline_spec
+
+RECORDS = [
+    {"name": "a", "sequence": "GGGAUCGAAAGAUCCC", "structure": "((((((....))))))"},
+    {"name": "b", "sequence": "GGCAUGGAAACAUGCC", "structure": "((((((....))))))"},
+]
+
+
+def get_spec(tmp_path, num_processes=1):
+    return {
+        "num_processes": num_processes,
+        "chunk_size": 1,
+        "stages": [
+            {
+                "type": "helix_rand",
+                "num_seqs": 2,
+                "output": str(tmp_path / "designs.csv"),
+            },
+            {"type": "mut_scan", "num_muts": 1},
+        ],
+    }
+
+
+def test_stage_from_spec():
+    stage = Stage.from_spec(
+        {"type": "helix_rand", "num_seqs": 3, "energy_band": [-2.5, -1.5]}
+    )
+    assert stage.options == {"num_seqs": 3, "energy_band": (-2.5, -1.5)}
+    with pytest.raises(ValueError):
+        Stage.from_spec({"type": "fold"})
+    with pytest.raises(ValueError):
+        Stage.from_spec({"type": "mut_scan", "num_seqs": 3})
+    with pytest.raises(ValueError):
+        Stage.from_spec({"type": "replace", "params": {}, "param_file": "x.yml"})
+
+
+def test_mut_scan_units():
+    stage = Stage.from_spec({"type": "mut_scan"})
+    units = list(stage.iter_units(RECORDS[:1], 10))
+    # the 48 mutants of a single record are split into units of 10
+    assert [len(mutations) for mutations, _ in units] == [10, 10, 10, 10, 8]
+    assert sum(num_rows for _, num_rows in units) == 1
+    results, rejects, metrics = stage.get_func()(units[-1])
+    assert len(results) == 8 and results[0]["name"].startswith("a_")
+    assert metrics.items == 0
+
+
+def test_load_pipeline_spec(tmp_path):
+    path = tmp_path / "spec.yml"
+    path.write_text(yaml.safe_dump({"output": "out.csv"}))
+    with pytest.raises(ValueError):
+        load_pipeline_spec(path)
+
+
+@pytest.mark.parametrize("num_processes", [1, 2])
+def test_pipeline_run(tmp_path, num_processes):
+    pipeline = Pipeline(get_spec(tmp_path, num_processes))
+    num_rows = pipeline.run(RECORDS, tmp_path / "final.csv")
+    designs = pd.read_csv(tmp_path / "designs.csv")
+    final = pd.read_csv(tmp_path / "final.csv")
+    assert list(designs["name"]) == ["a_1", "a_2", "b_1", "b_2"]
+    # 3 substitutions at each of the 16 positions of every design
+    assert num_rows == len(final) == 4 * 16 * 3
+    assert final["name"][0].startswith("a_1_")
+    helix_rand, mut_scan = pipeline.stages
+    assert helix_rand.metrics.items == 2
+    assert helix_rand.num_results == mut_scan.metrics.items == 4
@@ -0,0 +1,57 @@
+import json
+
+from rna_secstruct_design.batch import map_chunks
+from rna_secstruct_design.profiler import Profiler, profiler
+
+
+def work(chunk):
+    with profiler.stage("work"):
+        profiler.count("items", len(chunk))
+        return sum(chunk)
+
+
+def test_profiler_disabled():
+    p = Profiler()
+    with p.stage("a"):
+        pass
+    p.count("b")
+    assert p.get_stats() == {"stages": {}, "counters": {}}
+    # nothing is built per call while disabled
+    assert p.stage("a") is p.stage("c")
+
+
+def test_profiler_stages(tmp_path):
+    p = Profiler()
+    p.enable()
+
+    @p.timed("b")
+    def func():
+        return 1
+
+    with p.stage("a"):
+        func()
+    func()
+    stats = p.get_stats()
+    assert stats["stages"]["a"]["count"] == 1
+    assert stats["stages"]["b"]["count"] == 2
+    p.merge(stats)
+    assert p.get_stats()["stages"]["b"]["count"] == 4
+    path = tmp_path / "profile.json"
+    p.write_report(path, "test", 1.0)
+    report = json.loads(path.read_text())
+    assert report["command"] == "test"
+    assert list(report["stages"]) == ["a", "b"]
+
+
+def test_map_chunks_profiled(tmp_path):
+    cprofile_file = tmp_path / "worker.prof"
+    profiler.enable(str(cprofile_file))
+    try:
+        chunks = [[1, 2], [3], [4, 5, 6]]
+        assert list(map_chunks(work, chunks, 2)) == [3, 3, 15]
+        stats = profiler.pop_stats()
+    finally:
+        profiler.disable()
+    assert stats["stages"]["work"]["count"] == 3
+    assert stats["counters"]["items"] == 6
+    assert cprofile_file.exists()
@@ -0,0 +1,53 @@
+import io
+import json
+
+from rna_secstruct_design.progress import (
+    BatchMetrics,
+    ProgressReporter,
+    format_time,
+    record_folds,
+)
+from rna_secstruct_design.folding import FoldCache
+
+
+def test_batch_metrics_merge():
+    metrics = BatchMetrics(items=2, folds=2, cache_hits=1, cache_misses=1)
+    metrics.add_reject("misfold")
+    other = BatchMetrics(items=3, folds=3, cache_misses=3)
+    other.add_reject("misfold", 2)
+    metrics.merge(other)
+    assert metrics.items == 5
+    assert metrics.rejects == {"misfold": 3}
+    assert metrics.cache_hit_rate == 0.2
+
+
+def test_record_folds():
+    cache = FoldCache()
+    metrics = BatchMetrics()
+    with record_folds(metrics, cache):
+        cache.fold("GGGAAACCC")
+        cache.fold("GGGAAACCC")
+    assert metrics.folds == 1
+    assert metrics.cache_hits == 1
+
+
+def test_format_time():
+    assert format_time(None) == "--:--:--"
+    assert format_time(3723) == "1:02:03"
+
+
+def test_progress_reporter(tmp_path):
+    stream = io.StringIO()
+    path = tmp_path / "metrics.jsonl"
+    with ProgressReporter(10, "test", True, path, stream=stream) as reporter:
+        metrics = BatchMetrics(items=4, folds=4)
+        metrics.add_reject("misfold")
+        reporter.update(metrics)
+        reporter.update(BatchMetrics(items=6, folds=6))
+    assert "test: 10/10 (100.0%)" in stream.getvalue()
+    assert "misfold=1" in stream.getvalue()
+    lines = path.read_text().splitlines()
+    status = json.loads(lines[-1])
+    assert status["done"] == 10
+    assert status["folds"] == 10
+    assert status["rejects"] == {"misfold": 1}
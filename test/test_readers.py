@@ -0,0 +1,73 @@
+import bz2
+import gzip
+import io
+import sys
+
+import pytest
+
+from rna_secstruct_design.readers import (
+    get_input_format,
+    iter_fasta_records,
+    iter_records,
+)
+
+FASTA = """>a
+GGAAAC
+(....) ( -1.20)
+
+>b
+GGGG
+AAAACCCC
+((((....))))
+>c
+GGAAAC
+"""
+
+CSV = "name,sequence,structure\na,GGAAAC,(....)\n,GGGAAACCC,(((...)))\n"
+
+
+def test_get_input_format():
+    assert get_input_format("lib.fasta.gz") == "fasta"
+    assert get_input_format("lib.csv.bz2") == "csv"
+    assert get_input_format("lib.parquet") == "parquet"
+    assert get_input_format("-") is None
+
+
+def test_iter_fasta_records():
+    records = list(iter_fasta_records(FASTA.splitlines()))
+    assert records[0] == {"name": "a", "sequence": "GGAAAC", "structure": "(....)"}
+    assert records[1]["sequence"] == "GGGGAAAACCCC"
+    assert records[1]["structure"] == "((((....))))"
+    assert records[2]["structure"] is None
+
+
+def test_iter_fasta_records_length_mismatch():
+    with pytest.raises(ValueError):
+        list(iter_fasta_records([">a", "GGAAAC", "(...)"]))
+
+
+def test_iter_records_compressed(tmp_path):
+    path = tmp_path / "lib.fa.gz"
+    with gzip.open(path, "wt") as f:
+        f.write(FASTA)
+    assert [r["name"] for r in iter_records(path)] == ["a", "b", "c"]
+    path = tmp_path / "lib.csv.bz2"
+    with bz2.open(path, "wt") as f:
+        f.write(CSV)
+    records = list(iter_records(path))
+    assert [r["name"] for r in records] == ["a", "seq_1"]
+    assert records[1]["structure"] == "(((...)))"
+
+
+def test_iter_records_lazy(tmp_path):
+    path = tmp_path / "lib.csv"
+    path.write_text(CSV)
+    records = iter_records(path)
+    assert next(records)["name"] == "a"
+
+
+def test_iter_records_stdin(monkeypatch):
+    stdin = io.TextIOWrapper(io.BytesIO(FASTA.encode()))
+    monkeypatch.setattr(sys, "stdin", stdin)
+    assert [r["name"] for r in iter_records("-")] == ["a", "b", "c"]
+    assert not stdin.closed
@@ -1,5 +1,11 @@
+import pytest
+
 from seq_tools.structure import SequenceStructure
-from rna_secstruct_design.replace import replace_seq_structures, replace_gaaa_w_uucg
+from rna_secstruct_design.replace import (
+    replace_seq_structures,
+    replace_gaaa_w_uucg,
+    MultiPatternReplacer,
+)
 
 
 class TestReplaceSeqStructure:
@@ -25,3 +31,99 @@ def test_replace_gaaa_to_uucg():
     new_ss = replace_gaaa_w_uucg(ss)
     assert new_ss.sequence == "GGGCUUCGGCCC"
     assert new_ss.structure == "((((....))))"
+
+
+class TestMultiPatternReplacer:
+    def test_hairpin(self):
+        params = {
+            "hp": {
+                "sequence": "GAAAAC",
+                "structure": "(....)",
+                "r_sequence": "GUUUUC",
+                "r_structure": "((..))",
+            }
+        }
+        replacer = MultiPatternReplacer(params)
+        new_ss = replacer.replace("GGGGAAAACCCC", "((((....))))")
+        assert new_ss.sequence == "GGGGUUUUCCCC"
+        assert new_ss.structure == "(((((..)))))"
+
+    def test_helices(self):
+        params = {
+            "helix": {
+                "sequence": "GGGG&CCCC",
+                "structure": "((((&))))",
+                "r_sequence": "GACG&CCAC",
+                "r_structure": "(..(&)..)",
+            }
+        }
+        replacer = MultiPatternReplacer(params)
+        new_ss = replacer.replace("GGGGAAAACCCC", "((((....))))")
+        assert new_ss.sequence == "GACGAAAACCAC"
+        assert new_ss.structure == "(..(....)..)"
+
+    def test_multiple_patterns(self):
+        params = {
+            "helix": {
+                "sequence": "AAGG&CCU",
+                "structure": "..((&)).",
+                "r_sequence": "A&U",
+                "r_structure": "(&)",
+            },
+            "loop": {
+                "sequence": "AAA",
+                "structure": "...",
+                "r_sequence": "UUCG",
+                "r_structure": "....",
+            },
+        }
+        replacer = MultiPatternReplacer(params)
+        new_ss = replacer.replace("AAGGAAACCU&AA", "..((...)).&..")
+        assert new_ss.sequence == "AUUCGU&AA"
+        assert new_ss.structure == "(....)&.."
+
+    def test_find_checks_pairing(self):
+        params = {
+            "helix": {
+                "sequence": "GG&CC",
+                "structure": "((&))",
+                "r_sequence": "CC&GG",
+                "r_structure": "((&))",
+            }
+        }
+        replacer = MultiPatternReplacer(params)
+        matches = replacer.find("GGAGGAAACCUCC", "((.((...)).))")
+        assert matches["helix"] == [[(0, 2), (11, 13)], [(3, 5), (8, 10)]]
+        with pytest.raises(ValueError):
+            replacer.replace("GGAGGAAACCUCC", "((.((...)).))")
+
+    def test_wildcard(self):
+        params = {
+            "loop": {
+                "sequence": "GNNNNC",
+                "structure": "(....)",
+                "r_sequence": "GUUCGC",
+                "r_structure": "(....)",
+            }
+        }
+        replacer = MultiPatternReplacer(params)
+        assert replacer.find("GGGGAAAACCCC", "((((....))))")["loop"] == [[(3, 9)]]
+        new_ss = replacer.replace("GGGGAAAACCCC", "((((....))))")
+        assert new_ss.sequence == "GGGGUUCGCCCC"
+        assert new_ss.structure == "((((....))))"
+        # N does not match a strand break
+        assert replacer.find("GGGGA&AACCCC", "((((.&..))))")["loop"] == []
+
+    def test_not_found(self):
+        replacer = MultiPatternReplacer(
+            {
+                "hp": {
+                    "sequence": "GUUCGC",
+                    "structure": "(....)",
+                    "r_sequence": "GAAAAC",
+                    "r_structure": "(....)",
+                }
+            }
+        )
+        with pytest.raises(ValueError):
+            replacer.replace("GGGGAAAACCCC", "((((....))))")
@@ -0,0 +1,137 @@
+import asyncio
+import json
+
+import pytest
+
+from rna_secstruct_design import server as server_module
+from rna_secstruct_design.server import DesignServer, parse_request
+
+SEQ = "GGGAUCGAAAGAUCCC"
+STRUCT = "((((((....))))))"
+
+
+async def collect(server, request):
+    return [m async for m in server.handle_request(request)]
+
+
+def test_parse_request():
+    stage = parse_request({"id": 1, "type": "mut_scan", "seq": SEQ, "num_muts": 2})
+    assert stage.options == {"num_muts": 2}
+    with pytest.raises(ValueError):
+        parse_request({"type": "mut_scan", "output": "out.csv"})
+    with pytest.raises(ValueError):
+        parse_request([])
+    for key in ["param_file", "helix_library"]:
+        with pytest.raises(ValueError):
+            parse_request({"type": "helix_rand", key: "/tmp/params.yml"})
+    stage = parse_request({"type": "helix_rand", "params": {"invert": True}})
+    assert stage.params == {"invert": True}
+
+
+def test_handle_request():
+    async def run():
+        async with DesignServer(num_processes=2, chunk_size=1, max_rows=2) as server:
+            records = [
+                {"name": "a", "sequence": SEQ, "structure": STRUCT},
+                {"name": "b", "sequence": SEQ, "structure": STRUCT},
+            ]
+            requests = [
+                {"id": 1, "type": "mut_scan", "seq": SEQ, "struct": STRUCT},
+                {"id": 2, "type": "helix_rand", "records": records, "num_seqs": 2},
+            ]
+            results = await asyncio.gather(*[collect(server, r) for r in requests])
+            errors = await asyncio.gather(
+                collect(server, {"id": 3, "type": "fold", "seq": SEQ}),
+                collect(server, {"id": 4, "type": "mut_scan"}),
+                collect(server, {"id": 5, "type": "mut_scan", "records": records * 2}),
+            )
+            return results, errors
+
+    (scan, designs), errors = asyncio.run(run())
+    assert scan[-1]["done"] and scan[-1]["num_rows"] == 16 * 3
+    # one message per mutant and the summary
+    assert len(scan) == 16 * 3 + 1
+    assert scan[-1]["metrics"]["items"] == 1
+    # one message per input row and the summary
+    assert len(designs) == 3
+    names = [row["name"] for m in designs[:-1] for row in m["rows"]]
+    assert names == ["a_1", "a_2", "b_1", "b_2"]
+    assert designs[-1]["metrics"]["items"] == 2
+    for messages, request_id in zip(errors, [3, 4, 5]):
+        assert messages == [{"id": request_id, "error": messages[0]["error"]}]
+
+
+def test_unix_socket(tmp_path):
+    path = str(tmp_path / "server.sock")
+
+    async def run():
+        async with DesignServer() as server:
+            await server.listen(socket_path=path)
+            reader, writer = await asyncio.open_unix_connection(path)
+            request = {"id": "a", "type": "mut_scan", "seq": SEQ, "struct": STRUCT}
+            writer.write(b"not json\n" + json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            messages = [json.loads(await reader.readline()) for _ in range(3)]
+            writer.close()
+            return messages
+
+    invalid, rows, done = asyncio.run(run())
+    assert invalid["error"].startswith("invalid json")
+    assert rows["id"] == "a" and len(rows["rows"]) == 16 * 3
+    assert done["done"]
+
+
+def test_request_units_are_not_batched():
+    async def run():
+        async with DesignServer(num_processes=4, chunk_size=100) as server:
+            request = {
+                "id": 1,
+                "type": "mut_scan",
+                "seq": SEQ,
+                "struct": STRUCT,
+                "num_muts": 2,
+            }
+            messages = await collect(server, request)
+            return messages, server.num_batches
+
+    messages, num_batches = asyncio.run(run())
+    # 9 double substitutions for each of the 120 position pairs
+    assert messages[-1]["num_rows"] == 1080
+    # the mutants of a single sequence are split into units of 100, each goes to
+    # a worker of its own
+    assert len(messages) == 11 + 1
+    assert num_batches == 11
+
+
+def test_busy_workers_batch_requests():
+    async def run():
+        async with DesignServer(num_processes=1) as server:
+            requests = [
+                {"id": i, "type": "mut_scan", "seq": SEQ, "struct": STRUCT}
+                for i in range(16)
+            ]
+            results = await asyncio.gather(*[collect(server, r) for r in requests])
+            return results, server.num_batches
+
+    results, num_batches = asyncio.run(run())
+    assert all(messages[-1]["done"] for messages in results)
+    assert num_batches < 16
+
+
+def test_request_too_long(tmp_path, monkeypatch):
+    monkeypatch.setattr(server_module, "MAX_LINE_SIZE", 1024)
+    path = str(tmp_path / "server.sock")
+
+    async def run():
+        async with DesignServer() as server:
+            await server.listen(socket_path=path)
+            reader, writer = await asyncio.open_unix_connection(path)
+            request = {"id": "a", "type": "mut_scan", "seq": SEQ * 100}
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            message = json.loads(await reader.readline())
+            writer.close()
+            return message
+
+    message = asyncio.run(run())
+    assert message["id"] is None and "1024 bytes" in message["error"]
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from rna_secstruct_design.folding import StubFoldBackend, get_fold_backend
+from rna_secstruct_design.session import DesignSession
+
+SEQ = "GGGAUCGAAAGAUCCC"
+STRUCT = "((((((....))))))"
+RECORDS = [
+    {"name": "a", "sequence": SEQ, "structure": STRUCT},
+    {"name": "b", "sequence": "GGCAUGGAAACAUGCC", "structure": STRUCT},
+]
+
+
+@pytest.mark.parametrize("num_processes", [1, 2])
+def test_iter_mut_scan(num_processes):
+    with DesignSession(num_processes, chunk_size=1) as session:
+        rows = list(session.iter_mut_scan(SEQ))
+        # 3 substitutions at each of the 16 positions
+        assert len(rows) == 16 * 3
+        assert not rows[0]["name"].startswith("seq_")
+        rows = list(session.iter_mut_scan(RECORDS, ordered=False))
+        assert sorted({r["name"][0] for r in rows}) == ["a", "b"]
+        assert len(rows) == 2 * 16 * 3
+        assert session.metrics.items == 3
+
+
+@pytest.mark.parametrize("num_processes", [1, 2])
+def test_iter_helix_designs(num_processes):
+    with DesignSession(num_processes, chunk_size=1) as session:
+        rows = list(session.iter_helix_designs(RECORDS, num_seqs=2))
+    assert [r["name"] for r in rows] == ["a_1", "a_2", "b_1", "b_2"]
+    with pytest.raises(ValueError):
+        DesignSession().open().iter_helix_designs(RECORDS, num_muts=2)
+
+
+def test_session_not_open():
+    with pytest.raises(ValueError):
+        list(DesignSession().iter_mut_scan(SEQ))
+
+
+@pytest.mark.parametrize("num_processes", [1, 2])
+def test_aiter_mut_scan(num_processes):
+    async def run():
+        async with DesignSession(num_processes, chunk_size=1) as session:
+            scans = [
+                [r async for r in session.aiter_mut_scan([record])]
+                for record in RECORDS
+            ]
+            designs = [r async for r in session.aiter_helix_designs(SEQ, num_seqs=2)]
+            return scans, designs
+
+    scans, designs = asyncio.run(run())
+    assert [len(rows) for rows in scans] == [16 * 3, 16 * 3]
+    assert scans[1][0]["name"].startswith("b_")
+    assert [r["name"] for r in designs] == ["seq_1", "seq_2"]
+
+
+def test_fold_backend():
+    backend = StubFoldBackend(STRUCT)
+    with DesignSession(2, fold_backend=backend) as session:
+        assert get_fold_backend() is backend
+        rows = list(session.iter_mut_scan(SEQ))
+    assert get_fold_backend() is None
+    # every mutant folds into the stub structure
+    assert {r["structure"] for r in rows} == {STRUCT}
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from rna_secstruct_design.encoding import encode_sequences
+from rna_secstruct_design.readers import iter_records
+from rna_secstruct_design.store import RlibStore, RlibWriter, pack_sequence
+
+ROWS = [
+    {"name": "a", "sequence": "GGAAAC", "structure": "(....)", "ens_defect": 0.5},
+    {"name": "b", "sequence": "GGGAAACCC", "structure": "(((...)))", "ens_defect": 1},
+    {"name": "c", "sequence": "GGUAAC", "structure": "(....)", "ens_defect": 2.25},
+]
+
+
+def write_store(path, rows=ROWS):
+    with RlibWriter(path, ["name", "sequence", "structure", "ens_defect"]) as w:
+        w.write_rows(rows)
+    return w
+
+
+def test_pack_sequence():
+    # G=2, A=0 -> 10 10 00 00
+    assert pack_sequence("GGAAAC") == bytes([0b10100000, 0b00010000])
+    with pytest.raises(ValueError):
+        pack_sequence("GGNA")
+
+
+def test_store_round_trip(tmp_path):
+    path = tmp_path / "lib.rlib"
+    write_store(path)
+    with RlibStore(path) as store:
+        assert len(store) == 3
+        assert store.stride == 3
+        assert store[1] == {
+            "name": "b",
+            "sequence": "GGGAAACCC",
+            "structure": "(((...)))",
+            "ens_defect": 1.0,
+        }
+        assert store[-1]["sequence"] == "GGUAAC"
+        # structures are stored once in the shared table
+        assert sorted(store.strings) == ["(((...)))", "(....)"]
+        assert store.get_sequences(0, 2) == ["GGAAAC", "GGGAAACCC"]
+        assert [r["name"] for r in iter_records(path)] == ["a", "b", "c"]
+
+
+def test_store_get_encoded(tmp_path):
+    path = tmp_path / "lib.rlib"
+    write_store(path)
+    with RlibStore(path) as store:
+        encoded = store.get_encoded()
+    expected = encode_sequences([r["sequence"] for r in ROWS])
+    assert np.array_equal(encoded, expected)
+
+
+def test_store_empty(tmp_path):
+    path = tmp_path / "lib.rlib"
+    write_store(path, [])
+    with RlibStore(path) as store:
+        assert len(store) == 0
+        assert store.get_records() == []
+
+
+def test_not_a_store(tmp_path):
+    path = tmp_path / "lib.rlib"
+    path.write_bytes(b"x" * 100)
+    with pytest.raises(ValueError):
+        RlibStore(path)
+
+
+def test_store_strand_breaks(tmp_path):
+    path = tmp_path / "lib.rlib"
+    rows = [
+        {"name": "a", "sequence": "GGAA&UUCC", "structure": "((..&..))"},
+        {"name": "b", "sequence": "GGGAAACCC", "structure": "(((...)))"},
+        {"name": "c", "sequence": "GG&AA&UU", "structure": "((&..&))"},
+    ]
+    with RlibWriter(path, ["name", "sequence", "structure"]) as w:
+        w.write_rows(rows)
+    with RlibStore(path) as store:
+        assert store.get_records() == rows
+        assert store.get_breaks(2) == [2, 4]
+        expected = encode_sequences([r["sequence"] for r in rows])
+        assert np.array_equal(store.get_encoded(), expected)
+
+
+def test_store_int_columns(tmp_path):
+    path = tmp_path / "lib.rlib"
+    rows = [dict(r, num=i) for i, r in enumerate(ROWS)]
+    with RlibWriter(path, ["name", "sequence", "num", "ens_defect"]) as w:
+        w.write_rows(rows)
+    with RlibStore(path) as store:
+        assert store.get_column("num").dtype == np.int64
+        assert store.get_column("ens_defect").dtype == np.float64
+        assert [r["num"] for r in store.get_records()] == [0, 1, 2]
+        assert isinstance(store[0]["num"], int)
+
+
+def test_store_mixed_columns(tmp_path):
+    path = tmp_path / "lib.rlib"
+    rows = [
+        {"name": "a", "sequence": "GGAAAC", "tag": "1", "num": 1, "score": 0.5},
+        {"name": "b", "sequence": "GGAAAC", "tag": "abc", "num": "x", "score": None},
+        {"name": "c", "sequence": "GGAAAC", "tag": "2", "num": 3, "score": "high"},
+    ]
+    with RlibWriter(path, ["name", "sequence", "tag", "num", "score"]) as w:
+        w.write_rows(rows)
+    with RlibStore(path) as store:
+        # strings that look like numbers stay strings
+        assert store.get_column("tag") == ["1", "abc", "2"]
+        assert store.get_column("num") == ["1", "x", "3"]
+        assert store.get_column("score") == ["0.5", "", "high"]
@@ -3,6 +3,9 @@ from rna_secstruct_design.util import (
     str_to_range,
     max_repeating_nucleotides,
     max_gc_stretch,
+    get_pair_table,
+    get_helix_pairs,
+    find_off_target_stretches,
 )
 
 
@@ -100,3 +103,29 @@ def test_can_form_helix():
     assert can_form_helix("GAC", "GUC")
     assert can_form_helix("AGAC", "GUCU")
     assert not can_form_helix("GUC", "GUG")
+
+
+def test_get_pair_table():
+    """Test get_pair_table"""
+    assert get_pair_table("((..))") == [5, 4, -1, -1, 1, 0]
+    assert get_pair_table("(&)") == [2, -1, 0]
+
+
+def test_get_helix_pairs():
+    """Test get_helix_pairs"""
+    helices = get_helix_pairs("((.((...)).))")
+    assert helices == [[(0, 12), (1, 11)], [(3, 9), (4, 8)]]
+
+
+def test_find_off_target_stretches():
+    """Test find_off_target_stretches"""
+    assert find_off_target_stretches("GGGGAAAACCCC", "." * 12, 4) == [(0, 11)]
+    # GU basepairs count, GGGA can pair with UUUU as well
+    stretches = find_off_target_stretches("GGGGAAAAUUUU", "." * 12, 4)
+    assert stretches == [(0, 11), (1, 11)]
+    # stretches the structure has are not off target
+    assert find_off_target_stretches("GGGGAAAACCCC", "((((....))))", 4) == []
+    # hairpin loops need 3 unpaired positions
+    assert find_off_target_stretches("GGGGAACCCC", "." * 10, 4) == []
+    assert find_off_target_stretches("GGGGAAAACCCC", "." * 12, 5) == []
+    assert find_off_target_stretches("GGNGAAAACCCC", "." * 12, 4) == []